@@ -0,0 +1,248 @@
+"""Microbenchmarks and scaling checks for the response-parsing hot paths in utils.
+
+Each target runs on synthetic LLM-style responses from 1 KB up to 10 MB with a
+fence every few hundred bytes (content_to_json gets a damaged, truncated JSON
+manifest instead, and parse_code_blocks_long_lines a few prose and info-string
+lines as long as the whole input, which catches regexes that backtrack from
+every offset of a line). For every size we record the best-of-N time and
+the peak traced allocation, then fit the growth exponent between consecutive
+sizes: ~1.0 is linear, anything above --max_exponent is flagged as superlinear.
+
+Alternative implementations can be benchmarked next to the built-in ones:
+    python benchmarks/bench_parsing.py --impl mine=my_module:extract_blocks --only extract_react_code_from_content,mine
+Results can be saved with --output and compared against an earlier run with --baseline.
+"""
+import argparse
+import gc
+import importlib
+import json
+import math
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+CODES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "codes")
+sys.path.insert(0, CODES_DIR)
+
+import utils  # noqa: E402
+import fence_parser  # noqa: E402
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+MIN_SECONDS = 0.005
+MIN_PEAK_BYTES = 256 * 1024
+
+PROSE = [
+    "The Header component renders the navigation bar and user menu.",
+    "Each page component receives its data through a custom hook.",
+    "State is kept local unless two sibling components need it.",
+    "The DashboardPage composes summary cards and the activity feed.",
+    "Use semantic HTML so screen readers can announce landmarks.",
+]
+
+FENCE_TEMPLATES = [
+    "```tsx\nimport React from 'react';\n\nexport const {name}: React.FC = () => <div>{name} {i}</div>;\n\nexport default {name};\n```",
+    "```typescript\nexport interface {name}Props {{\n  id: number;\n  label: string; // item {i}\n}}\n```",
+    "```\nnpm install {name_lower}-{i}\n```",
+    "```tsx\n// {name}.test.tsx\nimport {{ render }} from '@testing-library/react';\n\ntest('{name} {i}', () => {{\n  render(<{name} />);\n}});\n```",
+]
+
+
+def synthetic_response(size, fence_every=400, seed=0):
+    """Build a markdown response of roughly `size` characters with a fence every ~fence_every chars."""
+    rng = random.Random(seed)
+    parts = []
+    length = 0
+    i = 0
+    since_fence = 0
+    while length < size:
+        if since_fence >= fence_every:
+            name = f"Widget{i}Component"
+            part = rng.choice(FENCE_TEMPLATES).format(name=name, name_lower=name.lower(), i=i)
+            since_fence = 0
+        else:
+            part = rng.choice(PROSE)
+            since_fence += len(part)
+        parts.append(part)
+        length += len(part) + 1
+        i += 1
+    return "\n".join(parts)[:size]
+
+
+def synthetic_json(size, fence_every=400, seed=0):
+    """Build a damaged JSON component manifest of roughly `size` characters.
+
+    Mixes the damage repair_json fixes (unquoted keys, single quotes, trailing
+    commas, comments) and ends mid-document, so the whole input is repaired.
+    """
+    rng = random.Random(seed)
+    parts = ["```json\n{components: ["]
+    length = len(parts[0])
+    i = 0
+    while length < size:
+        name = f"Widget{i}Component"
+        part = rng.choice([
+            f'{{"name": "{name}", "path": "src/components/{name}.tsx", "depends_on": ["App",]}},',
+            f"{{name: '{name}', type: 'component', lazy: True}}, // item {i}",
+            f'{{"name": "{name}", "description": "{rng.choice(PROSE)}"}},',
+        ])
+        parts.append(part)
+        length += len(part) + 1
+        i += 1
+    return "\n".join(parts)[:size]
+
+
+def synthetic_long_lines(size, fence_every=400, seed=0):
+    """Build a response whose prose and fence info lines are each about a third of `size` long.
+
+    A path-like line, a URL-like line and a long info string, each followed
+    by a fence: the filename lookups run on every one of them.
+    """
+    third = max(size // 3, 1)
+    path = ("src/components/" * (third // 15 + 1))[:third]
+    url = ("https://example.com/a//" * (third // 23 + 1))[:third]
+    info = ("x// " * (third // 4 + 1))[:third]
+    return (f"{path}\n```\nconst a = 1;\n```\n"
+            f"See {url}\n```tsx\nconst b = 2;\n```\n"
+            f"```tsx {info}\nconst c = 3;\n```\n")[:size + 64]
+
+
+def load_target(spec):
+    """Resolve 'module:function' (module importable from codes/) to a callable."""
+    module_name, _, attr = spec.partition(':')
+    module = importlib.import_module(module_name)
+    return getattr(module, attr)
+
+
+def builtin_targets():
+    return {
+        "extract_react_code_from_content": utils.extract_react_code_from_content,
+        "parse_component_structure": utils.parse_component_structure,
+        "content_to_json": utils.content_to_json,
+        "parse_code_blocks_long_lines": fence_parser.parse_code_blocks,
+    }
+
+
+# Targets that parse something other than a markdown response
+TARGET_PAYLOADS = {
+    "content_to_json": synthetic_json,
+    "parse_code_blocks_long_lines": synthetic_long_lines,
+}
+
+
+def measure(func, payload, repeat):
+    # Like timeit, keep the collector out of the timed region
+    best = math.inf
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func(payload)
+            best = min(best, time.perf_counter() - start)
+    finally:
+        gc.enable()
+    tracemalloc.start()
+    func(payload)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def growth_exponent(size_a, value_a, size_b, value_b):
+    if value_a <= 0 or value_b <= 0:
+        return None
+    return math.log(value_b / value_a) / math.log(size_b / size_a)
+
+
+def run(args):
+    targets = builtin_targets()
+    for spec in args.impl:
+        label, _, target = spec.partition('=')
+        targets[label] = load_target(target)
+    if args.only:
+        wanted = set(args.only.split(','))
+        targets = {label: func for label, func in targets.items() if label in wanted}
+
+    sizes = [size for size in DEFAULT_SIZES if size <= args.max_size]
+    payloads = {}
+
+    results = {}
+    flagged = []
+    for label, func in targets.items():
+        print(f"\n⏱️ {label}")
+        print(f"   {'size':>10} {'time ms':>12} {'peak alloc KB':>14} {'time exp':>9} {'alloc exp':>10}")
+        rows = []
+        for size in sizes:
+            repeat = args.repeat if size <= 1_000_000 else 1
+            generator = TARGET_PAYLOADS.get(label, synthetic_response)
+            if (generator, size) not in payloads:
+                payloads[(generator, size)] = generator(size, args.fence_every)
+            seconds, peak = measure(func, payloads[(generator, size)], repeat)
+            row = {"size": size, "seconds": seconds, "peak_bytes": peak}
+            prev = rows[-1] if rows else None
+            if prev:
+                row["time_exponent"] = growth_exponent(prev["size"], prev["seconds"], size, seconds)
+                row["alloc_exponent"] = growth_exponent(prev["size"], prev["peak_bytes"], size, peak)
+            rows.append(row)
+            time_exp = row.get("time_exponent")
+            alloc_exp = row.get("alloc_exponent")
+            print(f"   {size:>10} {seconds * 1000:>12.3f} {peak / 1024:>14.1f} "
+                  f"{'' if time_exp is None else f'{time_exp:.2f}':>9} "
+                  f"{'' if alloc_exp is None else f'{alloc_exp:.2f}':>10}")
+            # Only judge growth once values are big enough to drown out fixed overhead
+            if prev and min(prev["seconds"], seconds) >= MIN_SECONDS and time_exp > args.max_exponent:
+                flagged.append((label, size, "time", time_exp))
+            if prev and min(prev["peak_bytes"], peak) >= MIN_PEAK_BYTES and alloc_exp > args.max_exponent:
+                flagged.append((label, size, "alloc", alloc_exp))
+            if seconds > args.budget:
+                print(f"   ⏭️ Skipping larger sizes: {seconds:.1f}s exceeds the {args.budget:.0f}s budget")
+                flagged.append((label, size, "budget", seconds))
+                break
+        results[label] = rows
+    return results, flagged
+
+
+def compare_with_baseline(results, baseline):
+    print("\n📊 Against baseline")
+    for label, rows in results.items():
+        base_rows = {row["size"]: row for row in baseline.get(label, [])}
+        for row in rows:
+            base = base_rows.get(row["size"])
+            if base:
+                speedup = base["seconds"] / row["seconds"] if row["seconds"] else math.inf
+                print(f"   {label:<36} {row['size']:>10}  {speedup:>6.2f}x faster"
+                      f"  alloc {row['peak_bytes'] / max(base['peak_bytes'], 1):>5.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--max_size', type=int, default=10_000_000)
+    parser.add_argument('--fence_every', type=int, default=400, help="Approximate characters of prose between fences")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--max_exponent', type=float, default=1.3, help="Growth exponent above which a target is flagged")
+    parser.add_argument('--budget', type=float, default=30.0, help="Seconds per call before larger sizes are skipped")
+    parser.add_argument('--impl', type=str, action='append', default=[],
+                        help="Extra target as label=module:function (module importable from codes/)")
+    parser.add_argument('--only', type=str, default="", help="Comma-separated target labels to run")
+    parser.add_argument('--output', type=str, default="")
+    parser.add_argument('--baseline', type=str, default="")
+    args = parser.parse_args()
+
+    results, flagged = run(args)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare_with_baseline(results, json.load(f))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n📁 Results saved to: {args.output}")
+
+    if flagged:
+        print("\n⚠️ Superlinear or over-budget behaviour:")
+        for label, size, kind, value in flagged:
+            print(f"   {label} at {size} bytes: {kind} {value:.2f}")
+        sys.exit(1)
+    print("\n✅ All targets scale linearly")
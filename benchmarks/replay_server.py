@@ -0,0 +1,255 @@
+"""Local replay server speaking the OpenAI chat completions API.
+
+Serves recorded responses so the pipeline can be benchmarked end to end without
+network access or API spend. A request is answered, in order of preference, by:
+
+1. an exact recording keyed on the hash of its model + messages, or
+2. the default recording for the stage detected from its system prompt.
+
+Recordings are JSONL files with one object per line, either
+`{"key": "<sha256>", "content": "..."}` (written by --record) or
+`{"stage": "coding", "content": "..."}`. `{{component}}` in a stage recording is
+replaced with the component named in the request, and `{{import_path}}` with
+the import path a testing request asks for. Requests with stream=True
+are answered with server-sent events, paced by --tokens_per_second.
+
+Usage:
+    python benchmarks/replay_server.py --port 8765 --latency 0.2
+    python benchmarks/replay_server.py --record recordings/mine.jsonl --upstream https://api.openai.com/v1
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_RECORDINGS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recordings", "default.jsonl")
+
+# First match wins, so more specific prompts come first
+STAGE_MARKERS = [
+    ("review", "expert React code reviewer"),
+    ("testing", "React testing engineer"),
+    ("coding", "React developer and TypeScript specialist"),
+    ("analysis", "UX/UI designer"),
+    ("planning", "frontend architect"),
+]
+
+COMPONENT_PATTERN = re.compile(r'Component to Generate: (\w+)|File under test: \S*?(\w+)\.\w+\n')
+IMPORT_PATH_PATTERN = re.compile(r"Import the module under test from '([^']+)'")
+
+# Tokens per server-sent event when a client asks for stream=True
+STREAM_CHUNK_TOKENS = 4
+
+
+def request_key(model, messages):
+    """Stable hash identifying a chat request for exact replay."""
+    payload = json.dumps({"model": model, "messages": messages}, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def detect_stage(messages):
+    system = next((m.get('content', '') for m in messages if m.get('role') == 'system'), '')
+    for stage, marker in STAGE_MARKERS:
+        if marker in system:
+            return stage
+    return "default"
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+class Recordings:
+    """Keyed and per-stage recorded responses loaded from JSONL files."""
+
+    def __init__(self, paths):
+        self.by_key = {}
+        self.by_stage = {}
+        self._lock = threading.Lock()
+        for path in paths:
+            if os.path.exists(path):
+                self.load(path)
+
+    def load(self, path):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                record = json.loads(line)
+                if 'key' in record:
+                    self.by_key[record['key']] = record['content']
+                elif 'stage' in record:
+                    self.by_stage[record['stage']] = record['content']
+
+    def lookup(self, model, messages):
+        content = self.by_key.get(request_key(model, messages))
+        if content is not None:
+            return content
+        content = self.by_stage.get(detect_stage(messages), self.by_stage.get("default", ""))
+        user = next((m.get('content', '') for m in messages if m.get('role') == 'user'), '')
+        match = COMPONENT_PATTERN.search(user)
+        component = next((group for group in match.groups() if group), None) if match else None
+        import_path = IMPORT_PATH_PATTERN.search(user)
+        content = content.replace("{{import_path}}", import_path.group(1) if import_path else f"./{component or 'Component'}")
+        return content.replace("{{component}}", component or "Component")
+
+    def append(self, path, model, messages, content):
+        key = request_key(model, messages)
+        with self._lock:
+            self.by_key[key] = content
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({"key": key, "content": content}) + "\n")
+
+
+def completion_body(model, content, prompt_tokens):
+    completion_tokens = estimate_tokens(content)
+    return {
+        "id": f"chatcmpl-replay-{int(time.time() * 1000)}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def stream_chunks(body, include_usage):
+    """Split a completion body into chat.completion.chunk objects, as the streaming API sends them."""
+    content = body["choices"][0]["message"]["content"]
+    step = STREAM_CHUNK_TOKENS * 4
+    base = {"id": body["id"], "object": "chat.completion.chunk", "created": body["created"], "model": body["model"]}
+    yield dict(base, choices=[{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])
+    for start in range(0, len(content), step):
+        yield dict(base, choices=[{"index": 0, "delta": {"content": content[start:start + step]}, "finish_reason": None}])
+    yield dict(base, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}])
+    if include_usage:
+        yield dict(base, choices=[], usage=body["usage"])
+
+
+def make_handler(recordings, latency, tokens_per_second, record_path=None, upstream=None):
+    class ReplayHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            if not self.path.rstrip('/').endswith('/chat/completions'):
+                self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+                return
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length) or b'{}')
+            model = request.get('model', 'replay')
+            messages = request.get('messages', [])
+
+            stream = request.get('stream', False)
+            include_usage = (request.get('stream_options') or {}).get('include_usage', False)
+
+            if record_path:
+                body = self._forward(dict(request, stream=False, stream_options=None))
+                content = body["choices"][0]["message"]["content"]
+                recordings.append(record_path, model, messages, content)
+                if stream:
+                    self._send_stream(body, include_usage, 0.0)
+                else:
+                    self._send_json(200, body)
+                return
+
+            content = recordings.lookup(model, messages)
+            prompt_tokens = sum(estimate_tokens(m.get('content', '')) for m in messages)
+            body = completion_body(model, content, prompt_tokens)
+            if stream:
+                time.sleep(latency)
+                self._send_stream(body, include_usage, tokens_per_second)
+                return
+            delay = latency
+            if tokens_per_second:
+                delay += body["usage"]["completion_tokens"] / tokens_per_second
+            time.sleep(delay)
+            self._send_json(200, body)
+
+        def _forward(self, request):
+            upstream_request = urllib.request.Request(
+                upstream.rstrip('/') + '/chat/completions',
+                data=json.dumps(request).encode('utf-8'),
+                headers={
+                    "Content-Type": "application/json",
+                    "Authorization": f"Bearer {os.environ.get('OPENAI_API_KEY', '')}",
+                },
+            )
+            with urllib.request.urlopen(upstream_request) as response:
+                return json.loads(response.read())
+
+        def _send_stream(self, body, include_usage, tokens_per_second):
+            """Send the completion as server-sent events, STREAM_CHUNK_TOKENS tokens per chunk."""
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            for chunk in stream_chunks(body, include_usage):
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+                self.wfile.flush()
+                if tokens_per_second:
+                    time.sleep(STREAM_CHUNK_TOKENS / tokens_per_second)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+        def _send_json(self, status, body):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return ReplayHandler
+
+
+def start_server(recording_paths=None, port=0, latency=0.0, tokens_per_second=0.0, record_path=None, upstream=None):
+    """Start the replay server on a background thread; returns (server, base_url)."""
+    recordings = Recordings(recording_paths or [DEFAULT_RECORDINGS])
+    handler = make_handler(recordings, latency, tokens_per_second, record_path, upstream)
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--recordings', type=str, nargs='*', default=[DEFAULT_RECORDINGS])
+    parser.add_argument('--latency', type=float, default=0.0, help="Fixed seconds added to every response")
+    parser.add_argument('--tokens_per_second', type=float, default=0.0, help="Simulated decode speed (0 = instant)")
+    parser.add_argument('--record', type=str, default="", help="Proxy to --upstream and append responses to this file")
+    parser.add_argument('--upstream', type=str, default="https://api.openai.com/v1")
+    args = parser.parse_args()
+
+    server, base_url = start_server(
+        args.recordings, args.port, args.latency, args.tokens_per_second,
+        record_path=args.record or None, upstream=args.upstream
+    )
+    mode = f"recording to {args.record}" if args.record else "replaying"
+    print(f"🎞️ Replay server {mode} at {base_url}")
+    print(f"   export OPENAI_BASE_URL={base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+        sys.exit(0)
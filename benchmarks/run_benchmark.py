@@ -0,0 +1,252 @@
+"""End-to-end pipeline benchmark against the local replay server.
+
+Runs every stage script over each requirements file in examples/ with
+OPENAI_BASE_URL pointed at benchmarks/replay_server.py, and records per stage:
+wall time, CPU time of the stage process (everything except model latency,
+which is spent waiting on the server), peak RSS and files written.
+
+Usage:
+    python benchmarks/run_benchmark.py run --output benchmarks/baselines/baseline.json
+    python benchmarks/run_benchmark.py compare benchmarks/baselines/baseline.json current.json
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from replay_server import DEFAULT_RECORDINGS, start_server
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CODES_DIR = os.path.join(REPO_ROOT, "codes")
+STAGES = ["planning", "analysis", "coding", "testing", "review"]
+DEFAULT_STAGES = STAGES
+
+# Metric -> absolute slack below which a change is treated as noise
+METRIC_NOISE_FLOOR = {
+    "wall_s": 0.05,
+    "cpu_s": 0.05,
+    "peak_rss_mb": 5.0,
+    "files_written": 0,
+}
+
+
+def stage_command(stage, project_name, requirements_path, artifacts_dir, repo_dir, model):
+    """Command line for one stage; all stages share one artifacts dir so they can read each other's trajectories."""
+    project_path = os.path.join(repo_dir, f"{project_name}_frontend")
+    common = ['--project_name', project_name, '--gpt_version', model, '--requirements_path', requirements_path]
+    if stage == "planning":
+        return ['1_planning.py', *common, '--output_dir', artifacts_dir]
+    if stage == "analysis":
+        return ['2_analyzing.py', *common, '--output_dir', artifacts_dir]
+    if stage == "coding":
+        return ['3_coding.py', *common, '--output_dir', artifacts_dir, '--output_repo_dir', repo_dir]
+    if stage == "testing":
+        return ['4_testing.py', *common, '--project_path', project_path,
+                '--test_types', 'unit,integration', '--output_dir', artifacts_dir]
+    if stage == "review":
+        return ['code_review.py', '--gpt_version', model, '--project_path', project_path,
+                '--output_file', os.path.join(artifacts_dir, "code_review.md")]
+    raise ValueError(f"Unknown stage: {stage}")
+
+
+def count_files(root):
+    return sum(len(files) for _, _, files in os.walk(root))
+
+
+def run_stage(command, env, log_path):
+    """Run one stage script and return its wall time, CPU time and peak RSS."""
+    with open(log_path, 'w') as log:
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, *command], cwd=CODES_DIR, env=env, stdout=log, stderr=subprocess.STDOUT
+        )
+        _, status, rusage = os.wait4(process.pid, 0)
+        wall = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    rss_divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "wall_s": round(wall, 4),
+        "cpu_s": round(rusage.ru_utime + rusage.ru_stime, 4),
+        "peak_rss_mb": round(rusage.ru_maxrss / rss_divisor, 2),
+        "exit_code": process.returncode,
+    }
+
+
+def run_example(requirements_path, stages, base_url, model):
+    project_name = os.path.splitext(os.path.basename(requirements_path))[0].replace("_requirements", "")
+    work_dir = tempfile.mkdtemp(prefix=f"bench_{project_name}_")
+    artifacts_dir = os.path.join(work_dir, "artifacts")
+    repo_dir = os.path.join(work_dir, "repo")
+    os.makedirs(artifacts_dir, exist_ok=True)
+    os.makedirs(repo_dir, exist_ok=True)
+
+    env = dict(os.environ, OPENAI_BASE_URL=base_url, OPENAI_API_KEY="replay")
+    results = {}
+    for stage in stages:
+        before = count_files(artifacts_dir) + count_files(repo_dir)
+        command = stage_command(stage, project_name, os.path.abspath(requirements_path),
+                                artifacts_dir, repo_dir, model)
+        metrics = run_stage(command, env, os.path.join(work_dir, f"{stage}.log"))
+        metrics["files_written"] = count_files(artifacts_dir) + count_files(repo_dir) - before
+        results[stage] = metrics
+        if metrics["exit_code"] != 0:
+            print(f"❌ {project_name}: {stage} exited with {metrics['exit_code']} (log: {work_dir}/{stage}.log)")
+            break
+    return results, work_dir
+
+
+def median_metrics(runs):
+    """Median of each numeric metric across repeated runs of the same stage."""
+    merged = {}
+    for key in runs[0]:
+        values = [run[key] for run in runs if key in run]
+        merged[key] = max(values) if key == "exit_code" else round(statistics.median(values), 4)
+    return merged
+
+
+def run_benchmark(args):
+    examples = sorted(glob.glob(os.path.join(args.examples_dir, "*.md")))
+    if not examples:
+        print(f"❌ No requirements files found in {args.examples_dir}")
+        sys.exit(1)
+    stages = [s.strip() for s in args.stages.split(',')]
+
+    server, base_url = start_server(args.recordings, 0, args.latency, args.tokens_per_second)
+    print(f"🎞️ Replay server at {base_url}")
+
+    report = {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "model": args.model,
+            "latency": args.latency,
+            "tokens_per_second": args.tokens_per_second,
+            "repeat": args.repeat,
+            "stages": stages,
+        },
+        "examples": {},
+    }
+
+    try:
+        for requirements_path in examples:
+            name = os.path.splitext(os.path.basename(requirements_path))[0]
+            print(f"⏱️ {name}")
+            runs = {}
+            for _ in range(args.repeat):
+                results, work_dir = run_example(requirements_path, stages, base_url, args.model)
+                for stage, metrics in results.items():
+                    runs.setdefault(stage, []).append(metrics)
+                if args.keep or any(m["exit_code"] for m in results.values()):
+                    print(f"   📂 Kept work dir: {work_dir}")
+                else:
+                    shutil.rmtree(work_dir, ignore_errors=True)
+            stage_results = {stage: median_metrics(stage_runs) for stage, stage_runs in runs.items()}
+            total = {
+                "wall_s": round(sum(m["wall_s"] for m in stage_results.values()), 4),
+                "cpu_s": round(sum(m["cpu_s"] for m in stage_results.values()), 4),
+                "peak_rss_mb": max((m["peak_rss_mb"] for m in stage_results.values()), default=0),
+                "files_written": sum(m["files_written"] for m in stage_results.values()),
+            }
+            report["examples"][name] = {"stages": stage_results, "total": total}
+            for stage, metrics in stage_results.items():
+                print(f"   {stage:<10} wall {metrics['wall_s']:>8.3f}s  cpu {metrics['cpu_s']:>7.3f}s  "
+                      f"rss {metrics['peak_rss_mb']:>7.1f}MB  files {metrics['files_written']:>4}")
+    finally:
+        server.shutdown()
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"📁 Results saved to: {args.output}")
+    return report
+
+
+def compare_reports(baseline, current, threshold):
+    """Return (rows, regressions) comparing every metric present in both reports."""
+    rows = []
+    regressions = []
+    for name, example in baseline["examples"].items():
+        current_example = current["examples"].get(name)
+        if current_example is None:
+            regressions.append((name, "-", "missing", None, None))
+            continue
+        sections = dict(example["stages"], total=example["total"])
+        current_sections = dict(current_example["stages"], total=current_example["total"])
+        for stage, metrics in sections.items():
+            current_metrics = current_sections.get(stage)
+            if current_metrics is None:
+                regressions.append((name, stage, "missing", None, None))
+                continue
+            for metric, floor in METRIC_NOISE_FLOOR.items():
+                if metric not in metrics or metric not in current_metrics:
+                    continue
+                old, new = metrics[metric], current_metrics[metric]
+                row = (name, stage, metric, old, new)
+                rows.append(row)
+                if metric == "files_written":
+                    if new != old:
+                        regressions.append(row)
+                elif new - old > floor and new > old * (1 + threshold):
+                    regressions.append(row)
+    return rows, regressions
+
+
+def compare_command(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    rows, regressions = compare_reports(baseline, current, args.threshold)
+    flagged = set(regressions)
+    print(f"{'example':<40} {'stage':<10} {'metric':<14} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, stage, metric, old, new in rows:
+        change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+        marker = "  ⚠️" if (name, stage, metric, old, new) in flagged else ""
+        print(f"{name:<40} {stage:<10} {metric:<14} {old:>10} {new:>10} {change:>8}{marker}")
+
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s) beyond {args.threshold:.0%}")
+        for name, stage, metric, old, new in regressions:
+            print(f"   {name} / {stage} / {metric}: {old} -> {new}")
+        sys.exit(1)
+    print(f"\n✅ No regressions beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help="Run the pipeline over examples/ and record metrics")
+    run_parser.add_argument('--examples_dir', type=str, default=os.path.join(REPO_ROOT, "examples"))
+    run_parser.add_argument('--stages', type=str, default=",".join(DEFAULT_STAGES),
+                            help=f"Comma-separated subset of {','.join(STAGES)}")
+    run_parser.add_argument('--model', type=str, default="gpt-4")
+    run_parser.add_argument('--recordings', type=str, nargs='*', default=[DEFAULT_RECORDINGS])
+    run_parser.add_argument('--latency', type=float, default=0.05)
+    run_parser.add_argument('--tokens_per_second', type=float, default=0.0)
+    run_parser.add_argument('--repeat', type=int, default=1)
+    run_parser.add_argument('--keep', action='store_true', help="Keep per-example work directories")
+    run_parser.add_argument('--output', type=str, default="")
+
+    compare_parser = subparsers.add_parser('compare', help="Flag regressions between two result files")
+    compare_parser.add_argument('baseline', type=str)
+    compare_parser.add_argument('current', type=str)
+    compare_parser.add_argument('--threshold', type=float, default=0.10)
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run_benchmark(args)
+    else:
+        compare_command(args)
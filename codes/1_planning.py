@@ -1,10 +1,18 @@
 from openai import OpenAI
-import json
 from tqdm import tqdm
 import argparse
 import os
 import sys
-from utils import print_response, print_log_cost, load_accumulated_cost, save_accumulated_cost
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils import print_response, print_log_cost, load_accumulated_cost, save_accumulated_cost, estimate_cost
+from tracing import span, submit, begin_stage
+from model_client import complete_with_retry
+from requirements_digest import load_stage_requirements
+from trajectory import write_turns
+from prompts import build_planning_messages, build_section_planning_messages, build_plan_merge_messages
+from planning_sections import (
+    split_requirements, needs_sections, merge_groups, group_title, DEFAULT_SECTION_TOKENS, DEFAULT_MERGE_TOKENS
+)
 
 parser = argparse.ArgumentParser()
 
@@ -13,6 +21,12 @@ parser.add_argument('--gpt_version', type=str, default="o3-mini")
 parser.add_argument('--requirements_format', type=str, default="markdown", choices=["markdown", "json", "text"])
 parser.add_argument('--requirements_path', type=str, required=True)
 parser.add_argument('--output_dir', type=str, default="")
+parser.add_argument('--raw_requirements', action='store_true', help="Plan from the raw requirements file instead of the condensed digest")
+parser.add_argument('--planning_mode', type=str, default="auto", choices=["auto", "single", "sections"],
+                    help="Plan in one call, per section with a merge pass, or per section only when the requirements exceed --section_tokens")
+parser.add_argument('--section_tokens', type=int, default=DEFAULT_SECTION_TOKENS, help="Largest requirements text planned in one call")
+parser.add_argument('--merge_tokens', type=int, default=DEFAULT_MERGE_TOKENS, help="Largest total of section plans merged in one call")
+parser.add_argument('--max_workers', type=int, default=8, help="Concurrent section planning calls")
 
 args = parser.parse_args()
 
@@ -23,55 +37,78 @@ gpt_version = args.gpt_version
 requirements_format = args.requirements_format
 requirements_path = args.requirements_path
 output_dir = args.output_dir
+raw_requirements = args.raw_requirements
+planning_mode = args.planning_mode
+section_tokens = args.section_tokens
+merge_tokens = args.merge_tokens
+max_workers = max(args.max_workers, 1)
 
-# Load requirements content
-if requirements_format == "markdown":
-    with open(f'{requirements_path}') as f:
-        requirements_content = f.read()
-elif requirements_format == "json":
-    with open(f'{requirements_path}') as f:
-        requirements_content = json.load(f)
-elif requirements_format == "text":
-    with open(f'{requirements_path}') as f:
-        requirements_content = f.read()
-else:
-    print(f"[ERROR] Invalid requirements format. Please select 'markdown', 'json', or 'text'.")
-    sys.exit(0)
-
-plan_msg = [
-    {'role': "system", "content": f"""You are an expert frontend architect and React developer with deep understanding of modern web development practices and user experience design.
-
-You will receive project requirements in {requirements_format} format.
-Your task is to create a detailed and efficient plan to build a React frontend application that meets all the specified requirements.
-
-This plan should include:
-1. Component architecture and hierarchy
-2. State management strategy
-3. Routing structure
-4. UI/UX considerations
-5. Technology stack selection
-6. Development approach
-
-Instructions:
-
-1. Align with Requirements: Your plan must strictly follow the features, user stories, and technical specifications described in the requirements.
-2. React Best Practices: Use modern React patterns, hooks, and functional components.
-3. Component Design: Plan for reusable, maintainable, and testable components.
-4. State Management: Choose appropriate state management (useState, useContext, Redux, Zustand) based on complexity.
-5. Responsive Design: Ensure mobile-first responsive design approach.
-6. Accessibility: Consider WCAG guidelines and semantic HTML.
-7. Performance: Plan for code splitting, lazy loading, and optimization.
-8. Testing Strategy: Include unit tests and integration tests planning.
-
-Format your response as a detailed implementation plan with clear sections and actionable steps."""},
-    
-    {'role': "user", "content": f"""Project Name: {project_name}
-
-Requirements:
-{requirements_content}
-
-Please create a comprehensive frontend development plan for this React application."""}
-]
+begin_stage("planning", project=project_name, model=gpt_version)
+
+# Load requirements content (the cached digest unless --raw_requirements)
+try:
+    requirements_content, requirements_format = load_stage_requirements(requirements_path, requirements_format, output_dir, raw=raw_requirements)
+except Exception as e:
+    print(f"❌ Error loading requirements: {str(e)}")
+    sys.exit(1)
+
+def complete(messages, max_tokens, **span_attrs):
+    """One planning completion, backing off when rate limited; returns (content, usage)."""
+    response = complete_with_retry(client, gpt_version, messages, 0.7, max_tokens, **span_attrs)
+    return response.choices[0].message.content, getattr(response, 'usage', None)
+
+def record_usage(usage):
+    """Add a call's tokens and cost to the accumulated cost."""
+    if usage:
+        cost_data["total_cost"] += estimate_cost(gpt_version, usage.prompt_tokens, usage.completion_tokens)
+        cost_data["total_tokens"] += usage.total_tokens
+
+def complete_all(calls, max_tokens):
+    """Run [(title, messages)] concurrently; returns [(title, content)] in input order."""
+    results = {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(calls))) as executor:
+        futures = {submit(executor, complete, messages, max_tokens, section=title): position
+                   for position, (title, messages) in enumerate(calls)}
+        for future in as_completed(futures):
+            position = futures[future]
+            content, usage = future.result()
+            record_usage(usage)
+            results[position] = (calls[position][0], content)
+            print(f"✅ {calls[position][0]}")
+    return [results[position] for position in range(len(calls))]
+
+def plan_in_sections():
+    """Map: plan each section concurrently. Reduce: merge the section plans in rounds
+    of groups that fit --merge_tokens. Returns (final merge messages, plan)."""
+    with span("build_prompt", stage="planning", phase="sections"):
+        project_context, sections = split_requirements(requirements_content, section_tokens, gpt_version)
+        calls = [(section.title, build_section_planning_messages(project_name, requirements_format, project_context,
+                                                                 section.title, section.content))
+                 for section in sections]
+    print(f"🧩 Planning {len(sections)} sections (up to {max_workers} concurrent calls)...")
+    section_plans = complete_all(calls, 2000)
+    if len(sections) == 1:
+        # Nothing to merge
+        return calls[0][1], section_plans[0][1]
+
+    round_number = 1
+    while True:
+        groups = merge_groups(section_plans, merge_tokens, gpt_version)
+        if len(groups) == 1:
+            break
+        # The plans do not fit one merge call: merge them in groups first
+        print(f"🔗 Merge round {round_number}: {len(section_plans)} plans in {len(groups)} groups")
+        calls = [(group_title(group), build_plan_merge_messages(project_name, project_context, group))
+                 for group in groups if len(group) > 1]
+        merged = iter(complete_all(calls, 4000))
+        section_plans = [group[0] if len(group) == 1 else next(merged) for group in groups]
+        round_number += 1
+
+    print(f"🔗 Merging {len(section_plans)} section plans...")
+    merge_msg = build_plan_merge_messages(project_name, project_context, groups[0])
+    plan_response, usage = complete(merge_msg, 4000, phase="merge")
+    record_usage(usage)
+    return merge_msg, plan_response
 
 # Initialize cost tracking
 cost_data = load_accumulated_cost(os.path.join(output_dir, "accumulated_cost.json"))
@@ -80,51 +117,33 @@ print(f"🎯 Planning frontend architecture for: {project_name}")
 print("=" * 60)
 
 try:
-    response = client.chat.completions.create(
-        model=gpt_version,
-        messages=plan_msg,
-        temperature=0.7,
-        max_tokens=4000
-    )
-    
-    plan_response = response.choices[0].message.content
-    
-    # Log usage and cost
-    if hasattr(response, 'usage'):
-        print_log_cost(response.usage._asdict(), gpt_version)
-        
-        # Update accumulated cost
-        prompt_tokens = response.usage.prompt_tokens
-        completion_tokens = response.usage.completion_tokens
-        total_tokens = response.usage.total_tokens
-        
-        if 'gpt-4' in gpt_version.lower():
-            cost = (prompt_tokens * 0.03 + completion_tokens * 0.06) / 1000
-        elif 'gpt-3.5' in gpt_version.lower():
-            cost = (prompt_tokens * 0.001 + completion_tokens * 0.002) / 1000
-        else:
-            cost = total_tokens * 0.001 / 1000
-        
-        cost_data["total_cost"] += cost
-        cost_data["total_tokens"] += total_tokens
-        save_accumulated_cost(cost_data, os.path.join(output_dir, "accumulated_cost.json"))
-    
+    if planning_mode == "sections" or planning_mode == "auto" and needs_sections(requirements_content, section_tokens, gpt_version):
+        plan_msg, plan_response = plan_in_sections()
+    else:
+        with span("build_prompt", stage="planning"):
+            plan_msg = build_planning_messages(project_name, requirements_format, requirements_content)
+        plan_response, usage = complete(plan_msg, 4000)
+        if usage:
+            print_log_cost(usage.model_dump(), gpt_version)
+        record_usage(usage)
+
+    save_accumulated_cost(cost_data, os.path.join(output_dir, "accumulated_cost.json"))
+
     # Print and save response
     print_response(plan_response, os.path.join(output_dir, "planning_response.md"))
-    
+
     # Save trajectories for next stage
     trajectories = [
         {'role': 'user', 'content': plan_msg[1]['content']},
         {'role': 'assistant', 'content': plan_response}
     ]
-    
-    with open(os.path.join(output_dir, "planning_trajectories.json"), 'w') as f:
-        json.dump(trajectories, f, indent=2)
-    
+
+    write_turns(os.path.join(output_dir, "planning_trajectories.jsonl"), trajectories, shared=[requirements_content])
+
     print(f"\n✅ Planning completed successfully!")
     print(f"📁 Output saved to: {output_dir}")
     print(f"💰 Total accumulated cost: ${cost_data['total_cost']:.4f}")
-    
+
 except Exception as e:
     print(f"❌ Error during planning: {str(e)}")
     sys.exit(1)
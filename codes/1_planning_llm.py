@@ -1,9 +1,14 @@
-import json
 import argparse
 import os
 import sys
 from utils import print_response, extract_frontend_planning
-from transformers import AutoTokenizer
+from tracing import span, begin_stage
+from requirements_digest import load_stage_requirements
+from trajectory import write_turns
+from prompts import build_planning_messages, build_section_planning_messages, build_plan_merge_messages, to_chat_prompt
+from planning_sections import (
+    split_requirements, needs_sections, merge_groups, group_title, DEFAULT_SECTION_TOKENS, DEFAULT_MERGE_TOKENS
+)
 from vllm import LLM, SamplingParams
 
 parser = argparse.ArgumentParser()
@@ -16,6 +21,11 @@ parser.add_argument('--max_model_len', type=int, default=128000)
 parser.add_argument('--requirements_format', type=str, default="markdown", choices=["markdown", "json", "text"])
 parser.add_argument('--requirements_path', type=str, required=True)
 parser.add_argument('--output_dir', type=str, default="")
+parser.add_argument('--raw_requirements', action='store_true', help="Plan from the raw requirements file instead of the condensed digest")
+parser.add_argument('--planning_mode', type=str, default="auto", choices=["auto", "single", "sections"],
+                    help="Plan in one call, per section with a merge pass, or per section only when the requirements exceed --section_tokens")
+parser.add_argument('--section_tokens', type=int, default=DEFAULT_SECTION_TOKENS, help="Largest requirements text planned in one call")
+parser.add_argument('--merge_tokens', type=int, default=DEFAULT_MERGE_TOKENS, help="Largest total of section plans merged in one call")
 
 args = parser.parse_args()
 
@@ -23,93 +33,84 @@ project_name = args.project_name
 requirements_format = args.requirements_format
 requirements_path = args.requirements_path
 output_dir = args.output_dir
+raw_requirements = args.raw_requirements
+planning_mode = args.planning_mode
+section_tokens = args.section_tokens
+merge_tokens = args.merge_tokens
 
 model_name = args.model_name
 tp_size = args.tp_size
 max_model_len = args.max_model_len
 temperature = args.temperature
 
-# Load requirements content
-if requirements_format == "markdown":
-    with open(f'{requirements_path}') as f:
-        requirements_content = f.read()
-elif requirements_format == "json":
-    with open(f'{requirements_path}') as f:
-        requirements_content = json.load(f)
-elif requirements_format == "text":
-    with open(f'{requirements_path}') as f:
-        requirements_content = f.read()
-else:
-    print(f"[ERROR] Invalid requirements format. Please select 'markdown', 'json', or 'text'.")
-    sys.exit(0)
+begin_stage("planning", project=project_name, model=model_name)
 
-plan_msg = [
-    {'role': "system", "content": f"""You are an expert frontend architect and React developer with deep understanding of modern web development practices and user experience design.
-
-You will receive project requirements in {requirements_format} format.
-Your task is to create a detailed and efficient plan to build a React frontend application that meets all the specified requirements.
-
-This plan should include:
-1. Component architecture and hierarchy
-2. State management strategy
-3. Routing structure
-4. UI/UX considerations
-5. Technology stack selection
-6. Development approach
-
-Instructions:
-
-1. Align with Requirements: Your plan must strictly follow the features, user stories, and technical specifications described in the requirements.
-2. React Best Practices: Use modern React patterns, hooks, and functional components.
-3. Component Design: Plan for reusable, maintainable, and testable components.
-4. State Management: Choose appropriate state management (useState, useContext, Redux, Zustand) based on complexity.
-5. Responsive Design: Ensure mobile-first responsive design approach.
-6. Accessibility: Consider WCAG guidelines and semantic HTML.
-7. Performance: Plan for code splitting, lazy loading, and optimization.
-8. Testing Strategy: Include unit tests and integration tests planning.
-
-Format your response as a detailed implementation plan with clear sections and actionable steps."""},
-    
-    {'role': "user", "content": f"""Project Name: {project_name}
-
-Requirements:
-{requirements_content}
+# Load requirements content (the cached digest unless --raw_requirements)
+try:
+    requirements_content, requirements_format = load_stage_requirements(requirements_path, requirements_format, output_dir, raw=raw_requirements)
+except Exception as e:
+    print(f"❌ Error loading requirements: {str(e)}")
+    sys.exit(1)
 
-Please create a comprehensive frontend development plan for this React application."""}
-]
+def generate(messages_list, max_tokens, **span_attrs):
+    """One batched vLLM generate over several chats; returns the response texts in order."""
+    params = SamplingParams(temperature=temperature, max_tokens=max_tokens, top_p=0.95)
+    with span("model_call", model=model_name, prompts=len(messages_list), **span_attrs) as call_span:
+        outputs = llm.generate([to_chat_prompt(messages) for messages in messages_list], params)
+        call_span.set(prompt_tokens=sum(len(output.prompt_token_ids) for output in outputs),
+                      completion_tokens=sum(len(output.outputs[0].token_ids) for output in outputs))
+    return [output.outputs[0].text for output in outputs]
+
+def plan_in_sections():
+    """Plan every section in one batch, then merge the section plans in batched rounds
+    of groups that fit --merge_tokens. Returns (final merge messages, plan)."""
+    with span("build_prompt", stage="planning", phase="sections"):
+        project_context, sections = split_requirements(requirements_content, section_tokens, model_name)
+        section_msgs = [build_section_planning_messages(project_name, requirements_format, project_context,
+                                                        section.title, section.content)
+                        for section in sections]
+    print(f"🧩 Planning {len(sections)} sections in one batch...")
+    section_plans = list(zip([section.title for section in sections], generate(section_msgs, 2000, phase="sections")))
+    if len(sections) == 1:
+        # Nothing to merge
+        return section_msgs[0], section_plans[0][1]
+
+    while True:
+        groups = merge_groups(section_plans, merge_tokens, model_name)
+        if len(groups) == 1:
+            break
+        # The plans do not fit one merge call: merge them in groups first
+        print(f"🔗 Merging {len(section_plans)} plans in {len(groups)} groups...")
+        multi = [group for group in groups if len(group) > 1]
+        merged = iter(generate([build_plan_merge_messages(project_name, project_context, group) for group in multi],
+                               4000, phase="merge"))
+        section_plans = [group[0] if len(group) == 1 else (group_title(group), next(merged)) for group in groups]
+
+    print(f"🔗 Merging {len(section_plans)} section plans...")
+    merge_msg = build_plan_merge_messages(project_name, project_context, groups[0])
+    return merge_msg, generate([merge_msg], 4000, phase="merge")[0]
 
 print(f"🤖 Loading model: {model_name}")
 
 # Initialize vLLM
 try:
-    llm = LLM(
-        model=model_name,
-        tensor_parallel_size=tp_size,
-        max_model_len=max_model_len,
-        trust_remote_code=True
-    )
-    
-    # Set up sampling parameters
-    sampling_params = SamplingParams(
-        temperature=temperature,
-        max_tokens=4000,
-        top_p=0.95
-    )
+    with span("load_model", model=model_name):
+        llm = LLM(
+            model=model_name,
+            tensor_parallel_size=tp_size,
+            max_model_len=max_model_len,
+            trust_remote_code=True
+        )
     
     print(f"🎯 Planning frontend architecture for: {project_name}")
     print("=" * 60)
-    
-    # Format prompt for the model
-    prompt = f"""<|im_start|>system
-{plan_msg[0]['content']}<|im_end|>
-<|im_start|>user
-{plan_msg[1]['content']}<|im_end|>
-<|im_start|>assistant
-"""
 
-    # Generate response
-    outputs = llm.generate([prompt], sampling_params)
-    plan_response = outputs[0].outputs[0].text
+    if planning_mode == "sections" or planning_mode == "auto" and needs_sections(requirements_content, section_tokens, model_name):
+        plan_msg, plan_response = plan_in_sections()
+    else:
+        with span("build_prompt", stage="planning"):
+            plan_msg = build_planning_messages(project_name, requirements_format, requirements_content)
+        plan_response = generate([plan_msg], 4000)[0]
     
     # Print and save response
     print_response(plan_response, os.path.join(output_dir, "planning_response.md"))
@@ -120,8 +121,7 @@ try:
         {'role': 'assistant', 'content': plan_response}
     ]
     
-    with open(os.path.join(output_dir, "planning_trajectories.json"), 'w') as f:
-        json.dump(trajectories, f, indent=2)
+    write_turns(os.path.join(output_dir, "planning_trajectories.jsonl"), trajectories, shared=[requirements_content])
     
     print(f"\n✅ Planning completed successfully!")
     print(f"📁 Output saved to: {output_dir}")
@@ -1,9 +1,12 @@
 from openai import OpenAI
-import json
 import os
 from tqdm import tqdm
 import sys
-from utils import extract_frontend_planning, content_to_json, print_response, print_log_cost, load_accumulated_cost, save_accumulated_cost
+from utils import extract_frontend_planning, content_to_json, print_response, print_log_cost, load_accumulated_cost, save_accumulated_cost, estimate_cost
+from tracing import span, begin_stage
+from requirements_digest import load_stage_requirements
+from trajectory import write_turns, append_turns, copy_trajectory, trajectory_path
+from prompts import build_analysis_messages
 import copy
 import argparse
 
@@ -25,22 +28,17 @@ requirements_format = args.requirements_format
 requirements_path = args.requirements_path
 output_dir = args.output_dir
 
-# Load requirements content
-if requirements_format == "markdown":
-    with open(f'{requirements_path}') as f:
-        requirements_content = f.read()
-elif requirements_format == "json":
-    with open(f'{requirements_path}') as f:
-        requirements_content = json.load(f)
-elif requirements_format == "text":
-    with open(f'{requirements_path}') as f:
-        requirements_content = f.read()
-else:
-    print(f"[ERROR] Invalid requirements format. Please select 'markdown', 'json', or 'text'.")
-    sys.exit(0)
+begin_stage("analysis", project=project_name, model=gpt_version)
+
+# Load requirements content (the cached digest)
+try:
+    requirements_content, requirements_format = load_stage_requirements(requirements_path, requirements_format, output_dir)
+except Exception as e:
+    print(f"❌ Error loading requirements: {str(e)}")
+    sys.exit(1)
 
 # Extract planning context
-context_lst = extract_frontend_planning(f'{output_dir}/planning_trajectories.json')
+context_lst = extract_frontend_planning(trajectory_path(output_dir, "planning"))
 
 # Load planning config if exists
 planning_config = ""
@@ -48,63 +46,10 @@ if os.path.exists(f'{output_dir}/planning_config.yaml'):
     with open(f'{output_dir}/planning_config.yaml') as f:
         planning_config = f.read()
 
-analysis_msg = [
-    {'role': "system", "content": f"""You are an expert frontend architect, UX/UI designer, and React developer with deep understanding of component design patterns, state management, and modern web development practices.
-
-You will receive project requirements in {requirements_format} format along with the planning output from the previous stage.
-Your task is to create detailed technical analysis and component specifications for the React frontend application.
-
-This analysis should include:
-
-1. **Component Breakdown**: Detailed specification of each React component with:
-   - Props interface (TypeScript)
-   - State requirements
-   - Event handlers
-   - Styling approach
-   - Accessibility considerations
-
-2. **State Management Design**: 
-   - Global state structure
-   - Local component state
-   - Data flow patterns
-   - API integration points
-
-3. **Routing Architecture**:
-   - Route definitions
-   - Protected routes
-   - Navigation structure
-   - URL parameters
-
-4. **UI/UX Specifications**:
-   - Layout system
-   - Responsive breakpoints
-   - Color scheme and theming
-   - Typography scale
-   - Animation and transitions
-
-5. **Data Models**:
-   - TypeScript interfaces
-   - API response types
-   - Form validation schemas
-
-6. **Integration Requirements**:
-   - External APIs
-   - Authentication flow
-   - Error handling
-   - Loading states
-
-Format your response as detailed technical specifications that can be directly implemented by developers."""},
-    
-    {'role': "user", "content": f"""Project Name: {project_name}
-
-Original Requirements:
-{requirements_content}
-
-Planning Output:
-{context_lst[0] if context_lst else "No planning context available"}
-
-Please provide detailed technical analysis and component specifications for this React frontend application."""}
-]
+with span("build_prompt", stage="analysis"):
+    analysis_msg = build_analysis_messages(
+        project_name, requirements_format, requirements_content, context_lst[0] if context_lst else None
+    )
 
 # Initialize cost tracking
 cost_data = load_accumulated_cost(os.path.join(output_dir, "accumulated_cost.json"))
@@ -113,30 +58,28 @@ print(f"🔍 Analyzing technical specifications for: {project_name}")
 print("=" * 60)
 
 try:
-    response = client.chat.completions.create(
-        model=gpt_version,
-        messages=analysis_msg,
-        temperature=0.3,
-        max_tokens=6000
-    )
+    with span("model_call", model=gpt_version) as call_span:
+        response = client.chat.completions.create(
+            model=gpt_version,
+            messages=analysis_msg,
+            temperature=0.3,
+            max_tokens=6000
+        )
+        if getattr(response, 'usage', None):
+            call_span.set(prompt_tokens=response.usage.prompt_tokens, completion_tokens=response.usage.completion_tokens)
     
     analysis_response = response.choices[0].message.content
     
     # Log usage and cost
     if hasattr(response, 'usage'):
-        print_log_cost(response.usage._asdict(), gpt_version)
+        print_log_cost(response.usage.model_dump(), gpt_version)
         
         # Update accumulated cost
         prompt_tokens = response.usage.prompt_tokens
         completion_tokens = response.usage.completion_tokens
         total_tokens = response.usage.total_tokens
         
-        if 'gpt-4' in gpt_version.lower():
-            cost = (prompt_tokens * 0.03 + completion_tokens * 0.06) / 1000
-        elif 'gpt-3.5' in gpt_version.lower():
-            cost = (prompt_tokens * 0.001 + completion_tokens * 0.002) / 1000
-        else:
-            cost = total_tokens * 0.001 / 1000
+        cost = estimate_cost(gpt_version, prompt_tokens, completion_tokens)
         
         cost_data["total_cost"] += cost
         cost_data["total_tokens"] += total_tokens
@@ -145,20 +88,19 @@ try:
     # Print and save response
     print_response(analysis_response, os.path.join(output_dir, "analysis_response.md"))
     
-    # Update trajectories for next stage
-    if os.path.exists(f'{output_dir}/planning_trajectories.json'):
-        with open(f'{output_dir}/planning_trajectories.json', 'r') as f:
-            trajectories = json.load(f)
+    # Update trajectories for next stage: copy the planning turns and append ours
+    analysis_trajectories_path = os.path.join(output_dir, "analysis_trajectories.jsonl")
+    planning_trajectories_path = trajectory_path(output_dir, "planning")
+    if os.path.exists(planning_trajectories_path):
+        copy_trajectory(planning_trajectories_path, analysis_trajectories_path)
     else:
-        trajectories = []
+        write_turns(analysis_trajectories_path, [])
     
-    trajectories.extend([
+    # The requirements and the plan embedded in our prompt are stored once and referenced
+    append_turns(analysis_trajectories_path, [
         {'role': 'user', 'content': analysis_msg[1]['content']},
         {'role': 'assistant', 'content': analysis_response}
-    ])
-    
-    with open(os.path.join(output_dir, "analysis_trajectories.json"), 'w') as f:
-        json.dump(trajectories, f, indent=2)
+    ], shared=[requirements_content] + context_lst[:1])
     
     print(f"\n✅ Technical analysis completed successfully!")
     print(f"📁 Output saved to: {output_dir}")
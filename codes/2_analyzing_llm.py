@@ -1,9 +1,11 @@
-import json
 import argparse
 import os
 import sys
 from utils import print_response, extract_frontend_planning
-from transformers import AutoTokenizer
+from tracing import span, begin_stage
+from requirements_digest import load_stage_requirements
+from trajectory import write_turns, append_turns, copy_trajectory, trajectory_path
+from prompts import build_analysis_messages, to_chat_prompt
 from vllm import LLM, SamplingParams
 
 parser = argparse.ArgumentParser()
@@ -29,91 +31,34 @@ tp_size = args.tp_size
 max_model_len = args.max_model_len
 temperature = args.temperature
 
-# Load requirements content
-if requirements_format == "markdown":
-    with open(f'{requirements_path}') as f:
-        requirements_content = f.read()
-elif requirements_format == "json":
-    with open(f'{requirements_path}') as f:
-        requirements_content = json.load(f)
-elif requirements_format == "text":
-    with open(f'{requirements_path}') as f:
-        requirements_content = f.read()
-else:
-    print(f"[ERROR] Invalid requirements format. Please select 'markdown', 'json', or 'text'.")
-    sys.exit(0)
+begin_stage("analysis", project=project_name, model=model_name)
 
-# Extract planning context
-context_lst = extract_frontend_planning(f'{output_dir}/planning_trajectories.json')
-
-analysis_msg = [
-    {'role': "system", "content": f"""You are an expert frontend architect, UX/UI designer, and React developer with deep understanding of component design patterns, state management, and modern web development practices.
-
-You will receive project requirements in {requirements_format} format along with the planning output from the previous stage.
-Your task is to create detailed technical analysis and component specifications for the React frontend application.
-
-This analysis should include:
-
-1. **Component Breakdown**: Detailed specification of each React component with:
-   - Props interface (TypeScript)
-   - State requirements
-   - Event handlers
-   - Styling approach
-   - Accessibility considerations
-
-2. **State Management Design**: 
-   - Global state structure
-   - Local component state
-   - Data flow patterns
-   - API integration points
-
-3. **Routing Architecture**:
-   - Route definitions
-   - Protected routes
-   - Navigation structure
-   - URL parameters
-
-4. **UI/UX Specifications**:
-   - Layout system
-   - Responsive breakpoints
-   - Color scheme and theming
-   - Typography scale
-   - Animation and transitions
-
-5. **Data Models**:
-   - TypeScript interfaces
-   - API response types
-   - Form validation schemas
-
-6. **Integration Requirements**:
-   - External APIs
-   - Authentication flow
-   - Error handling
-   - Loading states
-
-Format your response as detailed technical specifications that can be directly implemented by developers."""},
-    
-    {'role': "user", "content": f"""Project Name: {project_name}
-
-Original Requirements:
-{requirements_content}
+# Load requirements content (the cached digest)
+try:
+    requirements_content, requirements_format = load_stage_requirements(requirements_path, requirements_format, output_dir)
+except Exception as e:
+    print(f"❌ Error loading requirements: {str(e)}")
+    sys.exit(1)
 
-Planning Output:
-{context_lst[0] if context_lst else "No planning context available"}
+# Extract planning context
+context_lst = extract_frontend_planning(trajectory_path(output_dir, "planning"))
 
-Please provide detailed technical analysis and component specifications for this React frontend application."""}
-]
+with span("build_prompt", stage="analysis"):
+    analysis_msg = build_analysis_messages(
+        project_name, requirements_format, requirements_content, context_lst[0] if context_lst else None
+    )
 
 print(f"🤖 Loading model: {model_name}")
 
 # Initialize vLLM
 try:
-    llm = LLM(
-        model=model_name,
-        tensor_parallel_size=tp_size,
-        max_model_len=max_model_len,
-        trust_remote_code=True
-    )
+    with span("load_model", model=model_name):
+        llm = LLM(
+            model=model_name,
+            tensor_parallel_size=tp_size,
+            max_model_len=max_model_len,
+            trust_remote_code=True
+        )
     
     # Set up sampling parameters
     sampling_params = SamplingParams(
@@ -126,34 +71,30 @@ try:
     print("=" * 60)
     
     # Format prompt for the model
-    prompt = f"""<|im_start|>system
-{analysis_msg[0]['content']}<|im_end|>
-<|im_start|>user
-{analysis_msg[1]['content']}<|im_end|>
-<|im_start|>assistant
-"""
+    prompt = to_chat_prompt(analysis_msg)
 
     # Generate response
-    outputs = llm.generate([prompt], sampling_params)
+    with span("model_call", model=model_name) as call_span:
+        outputs = llm.generate([prompt], sampling_params)
+        call_span.set(prompt_tokens=len(outputs[0].prompt_token_ids), completion_tokens=len(outputs[0].outputs[0].token_ids))
     analysis_response = outputs[0].outputs[0].text
     
     # Print and save response
     print_response(analysis_response, os.path.join(output_dir, "analysis_response.md"))
     
-    # Update trajectories for next stage
-    if os.path.exists(f'{output_dir}/planning_trajectories.json'):
-        with open(f'{output_dir}/planning_trajectories.json', 'r') as f:
-            trajectories = json.load(f)
+    # Update trajectories for next stage: copy the planning turns and append ours
+    analysis_trajectories_path = os.path.join(output_dir, "analysis_trajectories.jsonl")
+    planning_trajectories_path = trajectory_path(output_dir, "planning")
+    if os.path.exists(planning_trajectories_path):
+        copy_trajectory(planning_trajectories_path, analysis_trajectories_path)
     else:
-        trajectories = []
+        write_turns(analysis_trajectories_path, [])
     
-    trajectories.extend([
+    # The requirements and the plan embedded in our prompt are stored once and referenced
+    append_turns(analysis_trajectories_path, [
         {'role': 'user', 'content': analysis_msg[1]['content']},
         {'role': 'assistant', 'content': analysis_response}
-    ])
-    
-    with open(os.path.join(output_dir, "analysis_trajectories.json"), 'w') as f:
-        json.dump(trajectories, f, indent=2)
+    ], shared=[requirements_content] + context_lst[:1])
     
     print(f"\n✅ Technical analysis completed successfully!")
     print(f"📁 Output saved to: {output_dir}")
@@ -2,20 +2,29 @@ from openai import OpenAI
 import json
 import os
 from tqdm import tqdm
-import re
 import sys
-import copy
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from utils import (
     extract_frontend_planning, 
-    content_to_json, 
-    extract_react_code_from_content, 
     print_response, 
     print_log_cost, 
     load_accumulated_cost, 
     save_accumulated_cost,
+    estimate_cost,
     generate_package_json,
-    create_folder_structure
+    basic_project_files,
+    create_folder_structure,
+    resolve_component_file,
+    collect_component_files
 )
+from tracing import span, submit, begin_stage
+from model_client import create_with_retry
+from requirements_digest import load_stage_requirements
+from prompts import build_coding_messages
+from project_writer import ProjectWriter, ArchiveWriter
+from trajectory import trajectory_path
+from fence_parser import FenceParser, REACT_LANGUAGES
+from component_plan import load_components, dependency_waves, dependency_context
 import argparse
 
 parser = argparse.ArgumentParser()
@@ -26,6 +35,9 @@ parser.add_argument('--requirements_format', type=str, default="markdown", choic
 parser.add_argument('--requirements_path', type=str, required=True)
 parser.add_argument('--output_dir', type=str, default="")
 parser.add_argument('--output_repo_dir', type=str, default="")
+parser.add_argument('--archive', type=str, default="", help="Stream the project into this .tar.gz/.zip instead of output_repo_dir ('-' for stdout)")
+parser.add_argument('--archive_format', type=str, default=None, choices=["tar.gz", "zip"], help="Defaults to the --archive extension, tar.gz for stdout")
+parser.add_argument('--max_workers', type=int, default=8, help="Concurrent model calls within a dependency wave")
 
 args = parser.parse_args()
 client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
@@ -36,304 +48,182 @@ requirements_format = args.requirements_format
 requirements_path = args.requirements_path
 output_dir = args.output_dir
 output_repo_dir = args.output_repo_dir
+archive = args.archive
+max_workers = max(args.max_workers, 1)
 
-# Load requirements content
-if requirements_format == "markdown":
-    with open(f'{requirements_path}') as f:
-        requirements_content = f.read()
-elif requirements_format == "json":
-    with open(f'{requirements_path}') as f:
-        requirements_content = json.load(f)
-elif requirements_format == "text":
-    with open(f'{requirements_path}') as f:
-        requirements_content = f.read()
-else:
-    print(f"[ERROR] Invalid requirements format. Please select 'markdown', 'json', or 'text'.")
-    sys.exit(0)
-
-# Extract context from previous stages
-context_lst = extract_frontend_planning(f'{output_dir}/analysis_trajectories.json')
+begin_stage("coding", project=project_name, model=gpt_version)
 
-# Create project folder structure
-project_path = create_folder_structure(output_repo_dir, project_name)
+# Load requirements content (the cached digest)
+try:
+    requirements_content, requirements_format = load_stage_requirements(requirements_path, requirements_format, output_dir)
+except Exception as e:
+    print(f"❌ Error loading requirements: {str(e)}")
+    sys.exit(1)
 
-# Define components to generate based on analysis
-components_to_generate = [
-    {
-        "name": "App",
-        "type": "main",
-        "path": "src/App.tsx",
-        "description": "Main application component with routing"
-    },
-    {
-        "name": "Layout",
-        "type": "layout",
-        "path": "src/components/Layout.tsx",
-        "description": "Main layout component with header, sidebar, footer"
-    },
-    {
-        "name": "Header",
-        "type": "component",
-        "path": "src/components/Header.tsx",
-        "description": "Application header with navigation"
-    },
-    {
-        "name": "Sidebar",
-        "type": "component", 
-        "path": "src/components/Sidebar.tsx",
-        "description": "Navigation sidebar component"
-    },
-    {
-        "name": "Dashboard",
-        "type": "page",
-        "path": "src/pages/Dashboard.tsx",
-        "description": "Main dashboard page"
-    }
-]
+# Extract context from previous stages
+context_lst = extract_frontend_planning(trajectory_path(output_dir, "analysis"))
+
+if archive:
+    # Archive mode: no project directory, every file goes straight into the archive
+    project_path = f"{project_name}_frontend"
+    if archive == "-":
+        # stdout carries the archive, so logs go to stderr
+        archive_stream = sys.stdout.buffer
+        sys.stdout = sys.stderr
+        project_writer = ArchiveWriter(archive_stream, project_path, args.archive_format or "tar.gz")
+    else:
+        project_writer = ArchiveWriter(archive, project_path, args.archive_format)
+else:
+    # Create project folder structure
+    project_path = create_folder_structure(output_repo_dir, project_name)
+    # Files only change on disk when their content does, and never half-written
+    project_writer = ProjectWriter(project_path)
+
+# Components and their dependencies come from the analysis manifest
+analysis_context = context_lst[-1] if context_lst else None
+components_to_generate = load_components(analysis_context)
+# Paths owned by a component or by the boilerplate; other components' files may not claim them
+reserved_paths = {component['path'] for component in components_to_generate} | set(basic_project_files(project_name, {}))
+waves = dependency_waves(components_to_generate)
 
 # Initialize cost tracking
 cost_data = load_accumulated_cost(os.path.join(output_dir, "accumulated_cost.json"))
 
 print(f"⚛️ Generating React components for: {project_name}")
+print(f"📋 {len(components_to_generate)} components in {len(waves)} dependency waves (up to {max_workers} concurrent calls)")
 print("=" * 60)
 
 generated_files = {}
 
-# Generate each component
-for component in tqdm(components_to_generate, desc="Generating components"):
+def generate_component(component, dependency_signatures):
+    """Generate one component, writing each labelled file as soon as its block closes.
     
-    coding_msg = [
-        {'role': "system", "content": f"""You are an expert React developer and TypeScript specialist with deep knowledge of modern frontend development practices, component architecture, and code quality.
-
-You will receive project requirements and technical analysis to generate high-quality React components.
-
-Your task is to generate production-ready React component code that:
-
-1. **Modern React Patterns**:
-   - Functional components with hooks
-   - TypeScript with proper type definitions
-   - Clean, readable, and maintainable code
-
-2. **Code Quality**:
-   - Proper error handling
-   - Loading states
-   - Accessibility (ARIA labels, semantic HTML)
-   - Performance optimizations (useMemo, useCallback when needed)
-
-3. **Styling**:
-   - Use CSS modules or styled-components
-   - Responsive design
-   - Modern CSS practices
-
-4. **Component Structure**:
-   - Clear props interface
-   - Proper component composition
-   - Reusable and testable
-
-5. **Best Practices**:
-   - ESLint and Prettier compliant
-   - Consistent naming conventions
-   - Clear comments for complex logic
-
-Generate ONLY the component code for {component['name']} ({component['type']}).
-Include all necessary imports, types, and styling.
-Make sure the code is complete and ready to use.
-
-Format your response with the complete component code wrapped in ```tsx code blocks."""},
-        
-        {'role': "user", "content": f"""Project Name: {project_name}
-
-Component to Generate: {component['name']} ({component['type']})
-Description: {component['description']}
-File Path: {component['path']}
-
-Original Requirements:
-{requirements_content}
-
-Technical Analysis:
-{context_lst[0] if context_lst else "No analysis context available"}
-
-Generate the complete React component code for {component['name']}."""}
-    ]
-    
-    try:
-        response = client.chat.completions.create(
-            model=gpt_version,
-            messages=coding_msg,
-            temperature=0.2,
-            max_tokens=3000
+    Runs on a worker thread; returns (component_files, rejected, response, usage).
+    """
+    with span("build_prompt", stage="coding", component=component['name']):
+        coding_msg = build_coding_messages(
+            project_name, component, requirements_content, analysis_context, dependency_signatures
         )
-        
-        coding_response = response.choices[0].message.content
-        
-        # Log usage and cost
-        if hasattr(response, 'usage'):
-            print_log_cost(response.usage._asdict(), gpt_version)
-            
-            # Update accumulated cost
-            prompt_tokens = response.usage.prompt_tokens
-            completion_tokens = response.usage.completion_tokens
-            total_tokens = response.usage.total_tokens
-            
-            if 'gpt-4' in gpt_version.lower():
-                cost = (prompt_tokens * 0.03 + completion_tokens * 0.06) / 1000
-            elif 'gpt-3.5' in gpt_version.lower():
-                cost = (prompt_tokens * 0.001 + completion_tokens * 0.002) / 1000
-            else:
-                cost = total_tokens * 0.001 / 1000
-            
-            cost_data["total_cost"] += cost
-            cost_data["total_tokens"] += total_tokens
-        
-        # Extract and save component code
-        code_blocks = extract_react_code_from_content(coding_response)
-        
-        if code_blocks:
-            component_code = code_blocks[0]  # Take the first/main code block
-            
-            # Save component file
-            full_file_path = os.path.join(project_path, component['path'])
-            os.makedirs(os.path.dirname(full_file_path), exist_ok=True)
-            
-            with open(full_file_path, 'w', encoding='utf-8') as f:
-                f.write(component_code)
-            
-            generated_files[component['name']] = {
-                'path': component['path'],
-                'code': component_code,
-                'full_response': coding_response
-            }
-            
-            print(f"✅ Generated {component['name']} component")
-        
-        # Save full response for debugging
-        response_file = os.path.join(output_dir, f"coding_{component['name'].lower()}_response.md")
-        print_response(coding_response, response_file)
-        
-    except Exception as e:
-        print(f"❌ Error generating {component['name']}: {str(e)}")
-        continue
-
-# Generate package.json
-package_json = generate_package_json(project_name, str(requirements_content))
-package_json_path = os.path.join(project_path, "package.json")
-with open(package_json_path, 'w', encoding='utf-8') as f:
-    json.dump(package_json, f, indent=2)
-
-print(f"✅ Generated package.json")
-
-# Generate basic files
-basic_files = {
-    "public/index.html": '''<!DOCTYPE html>
-<html lang="en">
-  <head>
-    <meta charset="utf-8" />
-    <link rel="icon" href="%PUBLIC_URL%/favicon.ico" />
-    <meta name="viewport" content="width=device-width, initial-scale=1" />
-    <meta name="theme-color" content="#000000" />
-    <meta name="description" content="Generated React application" />
-    <title>''' + project_name + '''</title>
-  </head>
-  <body>
-    <noscript>You need to enable JavaScript to run this app.</noscript>
-    <div id="root"></div>
-  </body>
-</html>''',
     
-    "src/index.tsx": '''import React from 'react';
-import ReactDOM from 'react-dom/client';
-import './index.css';
-import App from './App';
-
-const root = ReactDOM.createRoot(
-  document.getElementById('root') as HTMLElement
-);
-root.render(
-  <React.StrictMode>
-    <App />
-  </React.StrictMode>
-);''',
+    fence_parser = FenceParser()
+    written = {}
+    response_chunks = []
+    usage = None
     
-    "src/index.css": '''body {
-  margin: 0;
-  font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', 'Roboto', 'Oxygen',
-    'Ubuntu', 'Cantarell', 'Fira Sans', 'Droid Sans', 'Helvetica Neue',
-    sans-serif;
-  -webkit-font-smoothing: antialiased;
-  -moz-osx-font-smoothing: grayscale;
-}
-
-code {
-  font-family: source-code-pro, Menlo, Monaco, Consolas, 'Courier New',
-    monospace;
-}
-
-* {
-  box-sizing: border-box;
-}''',
-
-    "README.md": f'''# {project_name}
-
-This React application was generated automatically from project requirements.
-
-## Getting Started
-
-### Prerequisites
-- Node.js (version 14 or higher)
-- npm or yarn
-
-### Installation
-
-1. Install dependencies:
-```bash
-npm install
-```
-
-2. Start the development server:
-```bash
-npm start
-```
-
-3. Open [http://localhost:3000](http://localhost:3000) to view it in the browser.
-
-## Available Scripts
-
-- `npm start` - Runs the app in development mode
-- `npm test` - Launches the test runner
-- `npm run build` - Builds the app for production
-- `npm run eject` - Ejects from Create React App (one-way operation)
-
-## Project Structure
-
-```
-src/
-├── components/     # Reusable UI components
-├── pages/         # Page components
-├── hooks/         # Custom React hooks
-├── utils/         # Utility functions
-├── types/         # TypeScript type definitions
-└── styles/        # CSS and styling files
-```
+    with span("model_call", model=gpt_version, component=component['name']) as call_span:
+        stream = create_with_retry(client, model=gpt_version, messages=coding_msg, temperature=0.2, max_tokens=3000,
+                                   stream=True, stream_options={"include_usage": True})
+        for chunk in stream:
+            if getattr(chunk, 'usage', None):
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content or ""
+            response_chunks.append(delta)
+            # Write each labelled file as soon as its block closes, before generation finishes
+            for block in fence_parser.feed(delta):
+                if not block.filename or not block.code:
+                    continue
+                try:
+                    path = resolve_component_file(block.filename, component['path'])
+                except ValueError:
+                    continue  # reported once the response is complete
+                if path in written:
+                    continue
+                if path == component['path']:
+                    # Its own path takes the first React block, as select_component_block picks it
+                    if block.language not in REACT_LANGUAGES:
+                        continue
+                elif path in reserved_paths:
+                    continue
+                project_writer.write(path, block.code, owner=component['name'])
+                written[path] = block.code
+        fence_parser.close()
+        if usage:
+            call_span.set(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+    
+    # Unlabelled main block (or anything streamed differently) is written now
+    component_files, rejected = collect_component_files(fence_parser.blocks, component, reserved_paths)
+    for path, code in component_files.items():
+        if path in written:
+            # A path is written once per run; report what is on disk
+            component_files[path] = written[path]
+        else:
+            project_writer.write(path, code, owner=component['name'])
+    
+    return component_files, rejected, "".join(response_chunks), usage
+
+# Generate components wave by wave; a wave only depends on earlier waves
+with tqdm(total=len(components_to_generate), desc="Generating components") as progress:
+    for wave_number, wave in enumerate(waves, 1):
+        with span("wave", number=wave_number, components=len(wave)):
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(wave))) as executor:
+                futures = {
+                    submit(executor, generate_component, component, dependency_context(component, generated_files)): component
+                    for component in wave
+                }
+                for future in as_completed(futures):
+                    component = futures[future]
+                    progress.update(1)
+                    try:
+                        component_files, rejected, coding_response, usage = future.result()
+                    except Exception as e:
+                        print(f"❌ Error generating {component['name']}: {str(e)}")
+                        continue
+                    
+                    # Log usage and cost
+                    if usage:
+                        print_log_cost(usage.model_dump(), gpt_version)
+                        
+                        # Update accumulated cost
+                        cost = estimate_cost(gpt_version, usage.prompt_tokens, usage.completion_tokens)
+                        
+                        cost_data["total_cost"] += cost
+                        cost_data["total_tokens"] += usage.total_tokens
+                    
+                    for filename, reason in rejected:
+                        print(f"⚠️ Skipped {filename} from {component['name']}: {reason}")
+                    
+                    if component['path'] in component_files:
+                        generated_files[component['name']] = {
+                            'path': component['path'],
+                            'code': component_files[component['path']],
+                            'files': list(component_files),
+                            'full_response': coding_response
+                        }
+                        
+                        print(f"✅ Generated {component['name']} component ({len(component_files)} files)")
+                    
+                    # Save full response for debugging
+                    response_file = os.path.join(output_dir, f"coding_{component['name'].lower()}_response.md")
+                    print_response(coding_response, response_file)
 
-## Technologies Used
+# Generate basic files
+basic_files = basic_project_files(project_name, generated_files)
 
-- React 18+
-- TypeScript
-- CSS Modules / Styled Components
-- React Router (if routing is implemented)
+# Create basic files
+for file_path, content in basic_files.items():
+    project_writer.write(file_path, content)
 
-## Generated Components
+# Generate package.json from what the sources (including src/index.tsx) import
+package_json, dependency_report = generate_package_json(
+    project_name, project_path, project_writer.sources if archive else None
+)
+project_writer.write("package.json", json.dumps(package_json, indent=2))
 
-{chr(10).join([f"- {name}: {info['path']}" for name, info in generated_files.items()])}
-'''
-}
+print(f"✅ Generated package.json ({len(package_json['dependencies'])} dependencies, {len(dependency_report['missing'])} unpinned, {len(dependency_report['unused'])} dropped)")
 
-# Create basic files
-for file_path, content in basic_files.items():
-    full_path = os.path.join(project_path, file_path)
-    os.makedirs(os.path.dirname(full_path), exist_ok=True)
-    with open(full_path, 'w', encoding='utf-8') as f:
-        f.write(content)
+write_report = project_writer.finish({
+    "project_name": project_name,
+    "model": gpt_version,
+    "components": {name: info['files'] for name, info in generated_files.items()},
+    "dependencies": package_json["dependencies"],
+    "unpinned_dependencies": dependency_report["missing"],
+})
+print(f"💾 {len(write_report['written'])} files written, {len(write_report['unchanged'])} unchanged")
+if write_report['conflicts']:
+    print(f"⚠️ {len(write_report['conflicts'])} shared files were generated differently by several components; "
+          f"the first version of each was kept (files.conflicts in generation_summary.json)")
 
 # Save generation summary
 summary = {
@@ -341,6 +231,8 @@ summary = {
     "generated_components": len(generated_files),
     "components": list(generated_files.keys()),
     "project_path": project_path,
+    "files": write_report,
+    "dependencies": dependency_report,
     "total_cost": cost_data["total_cost"],
     "total_tokens": cost_data["total_tokens"]
 }
@@ -352,10 +244,16 @@ with open(os.path.join(output_dir, "generation_summary.json"), 'w') as f:
 save_accumulated_cost(cost_data, os.path.join(output_dir, "accumulated_cost.json"))
 
 print(f"\n🎉 React application generation completed!")
-print(f"📁 Project created at: {project_path}")
+print(f"📁 Project created at: {project_path}" if not archive else f"📦 Project archived to: {'stdout' if archive == '-' else archive}")
 print(f"⚛️ Generated {len(generated_files)} components")
 print(f"💰 Total cost: ${cost_data['total_cost']:.4f}")
 print(f"\n🚀 To run the application:")
+if archive:
+    # Nothing is on disk yet: the project directory comes out of the archive
+    archive_name = "<file stdout was saved to>" if archive == "-" else archive
+    print(f"   {'unzip' if project_writer.archive_format == 'zip' else 'tar -xzf'} {archive_name}")
 print(f"   cd {project_path}")
 print(f"   npm install")
 print(f"   npm start")
+if archive:
+    print(f"\n🧪 4_testing.py writes tests into the extracted directory (--project_path {project_path}), not into the archive")
@@ -5,11 +5,18 @@ import sys
 from utils import (
     print_response,
     extract_frontend_planning,
-    extract_react_code_from_content,
     generate_package_json,
-    create_folder_structure
+    basic_project_files,
+    create_folder_structure,
+    collect_component_files
 )
-from transformers import AutoTokenizer
+from tracing import span, begin_stage
+from requirements_digest import load_stage_requirements
+from prompts import build_coding_messages, to_chat_prompt
+from project_writer import ProjectWriter, ArchiveWriter
+from trajectory import trajectory_path
+from fence_parser import parse_code_blocks
+from component_plan import load_components, dependency_waves, dependency_context
 from vllm import LLM, SamplingParams
 from tqdm import tqdm
 
@@ -24,6 +31,8 @@ parser.add_argument('--requirements_format', type=str, default="markdown", choic
 parser.add_argument('--requirements_path', type=str, required=True)
 parser.add_argument('--output_dir', type=str, default="")
 parser.add_argument('--output_repo_dir', type=str, default="")
+parser.add_argument('--archive', type=str, default="", help="Stream the project into this .tar.gz/.zip instead of output_repo_dir ('-' for stdout)")
+parser.add_argument('--archive_format', type=str, default=None, choices=["tar.gz", "zip"], help="Defaults to the --archive extension, tar.gz for stdout")
 
 args = parser.parse_args()
 
@@ -32,76 +41,59 @@ requirements_format = args.requirements_format
 requirements_path = args.requirements_path
 output_dir = args.output_dir
 output_repo_dir = args.output_repo_dir
+archive = args.archive
 
 model_name = args.model_name
 tp_size = args.tp_size
 max_model_len = args.max_model_len
 temperature = args.temperature
 
-# Load requirements content
-if requirements_format == "markdown":
-    with open(f'{requirements_path}') as f:
-        requirements_content = f.read()
-elif requirements_format == "json":
-    with open(f'{requirements_path}') as f:
-        requirements_content = json.load(f)
-elif requirements_format == "text":
-    with open(f'{requirements_path}') as f:
-        requirements_content = f.read()
-else:
-    print(f"[ERROR] Invalid requirements format. Please select 'markdown', 'json', or 'text'.")
-    sys.exit(0)
-
-# Extract context from previous stages
-context_lst = extract_frontend_planning(f'{output_dir}/analysis_trajectories.json')
+begin_stage("coding", project=project_name, model=model_name)
 
-# Create project folder structure
-project_path = create_folder_structure(output_repo_dir, project_name)
+# Load requirements content (the cached digest)
+try:
+    requirements_content, requirements_format = load_stage_requirements(requirements_path, requirements_format, output_dir)
+except Exception as e:
+    print(f"❌ Error loading requirements: {str(e)}")
+    sys.exit(1)
 
-# Define components to generate based on analysis
-components_to_generate = [
-    {
-        "name": "App",
-        "type": "main",
-        "path": "src/App.tsx",
-        "description": "Main application component with routing"
-    },
-    {
-        "name": "Layout",
-        "type": "layout",
-        "path": "src/components/Layout.tsx",
-        "description": "Main layout component with header, sidebar, footer"
-    },
-    {
-        "name": "Header",
-        "type": "component",
-        "path": "src/components/Header.tsx",
-        "description": "Application header with navigation"
-    },
-    {
-        "name": "Sidebar",
-        "type": "component", 
-        "path": "src/components/Sidebar.tsx",
-        "description": "Navigation sidebar component"
-    },
-    {
-        "name": "Dashboard",
-        "type": "page",
-        "path": "src/pages/Dashboard.tsx",
-        "description": "Main dashboard page"
-    }
-]
+# Extract context from previous stages
+context_lst = extract_frontend_planning(trajectory_path(output_dir, "analysis"))
+
+if archive:
+    # Archive mode: no project directory, every file goes straight into the archive
+    project_path = f"{project_name}_frontend"
+    if archive == "-":
+        # stdout carries the archive, so logs go to stderr
+        archive_stream = sys.stdout.buffer
+        sys.stdout = sys.stderr
+        project_writer = ArchiveWriter(archive_stream, project_path, args.archive_format or "tar.gz")
+    else:
+        project_writer = ArchiveWriter(archive, project_path, args.archive_format)
+else:
+    # Create project folder structure
+    project_path = create_folder_structure(output_repo_dir, project_name)
+    # Files only change on disk when their content does, and never half-written
+    project_writer = ProjectWriter(project_path)
+
+# Components and their dependencies come from the analysis manifest
+analysis_context = context_lst[-1] if context_lst else None
+components_to_generate = load_components(analysis_context)
+# Paths owned by a component or by the boilerplate; other components' files may not claim them
+reserved_paths = {component['path'] for component in components_to_generate} | set(basic_project_files(project_name, {}))
+waves = dependency_waves(components_to_generate)
 
 print(f"🤖 Loading model: {model_name}")
 
 # Initialize vLLM
 try:
-    llm = LLM(
-        model=model_name,
-        tensor_parallel_size=tp_size,
-        max_model_len=max_model_len,
-        trust_remote_code=True
-    )
+    with span("load_model", model=model_name):
+        llm = LLM(
+            model=model_name,
+            tensor_parallel_size=tp_size,
+            max_model_len=max_model_len,
+            trust_remote_code=True
+        )
     
     # Set up sampling parameters
     sampling_params = SamplingParams(
@@ -111,212 +103,89 @@ try:
     )
     
     print(f"⚛️ Generating React components for: {project_name}")
+    print(f"📋 {len(components_to_generate)} components in {len(waves)} dependency waves")
     print("=" * 60)
     
     generated_files = {}
     
-    # Generate each component
-    for component in tqdm(components_to_generate, desc="Generating components"):
+    # One batched generate call per wave; a wave only depends on earlier waves
+    for wave_number, wave in enumerate(tqdm(waves, desc="Generating component waves"), 1):
         
-        coding_msg = f"""<|im_start|>system
-You are an expert React developer and TypeScript specialist with deep knowledge of modern frontend development practices, component architecture, and code quality.
-
-You will receive project requirements and technical analysis to generate high-quality React components.
-
-Your task is to generate production-ready React component code that:
-
-1. **Modern React Patterns**:
-   - Functional components with hooks
-   - TypeScript with proper type definitions
-   - Clean, readable, and maintainable code
-
-2. **Code Quality**:
-   - Proper error handling
-   - Loading states
-   - Accessibility (ARIA labels, semantic HTML)
-   - Performance optimizations (useMemo, useCallback when needed)
-
-3. **Styling**:
-   - Use CSS modules or styled-components
-   - Responsive design
-   - Modern CSS practices
-
-4. **Component Structure**:
-   - Clear props interface
-   - Proper component composition
-   - Reusable and testable
-
-5. **Best Practices**:
-   - ESLint and Prettier compliant
-   - Consistent naming conventions
-   - Clear comments for complex logic
-
-Generate ONLY the component code for {component['name']} ({component['type']}).
-Include all necessary imports, types, and styling.
-Make sure the code is complete and ready to use.
-
-Format your response with the complete component code wrapped in ```tsx code blocks.<|im_end|>
-<|im_start|>user
-Project Name: {project_name}
-
-Component to Generate: {component['name']} ({component['type']})
-Description: {component['description']}
-File Path: {component['path']}
-
-Original Requirements:
-{requirements_content}
-
-Technical Analysis:
-{context_lst[0] if context_lst else "No analysis context available"}
-
-Generate the complete React component code for {component['name']}.<|im_end|>
-<|im_start|>assistant
-"""
+        with span("build_prompt", stage="coding", wave=wave_number, components=len(wave)):
+            coding_msgs = [
+                to_chat_prompt(build_coding_messages(
+                    project_name, component, requirements_content, analysis_context,
+                    dependency_context(component, generated_files)
+                ))
+                for component in wave
+            ]
         
         try:
-            # Generate response
-            outputs = llm.generate([coding_msg], sampling_params)
-            coding_response = outputs[0].outputs[0].text
-            
-            # Extract and save component code
-            code_blocks = extract_react_code_from_content(coding_response)
-            
-            if code_blocks:
-                component_code = code_blocks[0]  # Take the first/main code block
+            with span("model_call", model=model_name, wave=wave_number, components=len(wave)) as call_span:
+                outputs = llm.generate(coding_msgs, sampling_params)
+                call_span.set(
+                    prompt_tokens=sum(len(output.prompt_token_ids) for output in outputs),
+                    completion_tokens=sum(len(output.outputs[0].token_ids) for output in outputs)
+                )
+        except Exception as e:
+            print(f"❌ Error generating wave {wave_number} ({', '.join(component['name'] for component in wave)}): {str(e)}")
+            continue
+        
+        for component, output in zip(wave, outputs):
+            try:
+                coding_response = output.outputs[0].text
                 
-                # Save component file
-                full_file_path = os.path.join(project_path, component['path'])
-                os.makedirs(os.path.dirname(full_file_path), exist_ok=True)
+                # Extract and save the component and any files it brought along
+                component_files, rejected = collect_component_files(parse_code_blocks(coding_response), component, reserved_paths)
+                for path, code in component_files.items():
+                    project_writer.write(path, code, owner=component['name'])
+                for filename, reason in rejected:
+                    print(f"⚠️ Skipped {filename} from {component['name']}: {reason}")
                 
-                with open(full_file_path, 'w', encoding='utf-8') as f:
-                    f.write(component_code)
+                if component['path'] in component_files:
+                    generated_files[component['name']] = {
+                        'path': component['path'],
+                        'code': component_files[component['path']],
+                        'files': list(component_files),
+                        'full_response': coding_response
+                    }
+                    
+                    print(f"✅ Generated {component['name']} component ({len(component_files)} files)")
                 
-                generated_files[component['name']] = {
-                    'path': component['path'],
-                    'code': component_code,
-                    'full_response': coding_response
-                }
+                # Save full response for debugging
+                response_file = os.path.join(output_dir, f"coding_{component['name'].lower()}_response.md")
+                print_response(coding_response, response_file)
                 
-                print(f"✅ Generated {component['name']} component")
-            
-            # Save full response for debugging
-            response_file = os.path.join(output_dir, f"coding_{component['name'].lower()}_response.md")
-            print_response(coding_response, response_file)
-            
-        except Exception as e:
-            print(f"❌ Error generating {component['name']}: {str(e)}")
-            continue
-
-    # Generate package.json
-    package_json = generate_package_json(project_name, str(requirements_content))
-    package_json_path = os.path.join(project_path, "package.json")
-    with open(package_json_path, 'w', encoding='utf-8') as f:
-        json.dump(package_json, f, indent=2)
-
-    print(f"✅ Generated package.json")
+            except Exception as e:
+                print(f"❌ Error generating {component['name']}: {str(e)}")
+                continue
 
     # Generate basic files
-    basic_files = {
-        "public/index.html": '''<!DOCTYPE html>
-<html lang="en">
-  <head>
-    <meta charset="utf-8" />
-    <link rel="icon" href="%PUBLIC_URL%/favicon.ico" />
-    <meta name="viewport" content="width=device-width, initial-scale=1" />
-    <meta name="theme-color" content="#000000" />
-    <meta name="description" content="Generated React application" />
-    <title>''' + project_name + '''</title>
-  </head>
-  <body>
-    <noscript>You need to enable JavaScript to run this app.</noscript>
-    <div id="root"></div>
-  </body>
-</html>''',
-        
-        "src/index.tsx": '''import React from 'react';
-import ReactDOM from 'react-dom/client';
-import './index.css';
-import App from './App';
-
-const root = ReactDOM.createRoot(
-  document.getElementById('root') as HTMLElement
-);
-root.render(
-  <React.StrictMode>
-    <App />
-  </React.StrictMode>
-);''',
-        
-        "src/index.css": '''body {
-  margin: 0;
-  font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', 'Roboto', 'Oxygen',
-    'Ubuntu', 'Cantarell', 'Fira Sans', 'Droid Sans', 'Helvetica Neue',
-    sans-serif;
-  -webkit-font-smoothing: antialiased;
-  -moz-osx-font-smoothing: grayscale;
-}
-
-code {
-  font-family: source-code-pro, Menlo, Monaco, Consolas, 'Courier New',
-    monospace;
-}
-
-* {
-  box-sizing: border-box;
-}''',
-
-        "README.md": f'''# {project_name}
-
-This React application was generated automatically from project requirements using vLLM.
-
-## Getting Started
-
-### Prerequisites
-- Node.js (version 14 or higher)
-- npm or yarn
-
-### Installation
-
-1. Install dependencies:
-```bash
-npm install
-```
+    basic_files = basic_project_files(project_name, generated_files, generated_with="vLLM", model_name=model_name)
 
-2. Start the development server:
-```bash
-npm start
-```
-
-3. Open [http://localhost:3000](http://localhost:3000) to view it in the browser.
-
-## Available Scripts
-
-- `npm start` - Runs the app in development mode
-- `npm test` - Launches the test runner
-- `npm run build` - Builds the app for production
-- `npm run eject` - Ejects from Create React App (one-way operation)
-
-## Generated Components
-
-{chr(10).join([f"- {name}: {info['path']}" for name, info in generated_files.items()])}
-
-## Technologies Used
+    # Create basic files
+    for file_path, content in basic_files.items():
+        project_writer.write(file_path, content)
 
-- React 18+
-- TypeScript
-- CSS Modules / Styled Components
-- React Router (if routing is implemented)
+    # Generate package.json from what the sources (including src/index.tsx) import
+    package_json, dependency_report = generate_package_json(
+        project_name, project_path, project_writer.sources if archive else None
+    )
+    project_writer.write("package.json", json.dumps(package_json, indent=2))
 
-Generated with Frontend Generator using {model_name}
-'''
-    }
+    print(f"✅ Generated package.json ({len(package_json['dependencies'])} dependencies, {len(dependency_report['missing'])} unpinned, {len(dependency_report['unused'])} dropped)")
 
-    # Create basic files
-    for file_path, content in basic_files.items():
-        full_path = os.path.join(project_path, file_path)
-        os.makedirs(os.path.dirname(full_path), exist_ok=True)
-        with open(full_path, 'w', encoding='utf-8') as f:
-            f.write(content)
+    write_report = project_writer.finish({
+        "project_name": project_name,
+        "model": model_name,
+        "components": {name: info['files'] for name, info in generated_files.items()},
+        "dependencies": package_json["dependencies"],
+        "unpinned_dependencies": dependency_report["missing"],
+    })
+    print(f"💾 {len(write_report['written'])} files written, {len(write_report['unchanged'])} unchanged")
+    if write_report['conflicts']:
+        print(f"⚠️ {len(write_report['conflicts'])} shared files were generated differently by several components; "
+              f"the first version of each was kept (files.conflicts in generation_summary.json)")
 
     # Save generation summary
     summary = {
@@ -324,14 +193,16 @@ Generated with Frontend Generator using {model_name}
         "model_used": model_name,
         "generated_components": len(generated_files),
         "components": list(generated_files.keys()),
-        "project_path": project_path
+        "project_path": project_path,
+        "files": write_report,
+        "dependencies": dependency_report
     }
 
     with open(os.path.join(output_dir, "generation_summary.json"), 'w') as f:
         json.dump(summary, f, indent=2)
 
     print(f"\n🎉 React application generation completed!")
-    print(f"📁 Project created at: {project_path}")
+    print(f"📁 Project created at: {project_path}" if not archive else f"📦 Project archived to: {'stdout' if archive == '-' else archive}")
     print(f"⚛️ Generated {len(generated_files)} components")
     print(f"🤖 Model used: {model_name}")
     print(f"\n🚀 To run the application:")
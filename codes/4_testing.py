@@ -1,21 +1,29 @@
 from openai import OpenAI
-import json
 import os
 import argparse
 import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from utils import print_response, print_log_cost, load_accumulated_cost, save_accumulated_cost
+from utils import load_accumulated_cost, save_accumulated_cost, write_file, estimate_cost, test_config_files
+from tracing import span, submit, traced, begin_stage
+from model_client import complete_with_retry
+from project_index import ProjectIndex
+from prompts import build_component_test_messages, build_test_repair_messages, test_types_to_generate
+from testing_plan import plan_test_jobs, describe_untargeted, select_coverage_gaps, describe_coverage, import_path, extract_focused_test, validate_test
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--project_name', type=str, required=True)
 parser.add_argument('--gpt_version', type=str, default="gpt-4")
 parser.add_argument('--project_path', type=str, required=True)
-parser.add_argument('--requirements_path', type=str, required=True)
+parser.add_argument('--requirements_path', type=str, default="", help="Not used: tests are generated from the project's sources")
 parser.add_argument('--test_types', type=str, default="unit,integration")
 parser.add_argument('--test_framework', type=str, default="jest", choices=["jest", "vitest"])
 parser.add_argument('--coverage_threshold', type=int, default=80)
 parser.add_argument('--include_accessibility', type=bool, default=True)
 parser.add_argument('--output_dir', type=str, default="")
+parser.add_argument('--max_workers', type=int, default=8, help="Concurrent test generation calls")
+parser.add_argument('--all_tests', action='store_true', help="Regenerate every test instead of only the coverage gaps")
+parser.add_argument('--fix_rounds', type=int, default=1, help="Times a test that fails validation is regenerated with its errors")
 
 args = parser.parse_args()
 
@@ -24,289 +32,137 @@ client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
 project_name = args.project_name
 gpt_version = args.gpt_version
 project_path = args.project_path
-requirements_path = args.requirements_path
 test_types = args.test_types
 test_framework = args.test_framework
 coverage_threshold = args.coverage_threshold
 include_accessibility = args.include_accessibility
 output_dir = args.output_dir
+max_workers = max(args.max_workers, 1)
+fix_rounds = max(args.fix_rounds, 0)
+all_tests = args.all_tests
 
-def load_project_structure(project_path):
-    """Analyze the generated React project structure."""
-    components = []
-    pages = []
-    utils = []
-    
-    project_dir = Path(project_path)
-    
-    # Find React components
-    if (project_dir / "src" / "components").exists():
-        for component_file in (project_dir / "src" / "components").rglob("*.tsx"):
-            components.append(str(component_file.relative_to(project_dir)))
-    
-    # Find pages
-    if (project_dir / "src" / "pages").exists():
-        for page_file in (project_dir / "src" / "pages").rglob("*.tsx"):
-            pages.append(str(page_file.relative_to(project_dir)))
-    
-    # Find utilities
-    if (project_dir / "src" / "utils").exists():
-        for util_file in (project_dir / "src" / "utils").rglob("*.ts"):
-            utils.append(str(util_file.relative_to(project_dir)))
-    
-    return {
-        "components": components,
-        "pages": pages,
-        "utils": utils,
-        "src_structure": list(project_dir.rglob("src/**/*.{ts,tsx}"))
-    }
-
-def generate_test_prompts(requirements_content, project_structure):
-    """Generate prompts for different test types."""
-    
-    test_type_list = [t.strip() for t in test_types.split(',')]
-    prompts = {}
-    
-    # Base system prompt for test generation
-    base_system_prompt = f"""You are an expert React testing engineer specializing in comprehensive test suite generation using {test_framework}, React Testing Library, and modern testing practices.
-
-You will generate high-quality, production-ready tests for a React application based on:
-1. Original project requirements
-2. Generated component structure
-3. Specific test type requirements
-
-Your tests should follow these principles:
-- Use modern testing patterns and best practices
-- Include proper setup and teardown
-- Test both happy paths and edge cases
-- Include accessibility testing where applicable
-- Provide clear, descriptive test names
-- Include proper mocking for external dependencies
-- Achieve high code coverage while maintaining meaningful tests
-
-Testing Framework: {test_framework}
-Coverage Threshold: {coverage_threshold}%
-Accessibility Testing: {'Enabled' if include_accessibility else 'Disabled'}
-"""
+begin_stage("testing", project=project_name, model=gpt_version)
 
-    # Unit Tests
-    if 'unit' in test_type_list:
-        prompts['unit'] = {
-            'role': "system", 
-            'content': base_system_prompt
-        }
-    
-    # Integration Tests
-    if 'integration' in test_type_list:
-        prompts['integration'] = {
-            'role': "system",
-            'content': base_system_prompt
-        }
-    
-    # E2E Tests
-    if 'e2e' in test_type_list:
-        prompts['e2e'] = {
-            'role': "system",
-            'content': base_system_prompt + "\n\nSpecialize in end-to-end testing using Playwright or Cypress for complete user journey validation."
-        }
-    
-    # Accessibility Tests
-    if 'accessibility' in test_type_list or include_accessibility:
-        prompts['accessibility'] = {
-            'role': "system",
-            'content': base_system_prompt + "\n\nSpecialize in accessibility testing using jest-axe and manual accessibility validation."
-        }
-    
-    return prompts
-
-def generate_tests_with_openai(prompts, requirements_content, project_structure):
-    """Generate tests using OpenAI API."""
-    generated_tests = {}
+@traced("load_project_structure")
+def load_project_structure(project_path):
+    """Analyze the generated React project structure; returns (index, structure)."""
+    index = ProjectIndex(project_path).scan()
+    return index, index.structure()
+
+def plan_jobs(index, project_structure):
+    """Test jobs for the coverage gaps (or for every file with --all_tests)."""
+    requested_types = test_types_to_generate(test_types, include_accessibility)
+    jobs = plan_test_jobs(index, project_structure, requested_types)
+    for line in describe_untargeted(jobs, requested_types):
+        print(line)
+    if all_tests:
+        return jobs
+    jobs, report = select_coverage_gaps(index, jobs, coverage_threshold)
+    for line in describe_coverage(report, coverage_threshold):
+        print(line)
+    return jobs
+
+def generate_test_prompts(jobs):
+    """One focused prompt per (source file, test type)."""
+    return [
+        (job, build_component_test_messages(project_name, job.test_type, job.target, job.source,
+                                            job.dependency_signatures, job.test_path,
+                                            import_path(job.test_path, job.target),
+                                            test_framework, coverage_threshold, include_accessibility,
+                                            job.uncovered))
+        for job in jobs
+    ]
+
+def complete(job, messages):
+    """One completion for a test job, backing off when rate limited; returns (content, cost, tokens)."""
+    response = complete_with_retry(client, gpt_version, messages, 0.2, 2000, test_type=job.test_type, target=job.target)
+    cost = 0.0
+    tokens = 0
+    if getattr(response, 'usage', None):
+        cost = estimate_cost(gpt_version, response.usage.prompt_tokens, response.usage.completion_tokens)
+        tokens = response.usage.total_tokens
+    return response.choices[0].message.content, cost, tokens
+
+def generate_test(job, messages, index):
+    """Generate one test file, regenerating it with its validation errors up to `fix_rounds` times.
+
+    Returns (test_code, errors, cost, tokens); errors is empty when the test is valid.
+    """
     total_cost = 0.0
-    
-    for test_type, system_prompt in prompts.items():
-        print(f"\n🧪 Generating {test_type} tests...")
-        
-        user_content = f"""Project: {project_name}
-
-Original Requirements:
-{requirements_content}
-
-Project Structure:
-Components: {project_structure['components']}
-Pages: {project_structure['pages']}
-Utils: {project_structure['utils']}
-
-Generate comprehensive {test_type} tests with proper imports and setup. Use {test_framework} and React Testing Library."""
-        
-        try:
-            response = client.chat.completions.create(
-                model=gpt_version,
-                messages=[
-                    system_prompt,
-                    {'role': 'user', 'content': user_content}
-                ],
-                temperature=0.2,
-                max_tokens=6000
-            )
-            
-            generated_tests[test_type] = response.choices[0].message.content
-            
-            # Calculate cost (approximate)
-            input_tokens = len(system_prompt['content'] + user_content) // 4
-            output_tokens = len(response.choices[0].message.content) // 4
-            cost = (input_tokens * 0.00001) + (output_tokens * 0.00003)
-            total_cost += cost
-            
-            print(f"✅ {test_type.capitalize()} tests generated successfully")
-            
-        except Exception as e:
-            print(f"❌ Failed to generate {test_type} tests: {str(e)}")
-            generated_tests[test_type] = None
-    
-    return generated_tests, total_cost
-
-def save_test_files(generated_tests, project_path):
-    """Save generated test files to the project."""
+    total_tokens = 0
+    for round_number in range(fix_rounds + 1):
+        content, cost, tokens = complete(job, messages)
+        total_cost += cost
+        total_tokens += tokens
+        test_code = extract_focused_test(content, job.test_path)
+        with span("validate_test", target=job.target, test_type=job.test_type) as validate_span:
+            errors = validate_test(test_code, job, index)
+            validate_span.set(errors=len(errors))
+        if not errors:
+            break
+        if round_number < fix_rounds:
+            print(f"🔧 Regenerating {job.test_path}: {len(errors)} problem(s)")
+            messages = build_test_repair_messages(messages, content, errors, job.test_path)
+    return test_code, errors, total_cost, total_tokens
+
+def generate_tests_with_openai(prompts, index, project_path):
+    """Generate, validate and save every test file concurrently.
+
+    Returns saved_files; the calls' cost and tokens are added to `cost_data`.
+    """
     project_dir = Path(project_path)
-    test_dir = project_dir / "src" / "__tests__"
-    
-    # Create test directories
-    test_dir.mkdir(exist_ok=True)
-    (test_dir / "unit").mkdir(exist_ok=True)
-    (test_dir / "integration").mkdir(exist_ok=True)
-    (test_dir / "e2e").mkdir(exist_ok=True)
-    (test_dir / "accessibility").mkdir(exist_ok=True)
-    
     saved_files = []
-    
-    for test_type, content in generated_tests.items():
-        if content is None:
-            continue
-            
-        # Extract test files from the generated content
-        test_files = extract_test_files_from_content(content, test_type)
-        
-        for filename, file_content in test_files.items():
-            file_path = test_dir / test_type / filename
-            
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(prompts) or 1)) as executor:
+        futures = {submit(executor, generate_test, job, messages, index): job for job, messages in prompts}
+        for future in as_completed(futures):
+            job = futures[future]
             try:
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(file_content)
-                saved_files.append(str(file_path.relative_to(project_dir)))
-                print(f"📝 Saved: {file_path.relative_to(project_dir)}")
+                test_code, errors, cost, tokens = future.result()
             except Exception as e:
-                print(f"❌ Failed to save {filename}: {str(e)}")
-    
-    return saved_files
+                print(f"❌ Failed to generate {job.test_type} tests for {job.target}: {str(e)}")
+                continue
+            cost_data["total_cost"] += cost
+            cost_data["total_tokens"] += tokens
+
+            if errors:
+                # Not written: a suite that cannot import its subject only fails npm test later
+                print(f"❌ {job.test_path} failed validation, not saved:")
+                for error in errors:
+                    print(f"   - {error}")
+                continue
+            try:
+                write_file(str(project_dir / job.test_path), test_code)
+                saved_files.append(job.test_path)
+                print(f"✅ {job.test_path}")
+            except Exception as e:
+                print(f"❌ Failed to save {job.test_path}: {str(e)}")
 
-def extract_test_files_from_content(content, test_type):
-    """Extract individual test files from generated content."""
-    import re
-    
-    # Pattern to match code blocks with filenames
-    pattern = r'```(?:typescript|javascript|tsx?)\s*(?://\s*(.+\.(?:test|spec)\.(ts|tsx|js|jsx))\s*)?\n(.*?)\n```'
-    matches = re.findall(pattern, content, re.DOTALL)
-    
-    test_files = {}
-    
-    for i, match in enumerate(matches):
-        filename = match[0] if match[0] else f"{test_type}_test_{i+1}.test.tsx"
-        file_content = match[2].strip()
-        
-        # Ensure proper file extension
-        if not filename.endswith(('.test.ts', '.test.tsx', '.spec.ts', '.spec.tsx')):
-            filename = f"{filename.replace('.ts', '').replace('.tsx', '')}.test.tsx"
-        
-        test_files[filename] = file_content
-    
-    # If no specific files found, create a general test file
-    if not test_files:
-        test_files[f"{test_type}_tests.test.tsx"] = content
-    
-    return test_files
+    return sorted(saved_files)
 
 def generate_test_config_files(project_path):
     """Generate test configuration files."""
     project_dir = Path(project_path)
     
-    # Jest configuration
-    jest_config = {
-        "preset": "ts-jest",
-        "testEnvironment": "jsdom",
-        "setupFilesAfterEnv": ["<rootDir>/src/setupTests.ts"],
-        "moduleNameMapping": {
-            "^@/(.*)$": "<rootDir>/src/$1"
-        },
-        "collectCoverageFrom": [
-            "src/**/*.{ts,tsx}",
-            "!src/**/*.d.ts",
-            "!src/index.tsx",
-            "!src/reportWebVitals.ts"
-        ],
-        "coverageThreshold": {
-            "global": {
-                "branches": coverage_threshold,
-                "functions": coverage_threshold,
-                "lines": coverage_threshold,
-                "statements": coverage_threshold
-            }
-        }
-    }
-    
-    # Setup file for tests
-    setup_content = '''import '@testing-library/jest-dom';
-import 'jest-axe/extend-expect';
-
-// Mock matchMedia
-Object.defineProperty(window, 'matchMedia', {
-  writable: true,
-  value: jest.fn().mockImplementation(query => ({
-    matches: false,
-    media: query,
-    onchange: null,
-    addListener: jest.fn(),
-    removeListener: jest.fn(),
-    addEventListener: jest.fn(),
-    removeEventListener: jest.fn(),
-    dispatchEvent: jest.fn(),
-  })),
-});
-
-// Mock IntersectionObserver
-global.IntersectionObserver = class IntersectionObserver {
-  constructor() {}
-  observe() { return null; }
-  disconnect() { return null; }
-  unobserve() { return null; }
-};
-'''
-    
     try:
-        # Save Jest config
-        with open(project_dir / "jest.config.js", 'w') as f:
-            f.write(f"module.exports = {json.dumps(jest_config, indent=2)};")
-        
-        # Save setup file
-        with open(project_dir / "src" / "setupTests.ts", 'w') as f:
-            f.write(setup_content)
+        # Save Jest config and setup file
+        for relative_path, content in test_config_files(coverage_threshold).items():
+            write_file(str(project_dir / relative_path), content)
         
         print("📋 Test configuration files generated")
         
     except Exception as e:
         print(f"❌ Failed to generate config files: {str(e)}")
 
-# Load requirements content
+# Validate project path
 if not os.path.exists(project_path):
     print(f"❌ Error: Project path not found: {project_path}")
     sys.exit(1)
 
-try:
-    with open(requirements_path, 'r', encoding='utf-8') as f:
-        requirements_content = f.read()
-except Exception as e:
-    print(f"❌ Error loading requirements: {str(e)}")
-    sys.exit(1)
+# Initialize cost tracking
+cost_file = os.path.join(output_dir, "accumulated_cost.json")
+cost_data = load_accumulated_cost(cost_file)
+previous_cost = cost_data["total_cost"]
 
 print(f"🧪 Test Generator - OpenAI Version")
 print(f"=====================================")
@@ -319,20 +175,24 @@ print(f"=====================================\n")
 
 # Analyze project structure
 print("📊 Analyzing project structure...")
-project_structure = load_project_structure(project_path)
-print(f"Found {len(project_structure['components'])} components, {len(project_structure['pages'])} pages")
+index, project_structure = load_project_structure(project_path)
+print(f"Found {len(project_structure['components'])} components, {len(project_structure['pages'])} pages, "
+      f"{len(project_structure['hooks'])} hooks, {len(project_structure['utils'])} utils "
+      f"({len(index.rescanned)} of {len(index.files)} files parsed, the rest from the index cache)")
+
+# Find the coverage gaps
+print("🔍 Mapping existing tests to the exports they cover...")
+jobs = plan_jobs(index, project_structure)
 
 # Generate test prompts
 print("🎨 Preparing test generation prompts...")
-prompts = generate_test_prompts(requirements_content, project_structure)
-
-# Generate tests
-print("🚀 Generating test suites...")
-generated_tests, total_cost = generate_tests_with_openai(prompts, requirements_content, project_structure)
+with span("build_prompt", stage="testing"):
+    prompts = generate_test_prompts(jobs)
 
-# Save test files
-print("\n💾 Saving test files...")
-saved_files = save_test_files(generated_tests, project_path)
+# Generate and save tests
+print(f"🚀 Generating {len(prompts)} test files (up to {max_workers} concurrent calls)...")
+saved_files = generate_tests_with_openai(prompts, index, project_path)
+save_accumulated_cost(cost_data, cost_file)
 
 # Generate configuration files
 print("\n⚙️ Generating test configuration...")
@@ -342,7 +202,8 @@ generate_test_config_files(project_path)
 print(f"\n🎉 Test Generation Completed!")
 print(f"=====================================")
 print(f"📁 Test files generated: {len(saved_files)}")
-print(f"💰 Estimated cost: ${total_cost:.4f}")
+print(f"💰 Estimated cost: ${cost_data['total_cost'] - previous_cost:.4f}")
+print(f"💰 Total accumulated cost: ${cost_data['total_cost']:.4f}")
 print(f"📋 Configuration files created")
 print(f"=====================================")
 
@@ -1,15 +1,19 @@
 from vllm import LLM, SamplingParams
-import json
 import os
 import argparse
 import sys
 from pathlib import Path
+from utils import write_file, test_config_files
+from tracing import span, traced, begin_stage
+from project_index import ProjectIndex
+from prompts import build_component_test_messages, build_test_repair_messages, test_types_to_generate, to_chat_prompt
+from testing_plan import plan_test_jobs, describe_untargeted, select_coverage_gaps, describe_coverage, import_path, extract_focused_test, validate_test
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--project_name', type=str, required=True)
 parser.add_argument('--model_name', type=str, default="deepseek-ai/DeepSeek-Coder-V2-Lite-Instruct")
 parser.add_argument('--project_path', type=str, required=True)
-parser.add_argument('--requirements_path', type=str, required=True)
+parser.add_argument('--requirements_path', type=str, default="", help="Not used: tests are generated from the project's sources")
 parser.add_argument('--test_types', type=str, default="unit,integration")
 parser.add_argument('--test_framework', type=str, default="jest", choices=["jest", "vitest"])
 parser.add_argument('--coverage_threshold', type=int, default=80)
@@ -18,13 +22,14 @@ parser.add_argument('--temperature', type=float, default=0.2)
 parser.add_argument('--max_model_len', type=int, default=128000)
 parser.add_argument('--tensor_parallel_size', type=int, default=1)
 parser.add_argument('--output_dir', type=str, default="")
+parser.add_argument('--all_tests', action='store_true', help="Regenerate every test instead of only the coverage gaps")
+parser.add_argument('--fix_rounds', type=int, default=1, help="Times a test that fails validation is regenerated with its errors")
 
 args = parser.parse_args()
 
 project_name = args.project_name
 model_name = args.model_name
 project_path = args.project_path
-requirements_path = args.requirements_path
 test_types = args.test_types
 test_framework = args.test_framework
 coverage_threshold = args.coverage_threshold
@@ -33,288 +38,105 @@ temperature = args.temperature
 max_model_len = args.max_model_len
 tensor_parallel_size = args.tensor_parallel_size
 output_dir = args.output_dir
+fix_rounds = max(args.fix_rounds, 0)
+all_tests = args.all_tests
 
+begin_stage("testing", project=project_name, model=model_name)
+
+@traced("load_project_structure")
 def load_project_structure(project_path):
-    """Analyze the generated React project structure."""
-    components = []
-    pages = []
-    utils = []
-    
+    """Analyze the generated React project structure; returns (index, structure)."""
+    index = ProjectIndex(project_path).scan()
+    return index, index.structure()
+
+def plan_jobs(index, project_structure):
+    """Test jobs for the coverage gaps (or for every file with --all_tests)."""
+    requested_types = test_types_to_generate(test_types, include_accessibility)
+    jobs = plan_test_jobs(index, project_structure, requested_types)
+    for line in describe_untargeted(jobs, requested_types):
+        print(line)
+    if all_tests:
+        return jobs
+    jobs, report = select_coverage_gaps(index, jobs, coverage_threshold)
+    for line in describe_coverage(report, coverage_threshold):
+        print(line)
+    return jobs
+
+def generate_test_prompts(jobs):
+    """One focused prompt (as chat messages) per (source file, test type)."""
+    return [
+        (job, build_component_test_messages(
+            project_name, job.test_type, job.target, job.source, job.dependency_signatures, job.test_path,
+            import_path(job.test_path, job.target), test_framework, coverage_threshold, include_accessibility,
+            job.uncovered
+        ))
+        for job in jobs
+    ]
+
+def generate_tests_with_vllm(llm, prompts, index, project_path):
+    """Generate every test file in one batch, validate them and save the valid ones.
+
+    Files that fail validation are regenerated together, with their errors,
+    in up to `fix_rounds` further batches. Returns the saved paths.
+    """
     project_dir = Path(project_path)
-    
-    # Find React components
-    if (project_dir / "src" / "components").exists():
-        for component_file in (project_dir / "src" / "components").rglob("*.tsx"):
-            components.append(str(component_file.relative_to(project_dir)))
-    
-    # Find pages
-    if (project_dir / "src" / "pages").exists():
-        for page_file in (project_dir / "src" / "pages").rglob("*.tsx"):
-            pages.append(str(page_file.relative_to(project_dir)))
-    
-    # Find utilities
-    if (project_dir / "src" / "utils").exists():
-        for util_file in (project_dir / "src" / "utils").rglob("*.ts"):
-            utils.append(str(util_file.relative_to(project_dir)))
-    
-    return {
-        "components": components,
-        "pages": pages,
-        "utils": utils,
-        "src_structure": list(project_dir.rglob("src/**/*.{ts,tsx}"))
-    }
-
-def generate_test_prompts(requirements_content, project_structure):
-    """Generate prompts for different test types in chat format."""
-    
-    test_type_list = [t.strip() for t in test_types.split(',')]
-    prompts = {}
-    
-    # Base system prompt for test generation
-    base_system_prompt = f"""You are an expert React testing engineer specializing in comprehensive test suite generation using {test_framework}, React Testing Library, and modern testing practices.
-
-You will generate high-quality, production-ready tests for a React application based on:
-1. Original project requirements
-2. Generated component structure
-3. Specific test type requirements
-
-Your tests should follow these principles:
-- Use modern testing patterns and best practices
-- Include proper setup and teardown
-- Test both happy paths and edge cases
-- Include accessibility testing where applicable
-- Provide clear, descriptive test names
-- Include proper mocking for external dependencies
-- Achieve high code coverage while maintaining meaningful tests
-
-Testing Framework: {test_framework}
-Coverage Threshold: {coverage_threshold}%
-Accessibility Testing: {'Enabled' if include_accessibility else 'Disabled'}
-
-Always provide complete, working test code with proper imports and setup."""
-
-    # Unit Tests
-    if 'unit' in test_type_list:
-        prompts['unit'] = f"""<|im_start|>system
-{base_system_prompt}<|im_end|>
-<|im_start|>user
-Project: {project_name}
-
-Original Requirements:
-{requirements_content}
-
-Project Structure:
-Components: {project_structure['components']}
-Pages: {project_structure['pages']}
-Utils: {project_structure['utils']}
-
-Generate comprehensive unit tests for all React components and utilities. Use {test_framework} and React Testing Library.<|im_end|>
-<|im_start|>assistant
-"""
-    
-    # Integration Tests
-    if 'integration' in test_type_list:
-        prompts['integration'] = f"""<|im_start|>system
-{base_system_prompt}<|im_end|>
-<|im_start|>user
-Project: {project_name}
-
-Original Requirements:
-{requirements_content}
-
-Project Structure:
-Components: {project_structure['components']}
-Pages: {project_structure['pages']}
-
-Generate comprehensive integration tests that verify component interactions and data flow.<|im_end|>
-<|im_start|>assistant
-"""
-    
-    # E2E Tests
-    if 'e2e' in test_type_list:
-        prompts['e2e'] = f"""<|im_start|>system
-{base_system_prompt}
-
-Specialize in end-to-end testing using Playwright or Cypress for complete user journey validation.<|im_end|>
-<|im_start|>user
-Project: {project_name}
-
-Original Requirements:
-{requirements_content}
-
-Generate comprehensive end-to-end tests that validate complete user journeys.<|im_end|>
-<|im_start|>assistant
-"""
-    
-    # Accessibility Tests
-    if 'accessibility' in test_type_list or include_accessibility:
-        prompts['accessibility'] = f"""<|im_start|>system
-{base_system_prompt}
-
-Specialize in accessibility testing using jest-axe and manual accessibility validation.<|im_end|>
-<|im_start|>user
-Project: {project_name}
-
-Original Requirements:
-{requirements_content}
-
-Generate comprehensive accessibility tests for WCAG 2.1 AA compliance.<|im_end|>
-<|im_start|>assistant
-"""
-    
-    return prompts
+    saved_files = []
 
-def generate_tests_with_vllm(llm, prompts):
-    """Generate tests using vLLM."""
-    generated_tests = {}
-    
     sampling_params = SamplingParams(
         temperature=temperature,
-        max_tokens=6000,
+        max_tokens=2000,
         top_p=0.95
     )
-    
-    for test_type, prompt in prompts.items():
-        print(f"\n🧪 Generating {test_type} tests...")
-        
+
+    pending = prompts
+    for round_number in range(fix_rounds + 1):
+        if not pending:
+            break
         try:
-            outputs = llm.generate([prompt], sampling_params)
-            
-            generated_content = outputs[0].outputs[0].text
-            generated_tests[test_type] = generated_content
-            
-            print(f"✅ {test_type.capitalize()} tests generated successfully")
-            
+            with span("model_call", model=model_name, tests=len(pending), round=round_number) as call_span:
+                outputs = llm.generate([to_chat_prompt(messages) for _, messages in pending], sampling_params)
+                call_span.set(
+                    prompt_tokens=sum(len(output.prompt_token_ids) for output in outputs),
+                    completion_tokens=sum(len(output.outputs[0].token_ids) for output in outputs)
+                )
         except Exception as e:
-            print(f"❌ Failed to generate {test_type} tests: {str(e)}")
-            generated_tests[test_type] = None
-    
-    return generated_tests
-
-def save_test_files(generated_tests, project_path):
-    """Save generated test files to the project."""
-    project_dir = Path(project_path)
-    test_dir = project_dir / "src" / "__tests__"
-    
-    # Create test directories
-    test_dir.mkdir(exist_ok=True)
-    (test_dir / "unit").mkdir(exist_ok=True)
-    (test_dir / "integration").mkdir(exist_ok=True)
-    (test_dir / "e2e").mkdir(exist_ok=True)
-    (test_dir / "accessibility").mkdir(exist_ok=True)
-    
-    saved_files = []
-    
-    for test_type, content in generated_tests.items():
-        if content is None:
-            continue
-            
-        # Extract test files from the generated content
-        test_files = extract_test_files_from_content(content, test_type)
-        
-        for filename, file_content in test_files.items():
-            file_path = test_dir / test_type / filename
-            
+            print(f"❌ Failed to generate tests: {str(e)}")
+            break
+
+        retry = []
+        for (job, messages), output in zip(pending, outputs):
+            content = output.outputs[0].text
+            test_code = extract_focused_test(content, job.test_path)
+            with span("validate_test", target=job.target, test_type=job.test_type) as validate_span:
+                errors = validate_test(test_code, job, index)
+                validate_span.set(errors=len(errors))
+            if errors:
+                if round_number < fix_rounds:
+                    print(f"🔧 Regenerating {job.test_path}: {len(errors)} problem(s)")
+                    retry.append((job, build_test_repair_messages(messages, content, errors, job.test_path)))
+                else:
+                    print(f"❌ {job.test_path} failed validation, not saved:")
+                    for error in errors:
+                        print(f"   - {error}")
+                continue
             try:
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(file_content)
-                saved_files.append(str(file_path.relative_to(project_dir)))
-                print(f"📝 Saved: {file_path.relative_to(project_dir)}")
+                write_file(str(project_dir / job.test_path), test_code)
+                saved_files.append(job.test_path)
+                print(f"✅ {job.test_path}")
             except Exception as e:
-                print(f"❌ Failed to save {filename}: {str(e)}")
-    
-    return saved_files
+                print(f"❌ Failed to save {job.test_path}: {str(e)}")
+        pending = retry
 
-def extract_test_files_from_content(content, test_type):
-    """Extract individual test files from generated content."""
-    import re
-    
-    # Pattern to match code blocks with filenames
-    pattern = r'```(?:typescript|javascript|tsx?)\s*(?://\s*(.+\.(?:test|spec)\.(ts|tsx|js|jsx))\s*)?\n(.*?)\n```'
-    matches = re.findall(pattern, content, re.DOTALL)
-    
-    test_files = {}
-    
-    for i, match in enumerate(matches):
-        filename = match[0] if match[0] else f"{test_type}_test_{i+1}.test.tsx"
-        file_content = match[2].strip()
-        
-        # Ensure proper file extension
-        if not filename.endswith(('.test.ts', '.test.tsx', '.spec.ts', '.spec.tsx')):
-            filename = f"{filename.replace('.ts', '').replace('.tsx', '')}.test.tsx"
-        
-        test_files[filename] = file_content
-    
-    # If no specific files found, create a general test file
-    if not test_files:
-        test_files[f"{test_type}_tests.test.tsx"] = content
-    
-    return test_files
+    return saved_files
 
 def generate_test_config_files(project_path):
     """Generate test configuration files."""
     project_dir = Path(project_path)
     
-    # Jest configuration
-    jest_config = {
-        "preset": "ts-jest",
-        "testEnvironment": "jsdom",
-        "setupFilesAfterEnv": ["<rootDir>/src/setupTests.ts"],
-        "moduleNameMapping": {
-            "^@/(.*)$": "<rootDir>/src/$1"
-        },
-        "collectCoverageFrom": [
-            "src/**/*.{ts,tsx}",
-            "!src/**/*.d.ts",
-            "!src/index.tsx",
-            "!src/reportWebVitals.ts"
-        ],
-        "coverageThreshold": {
-            "global": {
-                "branches": coverage_threshold,
-                "functions": coverage_threshold,
-                "lines": coverage_threshold,
-                "statements": coverage_threshold
-            }
-        }
-    }
-    
-    # Setup file for tests
-    setup_content = '''import '@testing-library/jest-dom';
-import 'jest-axe/extend-expect';
-
-// Mock matchMedia
-Object.defineProperty(window, 'matchMedia', {
-  writable: true,
-  value: jest.fn().mockImplementation(query => ({
-    matches: false,
-    media: query,
-    onchange: null,
-    addListener: jest.fn(),
-    removeListener: jest.fn(),
-    addEventListener: jest.fn(),
-    removeEventListener: jest.fn(),
-    dispatchEvent: jest.fn(),
-  })),
-});
-
-// Mock IntersectionObserver
-global.IntersectionObserver = class IntersectionObserver {
-  constructor() {}
-  observe() { return null; }
-  disconnect() { return null; }
-  unobserve() { return null; }
-};
-'''
-    
     try:
-        # Save Jest config
-        with open(project_dir / "jest.config.js", 'w') as f:
-            f.write(f"module.exports = {json.dumps(jest_config, indent=2)};")
-        
-        # Save setup file
-        with open(project_dir / "src" / "setupTests.ts", 'w') as f:
-            f.write(setup_content)
+        # Save Jest config and setup file
+        for relative_path, content in test_config_files(coverage_threshold).items():
+            write_file(str(project_dir / relative_path), content)
         
         print("📋 Test configuration files generated")
         
@@ -326,14 +148,6 @@ if not os.path.exists(project_path):
     print(f"❌ Error: Project path not found: {project_path}")
     sys.exit(1)
 
-# Load requirements
-try:
-    with open(requirements_path, 'r', encoding='utf-8') as f:
-        requirements_content = f.read()
-except Exception as e:
-    print(f"❌ Error loading requirements: {str(e)}")
-    sys.exit(1)
-
 print(f"🧪 Test Generator - vLLM Version")
 print(f"=====================================")
 print(f"📁 Project: {project_name}")
@@ -347,11 +161,12 @@ print(f"=====================================\n")
 # Initialize vLLM
 print("🚀 Initializing vLLM...")
 try:
-    llm = LLM(
-        model=model_name,
-        max_model_len=max_model_len,
-        tensor_parallel_size=tensor_parallel_size
-    )
+    with span("load_model", model=model_name):
+        llm = LLM(
+            model=model_name,
+            max_model_len=max_model_len,
+            tensor_parallel_size=tensor_parallel_size
+        )
     print("✅ vLLM initialized successfully")
 except Exception as e:
     print(f"❌ Failed to initialize vLLM: {str(e)}")
@@ -359,20 +174,23 @@ except Exception as e:
 
 # Analyze project structure
 print("📊 Analyzing project structure...")
-project_structure = load_project_structure(project_path)
-print(f"Found {len(project_structure['components'])} components, {len(project_structure['pages'])} pages")
+index, project_structure = load_project_structure(project_path)
+print(f"Found {len(project_structure['components'])} components, {len(project_structure['pages'])} pages, "
+      f"{len(project_structure['hooks'])} hooks, {len(project_structure['utils'])} utils "
+      f"({len(index.rescanned)} of {len(index.files)} files parsed, the rest from the index cache)")
+
+# Find the coverage gaps
+print("🔍 Mapping existing tests to the exports they cover...")
+jobs = plan_jobs(index, project_structure)
 
 # Generate test prompts
 print("🎨 Preparing test generation prompts...")
-prompts = generate_test_prompts(requirements_content, project_structure)
-
-# Generate tests
-print("🚀 Generating test suites...")
-generated_tests = generate_tests_with_vllm(llm, prompts)
+with span("build_prompt", stage="testing"):
+    prompts = generate_test_prompts(jobs)
 
-# Save test files
-print("\n💾 Saving test files...")
-saved_files = save_test_files(generated_tests, project_path)
+# Generate and save tests
+print(f"🚀 Generating {len(prompts)} test files in one batch...")
+saved_files = generate_tests_with_vllm(llm, prompts, index, project_path)
 
 # Generate configuration files
 print("\n⚙️ Generating test configuration...")
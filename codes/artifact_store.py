@@ -0,0 +1,255 @@
+"""Content-addressed, compressed store for stage outputs.
+
+Each file a run produces (responses, trajectories, the generated project) is
+saved once as a blob named by the sha256 of its content, compressed with
+zstd when the `zstandard` package is installed and gzip otherwise. A run is a
+small JSON manifest mapping its file paths to blob hashes, so identical
+requirements, boilerplate and unchanged components are stored once no matter
+how many runs or projects contain them.
+
+    store/
+      blobs/ab/ab12...ef.zst     one file per distinct content
+      runs/<run_id>.json         manifest: path -> blob
+
+Usage:
+    python artifact_store.py archive --store STORE --output_dir OUT [--project_path PROJECT] [--requirements_path REQ]
+    python artifact_store.py restore --store STORE --run_id RUN --destination DIR
+    python artifact_store.py list --store STORE
+    python artifact_store.py gc --store STORE [--dry_run]
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+from tracing import span
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MANIFEST_VERSION = 1
+# Never archived: dependency installs, build output and local caches
+SKIP_DIRS = {"node_modules", "build", "dist", "coverage", ".frontend-gen", ".git"}
+
+
+def _compress(data):
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=10).compress(data), ".zst"
+    return gzip.compress(data, compresslevel=6, mtime=0), ".gz"
+
+
+def _decompress(data, suffix):
+    if suffix == ".zst":
+        if zstandard is None:
+            raise RuntimeError("blob is zstd-compressed but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+class ArtifactStore:
+    """Blob store plus run manifests rooted at `root`."""
+
+    def __init__(self, root):
+        self.root = root
+        self.blob_dir = os.path.join(root, "blobs")
+        self.run_dir = os.path.join(root, "runs")
+        self.added = 0      # blobs written (not deduplicated) by this instance
+
+    def put(self, data):
+        """Store bytes (or text) once; returns the content hash."""
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+        if self._blob_path(digest) is None:
+            compressed, suffix = _compress(data)
+            path = os.path.join(self.blob_dir, digest[:2], digest + suffix)
+            self._atomic_write(path, compressed)
+            self.added += 1
+        return digest
+
+    def get(self, digest):
+        """Content of a blob as bytes; raises KeyError if it is not in the store."""
+        path = self._blob_path(digest)
+        if path is None:
+            raise KeyError(digest)
+        with open(path, 'rb') as f:
+            return _decompress(f.read(), os.path.splitext(path)[1])
+
+    def has(self, digest):
+        return self._blob_path(digest) is not None
+
+    def save_run(self, run_id, files, metadata=None):
+        """Store `files` (path -> bytes/str) and write the run's manifest; returns the manifest."""
+        entries = {}
+        with span("artifact_store", run_id=run_id, files=len(files)) as store_span:
+            for path, data in sorted(files.items()):
+                size = len(data.encode('utf-8') if isinstance(data, str) else data)
+                entries[path] = {"blob": self.put(data), "size": size}
+            store_span.set(blobs=len({entry["blob"] for entry in entries.values()}))
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "run_id": run_id,
+            "created_at": datetime.now().isoformat(),
+            "metadata": metadata or {},
+            "files": entries,
+        }
+        self._atomic_write(self._run_path(run_id), json.dumps(manifest, indent=2).encode('utf-8'))
+        return manifest
+
+    def load_run(self, run_id):
+        with open(self._run_path(run_id)) as f:
+            return json.load(f)
+
+    def runs(self):
+        """Run ids, oldest first."""
+        if not os.path.isdir(self.run_dir):
+            return []
+        runs = [entry for entry in os.scandir(self.run_dir) if entry.name.endswith(".json")]
+        return [entry.name[:-5] for entry in sorted(runs, key=lambda entry: entry.stat().st_mtime_ns)]
+
+    def restore_run(self, run_id, destination):
+        """Write every file of a run under `destination`; returns the number of files."""
+        manifest = self.load_run(run_id)
+        for path, entry in manifest["files"].items():
+            target = os.path.join(destination, path)
+            os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+            with open(target, 'wb') as f:
+                f.write(self.get(entry["blob"]))
+        return len(manifest["files"])
+
+    def gc(self, dry_run=False):
+        """Delete blobs no run manifest references; returns (blobs removed, bytes freed)."""
+        referenced = set()
+        for run_id in self.runs():
+            try:
+                referenced.update(entry["blob"] for entry in self.load_run(run_id)["files"].values())
+            except (json.JSONDecodeError, KeyError) as e:
+                # A damaged manifest must not cause its blobs to be collected
+                print(f"❌ Cannot read manifest for run {run_id} ({str(e)}), aborting gc")
+                return 0, 0
+        removed = 0
+        freed = 0
+        for shard in self._scandir(self.blob_dir):
+            for entry in self._scandir(shard.path):
+                digest = entry.name.split(".", 1)[0]
+                # Leftover temp files from interrupted writes are garbage too
+                if digest in referenced and not entry.name.endswith(".tmp"):
+                    continue
+                removed += 1
+                freed += entry.stat().st_size
+                if not dry_run:
+                    os.remove(entry.path)
+        return removed, freed
+
+    def _blob_path(self, digest):
+        for suffix in (".zst", ".gz"):
+            path = os.path.join(self.blob_dir, digest[:2], digest + suffix)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _run_path(self, run_id):
+        return os.path.join(self.run_dir, f"{run_id}.json")
+
+    @staticmethod
+    def _scandir(path):
+        if not os.path.isdir(path):
+            return []
+        return list(os.scandir(path))
+
+    @staticmethod
+    def _atomic_write(path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+
+def collect_files(directory, prefix):
+    """Files under `directory` as {prefix/relative_path: bytes}, skipping SKIP_DIRS."""
+    files = {}
+    if not directory or not os.path.isdir(directory):
+        return files
+    for current, dirs, names in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS)
+        for name in sorted(names):
+            path = os.path.join(current, name)
+            relative = os.path.relpath(path, directory).replace(os.sep, '/')
+            with open(path, 'rb') as f:
+                files[f"{prefix}/{relative}"] = f.read()
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Content-addressed artifact store for frontend generator runs")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    archive = subparsers.add_parser("archive", help="Store a run's artifacts and generated project")
+    archive.add_argument('--store', type=str, required=True)
+    archive.add_argument('--output_dir', type=str, required=True, help="Stage artifacts directory of the run")
+    archive.add_argument('--project_path', type=str, default="", help="Generated project directory")
+    archive.add_argument('--requirements_path', type=str, default="")
+    archive.add_argument('--project_name', type=str, default="")
+    archive.add_argument('--run_id', type=str, default="")
+
+    restore = subparsers.add_parser("restore", help="Recreate a run's files from the store")
+    restore.add_argument('--store', type=str, required=True)
+    restore.add_argument('--run_id', type=str, required=True)
+    restore.add_argument('--destination', type=str, required=True)
+
+    listing = subparsers.add_parser("list", help="List stored runs")
+    listing.add_argument('--store', type=str, required=True)
+
+    collect = subparsers.add_parser("gc", help="Delete blobs no run references")
+    collect.add_argument('--store', type=str, required=True)
+    collect.add_argument('--dry_run', action='store_true')
+
+    args = parser.parse_args()
+    store = ArtifactStore(args.store)
+
+    if args.command == "archive":
+        files = collect_files(args.output_dir, "artifacts")
+        files.update(collect_files(args.project_path, "project"))
+        if args.requirements_path:
+            with open(args.requirements_path, 'rb') as f:
+                files["requirements/" + os.path.basename(args.requirements_path)] = f.read()
+        if not files:
+            print(f"❌ Nothing to archive in {args.output_dir}")
+            sys.exit(1)
+        project_name = args.project_name or os.path.basename(os.path.normpath(args.output_dir))
+        run_id = args.run_id or _new_run_id(store, project_name)
+        manifest = store.save_run(run_id, files, {"project_name": project_name})
+        total = sum(entry["size"] for entry in manifest["files"].values())
+        print(f"📦 Archived run {run_id}: {len(files)} files ({total / 1024:.1f} KB), "
+              f"{store.added} new blobs")
+    elif args.command == "restore":
+        count = store.restore_run(args.run_id, args.destination)
+        print(f"📂 Restored {count} files of run {args.run_id} to {args.destination}")
+    elif args.command == "list":
+        for run_id in store.runs():
+            manifest = store.load_run(run_id)
+            print(f"{run_id}  {manifest['created_at']}  {len(manifest['files'])} files")
+    elif args.command == "gc":
+        removed, freed = store.gc(dry_run=args.dry_run)
+        action = "Would remove" if args.dry_run else "Removed"
+        print(f"🧹 {action} {removed} unreferenced blobs ({freed / 1024:.1f} KB)")
+
+
+def _new_run_id(store, project_name):
+    run_id = f"{project_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    suffix = 2
+    while os.path.exists(store._run_path(run_id)):
+        run_id = f"{project_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{suffix}"
+        suffix += 1
+    return run_id
+
+
+if __name__ == "__main__":
+    main()
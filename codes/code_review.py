@@ -2,8 +2,16 @@ from openai import OpenAI
 import os
 import argparse
 import sys
+import time
 from pathlib import Path
 import json
+from utils import write_file
+from tracing import span, traced, begin_stage
+from model_client import complete_with_retry
+from project_index import ProjectIndex, DEFAULT_CACHE_DIR
+from prompts import build_review_messages
+from review_plan import review_files, merge_findings, ReviewCache, DEFAULT_CHUNK_TOKENS
+from perf_lint import lint_project
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--project_path', type=str, required=True)
@@ -11,6 +19,12 @@ parser.add_argument('--gpt_version', type=str, default="gpt-4")
 parser.add_argument('--review_focus', type=str, default="performance,accessibility,security")
 parser.add_argument('--output_format', type=str, default="markdown", choices=["markdown", "json"])
 parser.add_argument('--output_file', type=str, default="")
+parser.add_argument('--review_mode', type=str, default="map_reduce", choices=["map_reduce", "single"],
+                    help="Review each file concurrently and merge the findings, or send all files in one prompt")
+parser.add_argument('--max_workers', type=int, default=8, help="Concurrent per-file review calls")
+parser.add_argument('--no_cache', action='store_true', help="Review every file again instead of reusing cached findings")
+parser.add_argument('--chunk_tokens', type=int, default=DEFAULT_CHUNK_TOKENS, help="Files larger than this are reviewed in chunks")
+parser.add_argument('--include_tests', action='store_true', help="Also review test files (src/__tests__, *.test.tsx, setupTests)")
 
 args = parser.parse_args()
 
@@ -21,104 +35,57 @@ gpt_version = args.gpt_version
 review_focus = args.review_focus
 output_format = args.output_format
 output_file = args.output_file
+review_mode = args.review_mode
+max_workers = max(args.max_workers, 1)
+chunk_tokens = args.chunk_tokens
+use_cache = not args.no_cache
+include_tests = args.include_tests
 
-def analyze_code_files(project_path):
-    """Analyze React code files in the project."""
-    project_dir = Path(project_path)
+begin_stage("review", model=gpt_version)
+
+@traced("analyze_code_files", attrs=lambda result, index: {"files": len(result)})
+def analyze_code_files(index):
+    """Analyze React code files in the project (test files only with --include_tests)."""
     code_files = {}
     
-    # Collect TypeScript/JavaScript files
-    for file_path in project_dir.rglob("src/**/*.{ts,tsx,js,jsx}"):
+    # Collect TypeScript/JavaScript files under src/
+    for relative_path in sorted(index.files):
+        if index.files[relative_path]["role"] == "test" and not include_tests:
+            continue
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                relative_path = str(file_path.relative_to(project_dir))
-                code_files[relative_path] = content
+            code_files[relative_path] = index.read(relative_path)
         except Exception as e:
-            print(f"⚠️ Could not read {file_path}: {str(e)}")
+            print(f"⚠️ Could not read {relative_path}: {str(e)}")
     
     return code_files
 
-def generate_review_prompt(code_files, review_focus):
-    """Generate comprehensive code review prompt."""
-    
-    focus_areas = [area.strip() for area in review_focus.split(',')]
-    
-    system_prompt = """You are an expert React code reviewer with deep knowledge of modern JavaScript/TypeScript, React best practices, performance optimization, accessibility standards, and security considerations.
-
-Provide a comprehensive code review focusing on the specified areas. For each issue found, provide:
-1. Severity level (Critical, High, Medium, Low)
-2. Clear description of the issue
-3. Specific line references where applicable
-4. Actionable recommendations for improvement
-5. Code examples showing the fix
-
-Focus areas for this review:
-"""
-    
-    for area in focus_areas:
-        if area == 'performance':
-            system_prompt += "\n- **Performance**: Bundle size, rendering efficiency, memory usage, lazy loading"
-        elif area == 'accessibility':
-            system_prompt += "\n- **Accessibility**: WCAG compliance, ARIA labels, keyboard navigation, screen readers"
-        elif area == 'security':
-            system_prompt += "\n- **Security**: XSS prevention, data validation, secure API calls, dependency vulnerabilities"
-        elif area == 'maintainability':
-            system_prompt += "\n- **Maintainability**: Code organization, naming conventions, documentation, reusability"
-        elif area == 'testing':
-            system_prompt += "\n- **Testing**: Test coverage, testability, mocking strategies, edge cases"
-    
-    # Create file content summary
-    files_summary = "\n\n## Code Files to Review:\n"
-    for file_path, content in code_files.items():
-        lines_count = len(content.split('\n'))
-        files_summary += f"\n### {file_path} ({lines_count} lines)\n```typescript\n{content[:1000]}{'...' if len(content) > 1000 else ''}\n```\n"
-    
-    user_prompt = f"""Please conduct a comprehensive code review of this React application.
-
-{files_summary}
-
-Provide detailed feedback organized by:
-1. Critical Issues (must fix)
-2. Performance Improvements
-3. Accessibility Enhancements
-4. Security Considerations
-5. Best Practices & Maintainability
-6. Overall Recommendations
-
-For each finding, include:
-- Severity level
-- File location
-- Issue description
-- Recommended solution
-- Code example (if applicable)
-"""
-    
-    return system_prompt, user_prompt
+def complete(messages, max_tokens, **span_attrs):
+    """One review completion, backing off when rate limited."""
+    return complete_with_retry(client, gpt_version, messages, 0.1, max_tokens, **span_attrs).choices[0].message.content
 
 def conduct_code_review(code_files):
-    """Conduct code review using OpenAI."""
+    """Conduct code review using OpenAI, all files in one prompt."""
     
-    system_prompt, user_prompt = generate_review_prompt(code_files, review_focus)
+    with span("build_prompt", stage="review"):
+        review_msg = build_review_messages(code_files, review_focus)
     
     try:
-        response = client.chat.completions.create(
-            model=gpt_version,
-            messages=[
-                {'role': 'system', 'content': system_prompt},
-                {'role': 'user', 'content': user_prompt}
-            ],
-            temperature=0.1,
-            max_tokens=6000
-        )
-        
-        return response.choices[0].message.content
-        
+        return complete(review_msg, 6000)
     except Exception as e:
         print(f"❌ Code review failed: {str(e)}")
         return None
 
-def format_review_output(review_content):
+@traced("perf_lint", attrs=lambda result, code_files: {"files": len(code_files), "findings": sum(map(len, result.values()))})
+def run_perf_lint(code_files):
+    """Static performance findings for every file, {path: [Finding]}."""
+    start = time.perf_counter()
+    lint = lint_project(code_files)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    flagged = sum(1 for findings in lint.values() if findings)
+    print(f"⚡ Static lint: {sum(map(len, lint.values()))} findings in {flagged} files ({elapsed_ms:.0f} ms)")
+    return lint
+
+def format_review_output(review_content, file_findings=None):
     """Format the review output."""
     
     if output_format == "json":
@@ -126,7 +93,7 @@ def format_review_output(review_content):
         review_json = {
             "timestamp": "2024-01-01T00:00:00Z",
             "summary": "Code review completed",
-            "findings": [],
+            "findings": [{"file": label, "review": text} for label, text in (file_findings or {}).items()],
             "recommendations": [],
             "raw_content": review_content
         }
@@ -154,11 +121,13 @@ print(f"📁 Project: {project_path}")
 print(f"🤖 Model: {gpt_version}")
 print(f"🎯 Focus: {review_focus}")
 print(f"📄 Format: {output_format}")
+print(f"🧩 Mode: {review_mode}")
 print(f"=====================================\n")
 
 # Analyze code files
 print("📊 Analyzing code files...")
-code_files = analyze_code_files(project_path)
+index = ProjectIndex(project_path).scan()
+code_files = analyze_code_files(index)
 print(f"Found {len(code_files)} code files")
 
 if not code_files:
@@ -167,20 +136,37 @@ if not code_files:
 
 # Conduct review
 print("🚀 Conducting AI code review...")
-review_content = conduct_code_review(code_files)
+file_findings = None
+if review_mode == "single":
+    review_content = conduct_code_review(code_files)
+else:
+    cache_path = os.path.join(project_path, DEFAULT_CACHE_DIR, "review_cache.json") if use_cache else None
+    cache = ReviewCache(cache_path, gpt_version, review_focus)
+    lint = run_perf_lint(code_files)
+    file_findings, reviewed_files = review_files(code_files, index, cache, lint, complete, review_focus,
+                                                 chunk_tokens, gpt_version, max_workers)
+    if reviewed_files < len(code_files):
+        print(f"⚠️ {len(code_files) - reviewed_files} of {len(code_files)} files have no review (failed calls)")
+    print("🧮 Merging findings...")
+    review_content = None
+    if file_findings:
+        try:
+            review_content = merge_findings(file_findings, cache, reviewed_files, complete, review_focus)
+        except Exception as e:
+            print(f"❌ Merging review findings failed: {str(e)}")
+    cache.save()
 
 if not review_content:
     print("❌ Code review failed")
     sys.exit(1)
 
 # Format output
-formatted_review = format_review_output(review_content)
+formatted_review = format_review_output(review_content, file_findings)
 
 # Save or display results
 if output_file:
     try:
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(formatted_review)
+        write_file(output_file, formatted_review)
         print(f"✅ Review saved to: {output_file}")
     except Exception as e:
         print(f"❌ Failed to save review: {str(e)}")
@@ -0,0 +1,170 @@
+"""Component manifest and dependency-wave scheduling for the coding stage.
+
+The analysis stage ends its response with a [CONTENT] JSON manifest listing
+every component, its path and the components it depends on (renders or
+imports). The coding stage turns that into waves: every component in a wave
+depends only on components from earlier waves, so a wave can be generated
+concurrently and each component sees the exported signatures of the children
+it builds on instead of guessing them.
+"""
+import copy
+import re
+
+from utils import content_to_json, resolve_component_file, DEFAULT_COMPONENTS
+
+# Dependencies of DEFAULT_COMPONENTS, used when the analysis has no manifest
+DEFAULT_DEPENDENCIES = {
+    "App": ["Layout", "Dashboard"],
+    "Layout": ["Header", "Sidebar"],
+}
+
+# Where a component of each type goes when the manifest gives no path
+TYPE_DIRECTORIES = {
+    "layout": "src/components",
+    "component": "src/components",
+    "page": "src/pages",
+    "hook": "src/hooks",
+    "util": "src/utils",
+}
+
+_MANIFEST = re.compile(r'\[CONTENT\](.*?)(?:\[/CONTENT\]|$)', re.DOTALL)
+_NAME = re.compile(r'^[A-Za-z_$][\w$]*$')
+_SIGNATURE_LINES = 40
+
+
+def default_components():
+    components = copy.deepcopy(DEFAULT_COMPONENTS)
+    for component in components:
+        component["depends_on"] = list(DEFAULT_DEPENDENCIES.get(component["name"], []))
+    return components
+
+
+def parse_component_manifest(analysis_text):
+    """Components from the analysis manifest, or None if it has no usable manifest.
+
+    Each component gets name, type, path, description and depends_on (names
+    of other listed components); unknown dependencies and duplicates are dropped.
+    """
+    if not analysis_text:
+        return None
+    matches = _MANIFEST.findall(analysis_text)
+    if not matches:
+        return None
+    # The manifest is the last [CONTENT] block; earlier ones may be examples
+    data = content_to_json(matches[-1])
+    entries = data.get("components") if isinstance(data, dict) else data
+    if not isinstance(entries, list):
+        return None
+
+    components = []
+    seen = set()
+    for entry in entries:
+        if not isinstance(entry, dict) or not _NAME.match(str(entry.get("name", ""))):
+            continue
+        name = entry["name"]
+        if name in seen:
+            continue
+        component_type = str(entry.get("type", "component")).lower()
+        path = _component_path(name, component_type, entry.get("path"))
+        if path is None:
+            print(f"⚠️ Skipping {name} from the component manifest: path is outside the project layout")
+            continue
+        seen.add(name)
+        depends_on = entry.get("depends_on") or entry.get("children") or []
+        components.append({
+            "name": name,
+            "type": component_type,
+            "path": path,
+            "description": str(entry.get("description", "")),
+            "depends_on": [str(dep) for dep in depends_on if isinstance(dep, str)],
+        })
+
+    for component in components:
+        component["depends_on"] = [
+            dep for dep in dict.fromkeys(component["depends_on"]) if dep in seen and dep != component["name"]
+        ]
+    return components or None
+
+
+def _component_path(name, component_type, path):
+    if component_type == "main" and not path:
+        return "src/App.tsx"
+    if not path:
+        directory = TYPE_DIRECTORIES.get(component_type, "src/components")
+        extension = ".ts" if component_type in ("hook", "util") else ".tsx"
+        return f"{directory}/{name}{extension}"
+    try:
+        return resolve_component_file(str(path), f"src/components/{name}.tsx")
+    except ValueError:
+        return None
+
+
+def load_components(analysis_text):
+    """Components to generate: the analysis manifest if present, otherwise the defaults."""
+    components = parse_component_manifest(analysis_text)
+    if components is None:
+        print("⚠️ No component manifest in the analysis output, generating the default components")
+        return default_components()
+    return components
+
+
+def dependency_waves(components):
+    """Group components into waves; each wave only depends on earlier waves.
+
+    Components caught in a dependency cycle are put together in one final
+    wave (generated without each other's signatures) rather than dropped.
+    """
+    by_name = {component["name"]: component for component in components}
+    remaining = {name: set(component["depends_on"]) & set(by_name) for name, component in by_name.items()}
+    waves = []
+    while remaining:
+        ready = [name for name, deps in remaining.items() if not deps]
+        if not ready:
+            print(f"⚠️ Dependency cycle between {', '.join(sorted(remaining))}; generating them together")
+            ready = list(remaining)
+        waves.append([by_name[name] for name in ready])
+        for name in ready:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    return waves
+
+
+def exported_signatures(code):
+    """Compact summary of a module's public surface: exported types in full, other exports by their first line."""
+    lines = code.split("\n")
+    summary = []
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        stripped = line.strip()
+        if not stripped.startswith("export"):
+            i += 1
+            continue
+        if re.match(r'export\s+(?:declare\s+)?(?:interface|type|enum)\b', stripped) and "{" in stripped:
+            # Copy the whole type body so callers see every prop
+            depth = 0
+            block = []
+            while i < len(lines) and len(block) < _SIGNATURE_LINES:
+                block.append(lines[i])
+                depth += lines[i].count("{") - lines[i].count("}")
+                i += 1
+                if depth <= 0:
+                    break
+            summary.extend(block)
+            continue
+        # Keep the declaration, not the body
+        summary.append(re.sub(r'\s*(?:=>\s*)?\{\s*$', '', stripped))
+        i += 1
+    return "\n".join(summary)
+
+
+def dependency_context(component, generated_files):
+    """Signatures of the already generated components `component` depends on, for its coding prompt."""
+    sections = []
+    for name in component.get("depends_on", []):
+        info = generated_files.get(name)
+        if not info:
+            continue
+        sections.append(f"### {name} ({info['path']})\n```tsx\n{exported_signatures(info['code'])}\n```")
+    return "\n\n".join(sections)
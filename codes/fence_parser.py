@@ -0,0 +1,188 @@
+"""Incremental, single-pass parser for fenced code blocks in LLM responses.
+
+Feed the parser chunks as they stream in; every call to `feed()` returns the
+blocks whose closing fence arrived in that chunk, so a file can be written
+while the model is still generating the rest of the response. Each character
+is looked at a constant number of times, so parsing is linear in the
+response size no matter how it is chunked.
+
+Blocks carry the fence language and a filename when one is given, from
+(in order of preference):
+    ```tsx src/components/Header.tsx      (info string, also title="..." or tsx:path)
+    ```tsx
+    // src/components/Header.tsx          (comment on the first line of the block)
+    **src/components/Header.tsx**         (the last prose line before the fence)
+"""
+import re
+from collections import namedtuple
+
+CodeBlock = namedtuple("CodeBlock", ["language", "filename", "code", "complete"])
+
+# Languages that may hold React/TypeScript source; "" is an untagged fence
+REACT_LANGUAGES = {"", "ts", "tsx", "typescript", "js", "jsx", "javascript"}
+
+# Filename patterns are only ever matched anchored at the start of one token
+# (or line): searched unanchored, the backtracking class retries from every
+# offset and a long path- or URL-like line takes quadratic time.
+_FILENAME = r'[\w@.\-/\[\]]+\.[A-Za-z]{1,5}'
+_INFO_ATTRIBUTE = re.compile(r'(?:title|file(?:name)?)=["\']?(' + _FILENAME + r')["\']?$')
+_INFO_FILENAME = re.compile(r'(?://)?(' + _FILENAME + r')$')
+_INFO_TOKEN_SEPARATOR = re.compile(r'[\s:{},]+')
+_COMMENT_FILENAME = re.compile(r'^\s*(?://|/\*|#|<!--)\s*(?:file(?:name)?\s*:\s*)?(' + _FILENAME + r')\s*(?:\*/|-->)?\s*$')
+_PROSE_FILENAME = re.compile(r'[`*"\']*(' + _FILENAME + r')[`*"\']*:?$')
+
+
+class FenceParser:
+    """State machine over lines: prose -> (opening fence) -> code -> (closing fence) -> prose."""
+
+    def __init__(self):
+        self.blocks = []
+        self._partial = []          # pieces of the current, not yet terminated line
+        self._fence = None          # (char, length) of the open fence, None in prose
+        self._language = ""
+        self._filename = None
+        self._lines = []
+        self._last_prose = ""
+
+    def feed(self, chunk):
+        """Consume a chunk of the response; return blocks completed by it."""
+        completed = []
+        start = 0
+        while True:
+            newline = chunk.find("\n", start)
+            if newline == -1:
+                if start < len(chunk):
+                    self._partial.append(chunk[start:])
+                return completed
+            if self._partial:
+                self._partial.append(chunk[start:newline])
+                line = "".join(self._partial)
+                self._partial = []
+            else:
+                line = chunk[start:newline]
+            block = self._line(line)
+            if block is not None:
+                completed.append(block)
+            start = newline + 1
+
+    def close(self):
+        """Flush the final line; returns blocks completed by it plus an unterminated block, if any.
+
+        An unterminated block (typically a response cut off at max_tokens) is
+        returned with complete=False and is not added to `blocks`.
+        """
+        completed = []
+        if self._partial:
+            line = "".join(self._partial)
+            self._partial = []
+            block = self._line(line)
+            if block is not None:
+                completed.append(block)
+        if self._fence is not None:
+            completed.append(self._emit(complete=False))
+        return completed
+
+    def _line(self, line):
+        stripped = line.strip()
+        if self._fence is None:
+            fence = _opening_fence(stripped)
+            if fence is None:
+                if stripped:
+                    self._last_prose = stripped
+                return None
+            char, length, info = fence
+            self._fence = (char, length)
+            self._language, self._filename = _parse_info(info)
+            if self._filename is None and self._last_prose:
+                # The filename is the line's last token ("**src/App.tsx**:", "File: `App.tsx`")
+                match = _PROSE_FILENAME.match(self._last_prose.rsplit(None, 1)[-1])
+                if match:
+                    self._filename = match.group(1)
+            self._lines = []
+            self._last_prose = ""
+            return None
+
+        char, length = self._fence
+        if len(stripped) >= length and stripped == char * len(stripped):
+            block = self._emit(complete=True)
+            self.blocks.append(block)
+            return block
+        if not self._lines and self._filename is None:
+            match = _COMMENT_FILENAME.match(line)
+            if match:
+                self._filename = match.group(1)
+        self._lines.append(line)
+        return None
+
+    def _emit(self, complete):
+        block = CodeBlock(self._language, self._filename, "\n".join(self._lines).strip(), complete)
+        self._fence = None
+        self._language = ""
+        self._filename = None
+        self._lines = []
+        return block
+
+
+def _opening_fence(stripped):
+    """Return (char, length, info) if the line opens a fence, else None."""
+    if not stripped.startswith(("```", "~~~")):
+        return None
+    char = stripped[0]
+    length = len(stripped) - len(stripped.lstrip(char))
+    info = stripped[length:].strip()
+    # A backtick fence's info string may not itself contain backticks (CommonMark)
+    if char == "`" and "`" in info:
+        return None
+    return char, length, info
+
+
+def _parse_info(info):
+    """Split an info string such as 'tsx src/App.tsx' or 'typescript:App.tsx' into (language, filename)."""
+    if not info:
+        return "", None
+    language = re.split(r'[\s:{]', info, 1)[0].lower()
+    tokens = _INFO_TOKEN_SEPARATOR.split(re.sub(r'\s*=\s*', '=', info[len(language):]))
+    for pattern in (_INFO_ATTRIBUTE, _INFO_FILENAME):
+        for token in tokens:
+            match = pattern.match(token)
+            if match:
+                return language, match.group(1)
+    return language, None
+
+
+def parse_code_blocks(content):
+    """Parse a complete response; returns every closed code block in document order."""
+    parser = FenceParser()
+    parser.feed(content)
+    parser.close()
+    return parser.blocks
+
+
+def block_matches_path(block, path):
+    """True if the block is labelled with `path` (or a path ending in the same file name)."""
+    if not block.filename:
+        return False
+    basename = path.rsplit('/', 1)[-1]
+    return block.filename == path or block.filename == basename or block.filename.endswith('/' + basename)
+
+
+def select_component_block(blocks, component):
+    """Pick the block holding `component` rather than blindly taking the first one.
+
+    Preference: a block whose filename matches the component's path, then a
+    React-language block that declares or default-exports the component, then
+    the largest React-language block.
+    """
+    candidates = [block for block in blocks if block.language in REACT_LANGUAGES and block.code]
+    if not candidates:
+        return None
+    for block in candidates:
+        if block_matches_path(block, component['path']):
+            return block
+    declaration = re.compile(
+        r'\b(?:function|const|class)\s+' + re.escape(component['name']) + r'\b|export\s+default\s+' + re.escape(component['name']) + r'\b'
+    )
+    for block in candidates:
+        if declaration.search(block.code):
+            return block
+    return max(candidates, key=lambda block: len(block.code))
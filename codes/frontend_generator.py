@@ -0,0 +1,375 @@
+"""In-process API for the generation pipeline.
+
+The stage scripts are command-line programs: they parse arguments and build
+an OpenAI client at import time and pass everything between stages through
+files. `FrontendGenerator` runs the same stages inside the calling process,
+with the same prompts and parsing, and keeps every artifact in memory; the
+generated project is a plain {path: content} dict. Nothing touches the disk
+unless `write()` or `archive()` is called, and the client is only built on
+the first model call.
+
+    generator = FrontendGenerator("Dashboard", requirements_text)
+    generator.plan()
+    generator.analyze()
+    project = generator.code()           # {"src/App.tsx": "...", "package.json": "...", ...}
+    tests = generator.test()
+    review = generator.review()
+    generator.write("out/Dashboard_frontend")
+"""
+import hashlib
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from openai import OpenAI
+
+from component_plan import load_components, dependency_waves, dependency_context
+from fence_parser import parse_code_blocks
+from model_client import complete_with_retry
+from perf_lint import lint_project
+from project_index import ProjectIndex
+from project_writer import ProjectWriter, ArchiveWriter, PathClaims
+from requirements_digest import condense, DIGEST_FORMAT
+from planning_sections import (
+    split_requirements, needs_sections, merge_groups, group_title, DEFAULT_SECTION_TOKENS, DEFAULT_MERGE_TOKENS
+)
+from review_plan import review_files, merge_findings, ReviewCache, DEFAULT_CHUNK_TOKENS
+from testing_plan import plan_test_jobs, describe_untargeted, select_coverage_gaps, describe_coverage, import_path, extract_focused_test, validate_test
+from prompts import (
+    build_planning_messages,
+    build_section_planning_messages,
+    build_plan_merge_messages,
+    build_analysis_messages,
+    build_coding_messages,
+    build_component_test_messages,
+    build_test_repair_messages,
+    test_types_to_generate,
+)
+from tracing import span, submit
+from utils import (
+    estimate_cost,
+    generate_package_json,
+    basic_project_files,
+    collect_component_files,
+    test_config_files,
+)
+
+
+class FrontendGenerator:
+    """Plan, analyze, code, test and review one project in memory.
+
+    Stages can be called individually, in order; each returns its result and
+    also keeps it on the instance (`plan_text`, `analysis_text`, `project`,
+    `tests`, `review_text`) for the stages after it. `turns` holds the chat
+    turns the scripts would have written to their trajectory files.
+    """
+
+    def __init__(self, project_name, requirements, requirements_format="markdown", model="o3-mini",
+                 test_model=None, review_model=None, client=None, max_workers=8, verbose=False,
+                 raw_requirements=False):
+        self.project_name = project_name
+        self.requirements = requirements if isinstance(requirements, str) else json.dumps(requirements, indent=2)
+        self.requirements_format = requirements_format
+        # The stages send the condensed digest; planning sends the raw text if raw_requirements is set
+        self.requirements_digest = condense(self.requirements, requirements_format)
+        self.raw_requirements = raw_requirements
+        self.model = model
+        self.test_model = test_model or model
+        self.review_model = review_model or model
+        self.max_workers = max(max_workers, 1)
+        self.verbose = verbose
+        self._client = client
+        self._lock = threading.Lock()
+
+        self.plan_text = None
+        self.analysis_text = None
+        self.components = []
+        self.project = {}
+        self.tests = {}
+        self.review_text = None
+        self.file_reviews = {}
+        self._review_caches = {}
+        self.dependency_report = None
+        self.conflicts = []
+        self.turns = []
+        self.cost = {"total_cost": 0.0, "total_tokens": 0}
+
+    @property
+    def client(self):
+        if self._client is None:
+            # Reads OPENAI_API_KEY / OPENAI_BASE_URL like the scripts do
+            self._client = OpenAI()
+        return self._client
+
+    def plan(self, planning_mode="auto", section_tokens=DEFAULT_SECTION_TOKENS, merge_tokens=DEFAULT_MERGE_TOKENS):
+        """Planning stage; returns the plan text.
+
+        Requirements over `section_tokens` (or any, with planning_mode="sections")
+        are planned per section concurrently and the section plans merged, in
+        rounds when they do not fit `merge_tokens` together.
+        """
+        requirements_format, requirements = DIGEST_FORMAT, self.requirements_digest
+        if self.raw_requirements:
+            requirements_format, requirements = self.requirements_format, self.requirements
+        if planning_mode == "sections" or planning_mode == "auto" and needs_sections(requirements, section_tokens, self.model):
+            messages, self.plan_text = self._plan_in_sections(requirements_format, requirements, section_tokens, merge_tokens)
+        else:
+            with span("build_prompt", stage="planning"):
+                messages = build_planning_messages(self.project_name, requirements_format, requirements)
+            self.plan_text = self._chat(messages, self.model, temperature=0.7, max_tokens=4000)
+        self.turns = [{'role': 'user', 'content': messages[1]['content']},
+                      {'role': 'assistant', 'content': self.plan_text}]
+        self._log("✅ Planning completed")
+        return self.plan_text
+
+    def analyze(self):
+        """Analysis stage, built on the plan (planned first if needed); returns the analysis text."""
+        if self.plan_text is None:
+            self.plan()
+        with span("build_prompt", stage="analysis"):
+            messages = build_analysis_messages(self.project_name, DIGEST_FORMAT, self.requirements_digest, self.plan_text)
+        self.analysis_text = self._chat(messages, self.model, temperature=0.3, max_tokens=6000)
+        self.turns += [{'role': 'user', 'content': messages[1]['content']},
+                       {'role': 'assistant', 'content': self.analysis_text}]
+        self._log("✅ Technical analysis completed")
+        return self.analysis_text
+
+    def code(self):
+        """Coding stage: components in dependency waves, boilerplate and package.json.
+
+        Returns the project as {path: content}. When two components produce
+        the same shared file, the first version is kept and the clash is
+        recorded in `conflicts`, as the scripts' writers do.
+        """
+        if self.analysis_text is None:
+            self.analyze()
+        self.components = load_components(self.analysis_text)
+        reserved_paths = {component['path'] for component in self.components} | set(basic_project_files(self.project_name, {}))
+        waves = dependency_waves(self.components)
+        self._log(f"📋 {len(self.components)} components in {len(waves)} dependency waves")
+
+        project = {}
+        # Same policy as the writers: the first version of a shared path wins
+        claims = PathClaims(self._log)
+        generated_files = {}
+        for wave_number, wave in enumerate(waves, 1):
+            with span("wave", number=wave_number, components=len(wave)):
+                with ThreadPoolExecutor(max_workers=min(self.max_workers, len(wave))) as executor:
+                    futures = {
+                        submit(executor, self._generate_component, component,
+                               dependency_context(component, generated_files), reserved_paths): component
+                        for component in wave
+                    }
+                    for future in as_completed(futures):
+                        component = futures[future]
+                        try:
+                            component_files, rejected, response = future.result()
+                        except Exception as e:
+                            self._log(f"❌ Error generating {component['name']}: {str(e)}")
+                            continue
+                        for filename, reason in rejected:
+                            self._log(f"⚠️ Skipped {filename} from {component['name']}: {reason}")
+                        for path, code in component_files.items():
+                            if claims.claim(path, hashlib.sha1(code.encode('utf-8')).hexdigest(), component['name']):
+                                project[path] = code
+                        if component['path'] in component_files:
+                            generated_files[component['name']] = {
+                                'path': component['path'],
+                                'code': component_files[component['path']],
+                                'files': list(component_files),
+                                'full_response': response
+                            }
+                            self._log(f"✅ Generated {component['name']} component ({len(component_files)} files)")
+
+        project.update(basic_project_files(self.project_name, generated_files))
+        package_json, self.dependency_report = generate_package_json(
+            self.project_name, f"{self.project_name}_frontend", sources=project
+        )
+        project["package.json"] = json.dumps(package_json, indent=2)
+        self.project = project
+        self.conflicts = claims.conflicts
+        return project
+
+    def test(self, test_types="unit,integration", test_framework="jest", coverage_threshold=80, include_accessibility=True,
+             fix_rounds=1, all_tests=False):
+        """Testing stage over the in-memory project; returns the new test and config files as {path: content}.
+
+        Only the files needed to bring each test type to `coverage_threshold`
+        percent of exports covered get tests (every file with all_tests=True).
+        Tests that fail validation are regenerated with their errors up to
+        `fix_rounds` times and left out if still invalid. The files are also
+        added to `project`.
+        """
+        if not self.project:
+            self.code()
+        index = ProjectIndex.from_sources(self.project)
+        requested_types = test_types_to_generate(test_types, include_accessibility)
+        jobs = plan_test_jobs(index, index.structure(), requested_types)
+        for line in describe_untargeted(jobs, requested_types):
+            self._log(line)
+        if not all_tests:
+            jobs, report = select_coverage_gaps(index, jobs, coverage_threshold)
+            for line in describe_coverage(report, coverage_threshold):
+                self._log(line)
+        tests = {}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(jobs) or 1)) as executor:
+            futures = {submit(executor, self._generate_test, job, index, test_framework, coverage_threshold,
+                              include_accessibility, fix_rounds): job for job in jobs}
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    test_code, errors = future.result()
+                except Exception as e:
+                    self._log(f"❌ Failed to generate {job.test_type} tests for {job.target}: {str(e)}")
+                    continue
+                if errors:
+                    self._log(f"❌ {job.test_path} failed validation, not saved: {' '.join(errors)}")
+                    continue
+                tests[job.test_path] = test_code
+                self._log(f"✅ {job.test_path}")
+        tests.update(test_config_files(coverage_threshold))
+        self.tests = tests
+        self.project.update(tests)
+        return tests
+
+    def review(self, review_focus="performance,accessibility,security", chunk_tokens=DEFAULT_CHUNK_TOKENS,
+               include_tests=False):
+        """Code review of the in-memory project's sources; returns the review text.
+
+        Each file (or token-bounded chunk) is reviewed concurrently and one
+        final call merges and ranks the findings of the files with issues (no
+        call when every file is clean), as code_review.py does; per-file
+        findings are kept in `file_reviews`. Calling review() again after changing the project
+        only re-reviews changed files and the files importing a changed
+        interface. The static performance lint runs first and its findings are
+        passed to the per-file reviews. Test files are skipped unless
+        include_tests=True.
+        """
+        if not self.project:
+            self.code()
+        index = ProjectIndex.from_sources(self.project)
+        code_files = {path: index.read(path) for path in sorted(index.files)
+                      if include_tests or index.files[path]["role"] != "test"}
+        if not code_files:
+            raise ValueError("No code files to review")
+        cache = self._review_caches.setdefault(review_focus, ReviewCache(None, self.review_model, review_focus))
+        with span("perf_lint", files=len(code_files)):
+            lint = lint_project(code_files)
+        file_reviews, reviewed_files = review_files(code_files, index, cache, lint, self._review_complete, review_focus,
+                                                    chunk_tokens, self.review_model, self.max_workers, self._log)
+        if not file_reviews:
+            raise RuntimeError("Every file review failed")
+        self.file_reviews = file_reviews
+        report = merge_findings(file_reviews, cache, reviewed_files, self._review_complete, review_focus, self._log)
+        cache.save()
+        self.review_text = report
+        self._log("✅ Code review completed")
+        return self.review_text
+
+    def run(self, test=False, review=False):
+        """Plan, analyze and code (plus tests and review if asked); returns the project."""
+        self.plan()
+        self.analyze()
+        self.code()
+        if test:
+            self.test()
+        if review:
+            self.review()
+        return self.project
+
+    def write(self, project_path):
+        """Write the project to `project_path`, touching only files whose content changed."""
+        writer = ProjectWriter(project_path)
+        for path, content in self.project.items():
+            writer.write(path, content)
+        return writer.finish(self._manifest_metadata())
+
+    def archive(self, destination, archive_format=None):
+        """Stream the project into a .tar.gz/.zip path or a binary file object."""
+        writer = ArchiveWriter(destination, f"{self.project_name}_frontend", archive_format)
+        for path, content in self.project.items():
+            writer.write(path, content)
+        return writer.finish(self._manifest_metadata())
+
+    def _generate_component(self, component, dependency_signatures, reserved_paths):
+        with span("build_prompt", stage="coding", component=component['name']):
+            messages = build_coding_messages(self.project_name, component, self.requirements_digest,
+                                             self.analysis_text, dependency_signatures)
+        response = self._chat(messages, self.model, temperature=0.2, max_tokens=3000, component=component['name'])
+        component_files, rejected = collect_component_files(parse_code_blocks(response), component, reserved_paths)
+        return component_files, rejected, response
+
+    def _generate_test(self, job, index, test_framework, coverage_threshold, include_accessibility, fix_rounds):
+        with span("build_prompt", stage="testing", test_type=job.test_type, target=job.target):
+            messages = build_component_test_messages(self.project_name, job.test_type, job.target, job.source,
+                                                     job.dependency_signatures, job.test_path,
+                                                     import_path(job.test_path, job.target),
+                                                     test_framework, coverage_threshold, include_accessibility,
+                                                     job.uncovered)
+        for round_number in range(fix_rounds + 1):
+            response = self._chat(messages, self.test_model, temperature=0.2, max_tokens=2000,
+                                  test_type=job.test_type, target=job.target)
+            test_code = extract_focused_test(response, job.test_path)
+            errors = validate_test(test_code, job, index)
+            if not errors:
+                break
+            if round_number < fix_rounds:
+                self._log(f"🔧 Regenerating {job.test_path}: {len(errors)} problem(s)")
+                messages = build_test_repair_messages(messages, response, errors, job.test_path)
+        return test_code, errors
+
+    def _plan_in_sections(self, requirements_format, requirements, section_tokens, merge_tokens):
+        """Map-reduce planning; returns (final merge messages, plan)."""
+        with span("build_prompt", stage="planning", phase="sections"):
+            project_context, sections = split_requirements(requirements, section_tokens, self.model)
+            calls = [(section.title, build_section_planning_messages(self.project_name, requirements_format,
+                                                                     project_context, section.title, section.content))
+                     for section in sections]
+        self._log(f"🧩 Planning {len(sections)} sections")
+        section_plans = self._chat_all(calls, max_tokens=2000)
+        if len(sections) == 1:
+            return calls[0][1], section_plans[0][1]
+        while True:
+            groups = merge_groups(section_plans, merge_tokens, self.model)
+            if len(groups) == 1:
+                break
+            calls = [(group_title(group), build_plan_merge_messages(self.project_name, project_context, group))
+                     for group in groups if len(group) > 1]
+            merged = iter(self._chat_all(calls, max_tokens=4000))
+            section_plans = [group[0] if len(group) == 1 else next(merged) for group in groups]
+        messages = build_plan_merge_messages(self.project_name, project_context, groups[0])
+        return messages, self._chat(messages, self.model, temperature=0.7, max_tokens=4000, phase="merge")
+
+    def _chat_all(self, calls, max_tokens):
+        """[(title, messages)] completed concurrently; returns [(title, content)] in input order."""
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(calls))) as executor:
+            futures = [submit(executor, self._chat, messages, self.model, temperature=0.7, max_tokens=max_tokens,
+                              section=title)
+                       for title, messages in calls]
+            return [(title, future.result()) for (title, _), future in zip(calls, futures)]
+
+    def _review_complete(self, messages, max_tokens, **span_attrs):
+        return self._chat(messages, self.review_model, temperature=0.1, max_tokens=max_tokens, **span_attrs)
+
+    def _chat(self, messages, model, temperature, max_tokens, **span_attrs):
+        """One completion with rate-limit backoff; usage is added to `cost`."""
+        response = complete_with_retry(self.client, model, messages, temperature, max_tokens, **span_attrs)
+        usage = getattr(response, 'usage', None)
+        if usage:
+            # Component calls run concurrently; float += on a dict entry is not atomic
+            with self._lock:
+                self.cost["total_cost"] += estimate_cost(model, usage.prompt_tokens, usage.completion_tokens)
+                self.cost["total_tokens"] += usage.total_tokens
+        return response.choices[0].message.content
+
+    def _manifest_metadata(self):
+        return {
+            "project_name": self.project_name,
+            "model": self.model,
+            "components": [component['name'] for component in self.components],
+            "dependencies": json.loads(self.project["package.json"])["dependencies"] if "package.json" in self.project else {},
+        }
+
+    def _log(self, message):
+        if self.verbose:
+            print(message)
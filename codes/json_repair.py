@@ -0,0 +1,321 @@
+"""Tolerant JSON parsing for model output.
+
+`repair_json` first tries `json.loads`; if that fails it rewrites the text in
+a single left-to-right pass that fixes the damage LLMs typically produce:
+
+- code fences and prose around the JSON
+- `//`, `/* */` and `#` comments
+- trailing, missing and doubled commas
+- single-quoted strings, unquoted keys and bare-word values
+- Python literals (True/False/None)
+- truncated output: unterminated strings, dangling keys and unclosed
+  brackets are closed from the bracket stack
+
+The JSON may start at any `{` or `[`, and prose has brackets too ("the plan
+[v2]"). Candidate starts are brackets at the start of a line and inline `{`;
+at most MAX_CANDIDATES of them are tried, skipping those inside a value
+already found, and the value spanning the most text wins, fewest repairs
+first on ties. Only line-start candidates are repaired, and an array or a
+repaired value followed by more prose on its line is rejected, so a bracketed
+word in a sentence is never returned as the JSON. Each attempt is linear in the input size.
+
+The repairs applied are returned alongside the parsed value so callers can
+log them instead of silently accepting damaged output.
+"""
+import json
+import re
+
+from fence_parser import FenceParser
+
+_WORD = re.compile(r'[A-Za-z0-9_$.+\-]+')
+_JSON_NUMBER = re.compile(r'-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?$')
+# Numbers JSON rejects but models write: .5, -.5, +2, 1., 007
+_LOOSE_NUMBER = re.compile(r'[+-]?(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?$')
+_INTEGER = re.compile(r'[+-]?\d+$')
+# A bracket opening a line, or an inline object
+_CANDIDATE = re.compile(r'^[ \t]*([{\[])|\{', re.MULTILINE)
+# What may follow a value on its line; anything else means the bracket was prose
+_LINE_TAIL = re.compile(r'[ \t.,;]*(?:\n|$)')
+MAX_CANDIDATES = 16
+_LITERALS = {"true": "true", "false": "false", "null": "null",
+             "True": "true", "False": "false", "None": "null", "undefined": "null"}
+_JSON_LANGUAGES = {"", "json", "jsonc", "json5", "javascript", "js"}
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def repair_json(text):
+    """Parse JSON from model output, repairing common damage.
+
+    Returns (data, repairs) where `repairs` names each kind of fix applied,
+    in order of first occurrence (empty if the text was valid JSON). Raises
+    ValueError if no JSON object or array can be recovered.
+    """
+    repairs = []
+    text = _strip_fences(text, repairs)
+    try:
+        return json.loads(text), repairs
+    except json.JSONDecodeError:
+        pass
+    data, applied = _best_candidate(text)
+    for repair in applied:
+        _note(repairs, repair)
+    return data, repairs
+
+
+def _best_candidate(text):
+    """(data, repairs) for the best JSON value found in `text`; see the module docstring."""
+    decoder = json.JSONDecoder(strict=False)
+    best = None
+    covered = 0
+    tried = 0
+    for match in _CANDIDATE.finditer(text):
+        line_start = match.group(1) is not None
+        start = match.start(1) if line_start else match.start()
+        if start < covered:
+            continue
+        if tried == MAX_CANDIDATES:
+            break
+        tried += 1
+        applied = []
+        repaired = False
+        try:
+            data, end = decoder.raw_decode(text, start)
+        except ValueError:
+            if not line_start:
+                continue
+            repairer = _Repairer(text, applied, start)
+            try:
+                data = json.loads(repairer.run(), strict=False)
+            except ValueError:
+                continue
+            end = repairer.end
+            repaired = True
+        if (repaired or isinstance(data, list)) and not _LINE_TAIL.match(text, end):
+            continue
+        covered = end
+        if text[end:].strip():
+            _note(applied, "trailing text")
+        if text[:start].strip():
+            applied.insert(0, "leading text")
+        key = (end - start, -len(applied))
+        if best is None or key > best[0]:
+            best = (key, data, applied)
+    if best is None:
+        raise ValueError("No JSON object or array found")
+    return best[1], best[2]
+
+
+def _strip_fences(text, repairs):
+    if "```" not in text and "~~~" not in text:
+        return text
+    parser = FenceParser()
+    parser.feed(text)
+    # A truncated response may end inside the fence
+    blocks = parser.blocks + [block for block in parser.close() if not block.complete]
+    for block in blocks:
+        if block.language in _JSON_LANGUAGES and block.code.startswith(("{", "[")):
+            _note(repairs, "code fence")
+            return block.code
+    return text
+
+
+def _note(repairs, repair):
+    if repair not in repairs:
+        repairs.append(repair)
+
+
+class _Repairer:
+    """Single-pass rewriter; `stack` holds [bracket, state] for every open container.
+
+    Object states: key -> colon -> value -> next; array states: value -> next.
+    """
+
+    def __init__(self, text, repairs, start):
+        self.text = text
+        self.repairs = repairs
+        self.start = start
+        self.end = start            # index after the last character consumed
+        self.out = []
+        self.stack = []
+        self.pending_comma = None   # index in `out` of a comma not yet followed by a value
+        self.done = False
+
+    def run(self):
+        text = self.text
+        n = len(text)
+        i = self.start
+        while i < n and not self.done:
+            c = text[i]
+            if c in " \t\r\n":
+                self.out.append(c)
+                i += 1
+            elif c == "/" and text.startswith("//", i) or c == "#":
+                end = text.find("\n", i)
+                i = n if end == -1 else end
+                _note(self.repairs, "comment")
+            elif c == "/" and text.startswith("/*", i):
+                end = text.find("*/", i + 2)
+                i = n if end == -1 else end + 2
+                _note(self.repairs, "comment")
+            elif c in "{[":
+                self._begin_value(is_key=False)
+                self.stack.append([c, "key" if c == "{" else "value"])
+                self.out.append(c)
+                i += 1
+            elif c in "}]":
+                self._close(c)
+                i += 1
+            elif c == ",":
+                self._comma()
+                i += 1
+            elif c == ":":
+                if self.stack and self.stack[-1][1] == "colon":
+                    self.out.append(":")
+                    self.stack[-1][1] = "value"
+                else:
+                    _note(self.repairs, "stray colon")
+                i += 1
+            elif c in "\"'":
+                i = self._string(i)
+            else:
+                match = _WORD.match(text, i)
+                if match is None:
+                    _note(self.repairs, "stray character")
+                    i += 1
+                else:
+                    self._word(match.group())
+                    i = match.end()
+
+        if not self.done:
+            self._close_all()
+        self.end = i
+        return "".join(self.out)
+
+    def _begin_value(self, is_key):
+        """Prepare to emit a key or value: insert a missing comma or colon as needed."""
+        self.pending_comma = None
+        if not self.stack:
+            return
+        top = self.stack[-1]
+        if top[1] == "next":
+            self.out.append(",")
+            top[1] = "key" if top[0] == "{" else "value"
+            _note(self.repairs, "missing comma")
+        if top[0] == "{" and top[1] == "colon" and not is_key:
+            self.out.append(":")
+            top[1] = "value"
+            _note(self.repairs, "missing colon")
+
+    def _end_value(self):
+        if not self.stack:
+            self.done = True
+            return
+        top = self.stack[-1]
+        top[1] = "colon" if top[0] == "{" and top[1] == "key" else "next"
+
+    def _comma(self):
+        if not self.stack:
+            self.done = True
+            return
+        top = self.stack[-1]
+        if top[1] == "next":
+            self.pending_comma = len(self.out)
+            self.out.append(",")
+            top[1] = "key" if top[0] == "{" else "value"
+        else:
+            _note(self.repairs, "extra comma")
+
+    def _close(self, closer):
+        if not self.stack:
+            self.done = True
+            return
+        bracket, state = self.stack.pop()
+        if self.pending_comma is not None:
+            self.out[self.pending_comma] = ""
+            self.pending_comma = None
+            _note(self.repairs, "trailing comma")
+        if bracket == "{" and state in ("colon", "value"):
+            # {"key"} or {"key": } -> the key gets a null value
+            self.out.append(": null" if state == "colon" else "null")
+            _note(self.repairs, "missing value")
+        if _CLOSERS[bracket] != closer:
+            _note(self.repairs, "mismatched bracket")
+        self.out.append(_CLOSERS[bracket])
+        self._end_value()
+
+    def _close_all(self):
+        if self.stack:
+            _note(self.repairs, "truncated")
+        while self.stack:
+            self._close(_CLOSERS[self.stack[-1][0]])
+
+    def _string(self, i):
+        """Emit the string starting at text[i] as a double-quoted JSON string; return the index after it."""
+        text = self.text
+        quote = text[i]
+        is_key = bool(self.stack) and self.stack[-1][0] == "{" and self.stack[-1][1] in ("key", "next")
+        self._begin_value(is_key=is_key)
+        if quote == "'":
+            _note(self.repairs, "single quotes")
+
+        if quote == '"':
+            # Fast path: copy runs between escapes in one slice
+            j = i + 1
+            while True:
+                end = text.find('"', j)
+                if end == -1:
+                    self.out.append(text[i:] + ('"' if not text.endswith("\\") else '\\"'))
+                    _note(self.repairs, "unterminated string")
+                    self._end_value()
+                    return len(text)
+                backslashes = 0
+                k = end - 1
+                while k > i and text[k] == "\\":
+                    backslashes += 1
+                    k -= 1
+                if backslashes % 2 == 0:
+                    self.out.append(text[i:end + 1])
+                    self._end_value()
+                    return end + 1
+                j = end + 1
+
+        # Single-quoted: unescape \' and escape bare double quotes
+        chars = ['"']
+        j = i + 1
+        n = len(text)
+        while j < n:
+            c = text[j]
+            if c == "\\" and j + 1 < n:
+                chars.append("'" if text[j + 1] == "'" else text[j:j + 2])
+                j += 2
+                continue
+            if c == "'":
+                break
+            chars.append('\\"' if c == '"' else c)
+            j += 1
+        else:
+            _note(self.repairs, "unterminated string")
+        chars.append('"')
+        self.out.append("".join(chars))
+        self._end_value()
+        return j + 1
+
+    def _word(self, word):
+        is_key = bool(self.stack) and self.stack[-1][0] == "{" and self.stack[-1][1] in ("key", "next")
+        self._begin_value(is_key=is_key)
+        if is_key:
+            self.out.append(json.dumps(word))
+            _note(self.repairs, "unquoted key")
+        elif word in _LITERALS:
+            if _LITERALS[word] != word:
+                _note(self.repairs, "python literal")
+            self.out.append(_LITERALS[word])
+        elif _JSON_NUMBER.match(word):
+            self.out.append(word)
+        elif _LOOSE_NUMBER.match(word):
+            self.out.append(json.dumps(int(word) if _INTEGER.match(word) else float(word)))
+            _note(self.repairs, "loose number")
+        else:
+            self.out.append(json.dumps(word))
+            _note(self.repairs, "unquoted value")
+        self._end_value()
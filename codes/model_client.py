@@ -0,0 +1,36 @@
+"""Chat completion calls shared by the OpenAI stage scripts and FrontendGenerator.
+
+Every model call goes through `complete_with_retry` (or `create_with_retry`
+for a streamed call), so the rate-limit backoff and the `model_call` span
+are the same in every stage and in the in-process API.
+"""
+import time
+
+from openai import RateLimitError
+
+from tracing import span
+
+# Attempts per model call when rate limited
+MAX_RETRIES = 4
+
+
+def create_with_retry(client, **request):
+    """client.chat.completions.create(**request), retried after 1, 2, 4... seconds when rate limited."""
+    for attempt in range(MAX_RETRIES):
+        try:
+            return client.chat.completions.create(**request)
+        except RateLimitError:
+            if attempt == MAX_RETRIES - 1:
+                raise
+            time.sleep(2 ** attempt)
+
+
+def complete_with_retry(client, model, messages, temperature, max_tokens, **span_attrs):
+    """One completion in a `model_call` span with its token usage; returns the response."""
+    with span("model_call", model=model, **span_attrs) as call_span:
+        response = create_with_retry(client, model=model, messages=messages, temperature=temperature,
+                                     max_tokens=max_tokens)
+        usage = getattr(response, 'usage', None)
+        if usage:
+            call_span.set(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens)
+    return response
@@ -0,0 +1,237 @@
+"""Static performance lint for generated React code.
+
+Many of the performance issues the review asks the model about can be found
+mechanically. This rule engine runs over the project's TS/TSX sources in pure
+Python (comments blanked, brackets matched, no Node toolchain) and returns
+structured findings:
+
+- missing-key          `.map()` renders JSX without a `key` on the outer element
+- inline-prop-on-memo  a memo() component gets an inline object, array or function prop
+- whole-library-import `lodash`, `moment` or `underscore` imported as a whole
+- effect-without-deps  useEffect/useLayoutEffect/useMemo/useCallback with no dependency array
+- unvirtualized-list   a list is rendered item by item with no slicing or virtualization
+
+The review sends these findings to the model as a compact summary with each
+file, so the model spends its answer on what the rules cannot see instead of
+repeating them. When the rules cover every requested focus area for a file
+(see `lint_covers`) the model gets the summary and the file's exported
+interface instead of its source.
+"""
+import bisect
+import re
+from collections import namedtuple
+
+from project_index import scan_module
+
+Finding = namedtuple("Finding", ["rule", "severity", "path", "line", "message"])
+
+WHOLE_LIBRARIES = {
+    "lodash": "import the functions you use ('lodash/debounce') or use lodash-es",
+    "underscore": "import only the functions you use or use native array methods",
+    "moment": "use date-fns or dayjs, which are tree-shakeable and much smaller",
+}
+VIRTUALIZATION_PACKAGES = ("react-window", "react-virtualized", "react-virtuoso", "@tanstack/react-virtual")
+DEPENDENCY_HOOKS = ("useEffect", "useLayoutEffect", "useMemo", "useCallback")
+
+_COMMENT = re.compile(r'//[^\n]*|/\*.*?\*/', re.DOTALL)
+_STRING = re.compile(r"'(?:\\.|[^'\\\n])*'|\"(?:\\.|[^\"\\\n])*\"|`(?:\\.|[^`\\])*`")
+_MAP_CALL = re.compile(r'((?:[\w$]+|\))(?:\??\.[\w$]+|\([^()]*\))*)\??\.map\s*\(')
+_JSX_OPEN = re.compile(r'<(?:([A-Za-z][\w.]*)(?=[\s>/])|>)')
+_HOOK_CALL = re.compile(r'\b(?:React\.)?(' + '|'.join(DEPENDENCY_HOOKS) + r')\s*\(')
+_MEMO_DECLARATION = re.compile(
+    r'(?:const|let|var)\s+([A-Z][\w$]*)\s*(?::[^=]+)?=\s*(?:React\.)?memo\s*\(|(?:React\.)?memo\s*\(\s*([A-Z][\w$]*)\s*[,)]'
+)
+_INLINE_PROP = re.compile(r'\s([A-Za-z][\w-]*)\s*=\s*\{\s*(\{|\[|\(?[\w$,\s]*\)?\s*=>|function\b)')
+_BRACKETS = {'(': ')', '{': '}', '[': ']'}
+
+
+def _blank(match):
+    # Keep offsets and line numbers: replace everything but newlines with spaces
+    return re.sub(r'[^\n]', ' ', match.group())
+
+
+def _strip_comments(text):
+    """`text` with comments blanked out; string contents are left alone."""
+    pieces = []
+    pos = 0
+    pattern = re.compile(_COMMENT.pattern + '|' + _STRING.pattern, re.DOTALL)
+    for match in pattern.finditer(text):
+        pieces.append(text[pos:match.start()])
+        token = match.group()
+        pieces.append(_blank(match) if token.startswith(('//', '/*')) else token)
+        pos = match.end()
+    pieces.append(text[pos:])
+    return ''.join(pieces)
+
+
+def _matching(text, start):
+    """Index of the bracket closing the one at `start` (skipping strings), or len(text)."""
+    stack = []
+    i = start
+    n = len(text)
+    while i < n:
+        char = text[i]
+        if char in '\'"`':
+            match = _STRING.match(text, i)
+            if match:
+                i = match.end()
+                continue
+        if char in _BRACKETS:
+            stack.append(_BRACKETS[char])
+        elif stack and char == stack[-1]:
+            stack.pop()
+            if not stack:
+                return i
+        i += 1
+    return n
+
+
+def _top_level_arguments(text, open_paren):
+    """Number of top-level arguments in the call whose '(' is at `open_paren`."""
+    close = _matching(text, open_paren)
+    body = text[open_paren + 1:close]
+    if not body.strip():
+        return 0
+    count = 1
+    depth = 0
+    i = 0
+    while i < len(body):
+        char = body[i]
+        if char in '\'"`':
+            match = _STRING.match(body, i)
+            if match:
+                i = match.end()
+                continue
+        if char in '({[':
+            depth += 1
+        elif char in ')}]':
+            depth -= 1
+        elif char == ',' and depth == 0 and body[i + 1:].strip():
+            count += 1
+        i += 1
+    return count
+
+
+def _tag_attributes(text, tag_start):
+    """Attribute text of the JSX tag starting at `tag_start`, up to its closing '>'."""
+    i = tag_start + 1
+    n = len(text)
+    while i < n:
+        char = text[i]
+        if char == '{':
+            i = _matching(text, i) + 1
+            continue
+        if char in '\'"':
+            match = _STRING.match(text, i)
+            if match:
+                i = match.end()
+                continue
+        if char == '>':
+            return text[tag_start:i]
+        i += 1
+    return text[tag_start:]
+
+
+def memo_components(sources):
+    """Names of components wrapped in memo() anywhere in {path: text}."""
+    names = set()
+    for text in sources.values():
+        for match in _MEMO_DECLARATION.finditer(text):
+            names.add(match.group(1) or match.group(2))
+    return names
+
+
+def lint_source(path, text, memoized=()):
+    """Findings for one file; `memoized` names the project's memo() components."""
+    code = _strip_comments(text)
+    line_starts = [0] + [match.end() for match in re.finditer(r'\n', code)]
+
+    def line_of(offset):
+        return bisect.bisect_right(line_starts, offset)
+
+    findings = []
+    imports = scan_module(code)["imports"]
+    imported = {item["source"] for item in imports}
+
+    for item in imports:
+        library = item["source"]
+        if library in WHOLE_LIBRARIES and not item["type_only"]:
+            match = re.search(r'''['"]''' + re.escape(library) + r'''['"]''', code)
+            findings.append(Finding("whole-library-import", "Medium", path, line_of(match.start()) if match else 1,
+                                    f"imports all of '{library}'; {WHOLE_LIBRARIES[library]}"))
+
+    virtualized = any(source.startswith(VIRTUALIZATION_PACKAGES) for source in imported)
+    for match in _MAP_CALL.finditer(code):
+        open_paren = match.end() - 1
+        body_end = _matching(code, open_paren)
+        body = code[open_paren:body_end]
+        tag = _JSX_OPEN.search(body)
+        if not tag:
+            continue
+        attributes = _tag_attributes(body, tag.start())
+        element = tag.group(1) or "<>"
+        line = line_of(open_paren + tag.start())
+        if not re.search(r'\skey\s*=', attributes):
+            findings.append(Finding("missing-key", "High", path, line,
+                                    f"<{element}> rendered in {match.group(1)}.map() has no key prop"))
+        bounded = virtualized or re.search(r'\.(?:slice|splice)\s*\(', match.group(1))
+        list_element = element in ("li", "tr") or re.search(r'[a-z](?:Row|Item)$', element)
+        if list_element and not bounded:
+            findings.append(Finding("unvirtualized-list", "Low", path, line,
+                                    f"every item of {match.group(1)} is rendered as <{element}>; virtualize it "
+                                    f"(react-window) or paginate if the list can grow large"))
+
+    for match in _HOOK_CALL.finditer(code):
+        hook = match.group(1)
+        if _top_level_arguments(code, match.end() - 1) == 1:
+            consequence = "runs after every render" if hook in ("useEffect", "useLayoutEffect") else "recomputes on every render"
+            findings.append(Finding("effect-without-deps", "Medium", path, line_of(match.start()),
+                                    f"{hook} has no dependency array and {consequence}"))
+
+    for name in memoized:
+        for match in re.finditer(r'<' + re.escape(name) + r'(?=[\s>/])', code):
+            attributes = _tag_attributes(code, match.start())
+            for prop in _INLINE_PROP.finditer(attributes):
+                kind = {"{": "object", "[": "array"}.get(prop.group(2), "function")
+                findings.append(Finding("inline-prop-on-memo", "Medium", path, line_of(match.start()),
+                                        f"inline {kind} passed as {prop.group(1)} to memoized <{name}> "
+                                        f"defeats memo(); hoist it or wrap it in useMemo/useCallback"))
+    return sorted(findings, key=lambda finding: finding.line)
+
+
+def lint_project(sources):
+    """{path: findings} for every file in {path: text} (files without findings included)."""
+    memoized = memo_components(sources)
+    return {path: lint_source(path, text, memoized) for path, text in sources.items()}
+
+
+def format_findings(findings):
+    """Compact one-line-per-finding summary for the review prompts."""
+    return "\n".join(f"- **{finding.severity}** `{finding.path}:{finding.line}` [{finding.rule}] {finding.message}"
+                     for finding in findings)
+
+
+_SECURITY_MARKERS = re.compile(
+    r'dangerouslySetInnerHTML|\.innerHTML|\beval\s*\(|new\s+Function\s*\(|localStorage|sessionStorage|document\.cookie'
+    r'|\bfetch\s*\(|\baxios\b|XMLHttpRequest|window\.location|window\.open|\bhref\s*=\s*\{|postMessage'
+)
+_JSX_ELEMENT = re.compile(r'<[A-Za-z][\w.]*[\s/>]')
+
+
+def lint_covers(text, focus_areas):
+    """True when the lint's rules cover every requested focus area for this code.
+
+    Performance is covered by the rules; accessibility only matters for code
+    that renders JSX and security only for code that touches the DOM, storage
+    or the network. Any other focus area needs the source.
+    """
+    code = _strip_comments(text)
+    for area in focus_areas:
+        if area == 'performance':
+            continue
+        if area == 'accessibility' and not _JSX_ELEMENT.search(code):
+            continue
+        if area == 'security' and not _SECURITY_MARKERS.search(code):
+            continue
+        return False
+    return True
@@ -0,0 +1,166 @@
+"""Section jobs for hierarchical (map-reduce) planning.
+
+A large specification sent to the planner in one prompt gets a truncated or
+shallow plan, and may not fit a small local model's context at all. Instead
+the requirements are split by their top-level sections: each section is
+planned on its own, concurrently, with a short shared project context (the
+title and overview), and merge calls then reconcile the section plans into
+one plan with a single component hierarchy, route table and state design.
+
+Sections over the token budget are split by their subsections, and by lines
+as a last resort; adjacent small sections are packed together so a spec with
+many short sections does not become many tiny calls. Merge calls take as many
+section plans as fit `merge_tokens`; when they do not all fit, partial merges
+run first and are merged again, so no single call grows with the spec. A plan
+over half the merge budget is trimmed to that share rather than paired into
+an over-budget call.
+"""
+import math
+from collections import namedtuple
+
+from requirements_digest import parse_sections
+from review_plan import chunk_lines
+from utils import count_tokens
+
+PlanningSection = namedtuple("PlanningSection", ["title", "content"])
+
+DEFAULT_SECTION_TOKENS = 6000
+DEFAULT_MERGE_TOKENS = 12000
+# The project context repeated in every section prompt is cut to this size
+CONTEXT_TOKENS = 600
+_OVERVIEW_TITLES = ("overview", "introduction", "summary", "description")
+
+
+def _render(section):
+    """Markdown text of a parsed section, its heading and all its subsections."""
+    lines = []
+    if section["level"]:
+        lines.append(f"{'#' * section['level']} {section['title']}")
+    lines.extend(section["body"])
+    text = '\n'.join(lines).strip()
+    children = [_render(child) for child in section["children"]]
+    return '\n'.join(part for part in [text, *children] if part)
+
+
+def _top_level(root):
+    """(preamble, sections): a document with a single title heading is split by the title's children."""
+    if len(root["children"]) == 1 and not '\n'.join(root["body"]).strip():
+        title = root["children"][0]
+        preamble = f"{'#' * title['level']} {title['title']}\n" + '\n'.join(title["body"])
+        return preamble.strip(), title["children"]
+    return '\n'.join(root["body"]).strip(), root["children"]
+
+
+def _split(section, section_tokens, model_name, prefix=""):
+    """PlanningSections for one parsed section, split until each fits `section_tokens`."""
+    title = f"{prefix}{section['title']}"
+    text = _render(section)
+    if count_tokens(text, model_name) <= section_tokens:
+        return [PlanningSection(title, text)]
+    if section["children"]:
+        own = '\n'.join([f"{'#' * section['level']} {section['title']}", *section["body"]]).strip()
+        parts = []
+        if '\n'.join(section["body"]).strip():
+            parts.append(PlanningSection(title, own))
+        for child in section["children"]:
+            parts.extend(_split(child, section_tokens, model_name, prefix=f"{title} / "))
+        return parts
+    chunks = chunk_lines(text, section_tokens, model_name)
+    return [PlanningSection(f"{title} (part {number}/{len(chunks)})", chunk)
+            for number, (_, _, chunk) in enumerate(chunks, 1)]
+
+
+def _span_title(titles):
+    if len(titles) <= 2:
+        return " + ".join(titles)
+    return f"{titles[0]} … {titles[-1]}"
+
+
+def _pack(sections, section_tokens, model_name):
+    """Adjacent sections joined into packs of about equal size, each within `section_tokens`."""
+    sizes = [count_tokens(section.content, model_name) for section in sections]
+    target = sum(sizes) / max(math.ceil(sum(sizes) / section_tokens), 1)
+    packs = []
+    size = 0
+    for section, tokens in zip(sections, sizes):
+        if packs and size < target and size + tokens <= section_tokens:
+            packs[-1].append(section)
+            size += tokens
+        else:
+            packs.append([section])
+            size = tokens
+    return [PlanningSection(_span_title([section.title for section in pack]),
+                            '\n'.join(section.content for section in pack))
+            for pack in packs]
+
+
+def needs_sections(requirements_content, section_tokens, model_name="gpt-4"):
+    """True when the requirements are too large to plan in one call of `section_tokens`."""
+    return count_tokens(requirements_content, model_name) > section_tokens
+
+
+def split_requirements(requirements_content, section_tokens=DEFAULT_SECTION_TOKENS, model_name="gpt-4"):
+    """(project_context, [PlanningSection]) for markdown requirements (or a digest).
+
+    The context is the document title, any text before the first section and
+    its overview section, shared by every section prompt. Text without
+    headings is split by lines.
+    """
+    preamble, top_level = _top_level(parse_sections(requirements_content))
+    context = [preamble] if preamble else []
+    sections = []
+    for section in top_level:
+        if not sections and not context[1:] and section["title"].strip().lower().endswith(_OVERVIEW_TITLES):
+            context.append(_render(section))
+            continue
+        sections.extend(_split(section, section_tokens, model_name))
+    if not sections:
+        chunks = chunk_lines(requirements_content, section_tokens, model_name)
+        sections = [PlanningSection(f"Part {number}/{len(chunks)}", chunk)
+                    for number, (_, _, chunk) in enumerate(chunks, 1)]
+    project_context = chunk_lines('\n'.join(context), CONTEXT_TOKENS, model_name)[0][2] if context else ""
+    return project_context, _pack(sections, section_tokens, model_name)
+
+
+def trim_plan(plan, max_tokens, model_name="gpt-4"):
+    """`plan` cut to its first lines within `max_tokens`, marked as trimmed; unchanged when it fits."""
+    tokens = count_tokens(plan, model_name)
+    if tokens <= max_tokens:
+        return plan
+    marker = "\n[… plan trimmed to fit the merge budget]"
+    budget = max(max_tokens - count_tokens(marker, model_name), 1)
+    trimmed = chunk_lines(plan, budget, model_name)[0][2]
+    # A single line over the budget is cut by characters
+    while count_tokens(trimmed, model_name) > budget and len(trimmed) > 1:
+        trimmed = trimmed[:len(trimmed) * budget // count_tokens(trimmed, model_name) or 1]
+    return trimmed + marker
+
+
+def merge_groups(section_plans, merge_tokens=DEFAULT_MERGE_TOKENS, model_name="gpt-4"):
+    """Split [(title, plan)] into consecutive groups that fit `merge_tokens` together.
+
+    A plan over half of `merge_tokens` is first trimmed to that share (see
+    trim_plan), so any two plans fit one call: every group but a trailing
+    single one holds at least two plans and each round of merges shrinks the
+    list without a call going over the budget.
+    """
+    share = merge_tokens // 2
+    groups = []
+    size = 0
+    for title, plan in section_plans:
+        plan = trim_plan(plan, share, model_name)
+        tokens = count_tokens(plan, model_name)
+        if groups and size + tokens <= merge_tokens:
+            groups[-1].append((title, plan))
+            size += tokens
+        else:
+            groups.append([(title, plan)])
+            size = tokens
+    return groups
+
+
+def group_title(group):
+    """'Core Features' or 'Core Features … Security' for a merged group of section plans."""
+    if len(group) == 1:
+        return group[0][0]
+    return f"{group[0][0].split(' … ')[0]} … {group[-1][0].split(' … ')[-1]}"
@@ -0,0 +1,268 @@
+import argparse
+import glob
+import json
+import math
+import os
+import sys
+from prompts import (
+    build_planning_messages,
+    build_section_planning_messages,
+    build_plan_merge_messages,
+    build_analysis_messages,
+    build_coding_messages,
+    build_component_test_messages,
+    test_types_to_generate
+)
+from component_plan import default_components, parse_component_manifest
+from requirements_digest import condense, DIGEST_FORMAT
+from planning_sections import (
+    split_requirements, needs_sections, merge_groups, group_title, DEFAULT_SECTION_TOKENS, DEFAULT_MERGE_TOKENS
+)
+from testing_plan import test_targets, test_file_path, import_path
+from trajectory import trajectory_path
+from utils import count_tokens, estimate_cost, extract_frontend_planning
+
+parser = argparse.ArgumentParser(description="Predict tokens, cost and wall time of a pipeline run without calling the model.")
+
+parser.add_argument('--project_name', type=str, required=True)
+parser.add_argument('--gpt_version', type=str, default="o3-mini")
+parser.add_argument('--requirements_format', type=str, default="markdown", choices=["markdown", "json", "text"])
+parser.add_argument('--requirements_path', type=str, required=True)
+parser.add_argument('--raw_requirements', action='store_true', help="Predict planning on the raw requirements, as 1_planning.py --raw_requirements")
+parser.add_argument('--planning_mode', type=str, default="auto", choices=["auto", "single", "sections"])
+parser.add_argument('--section_tokens', type=int, default=DEFAULT_SECTION_TOKENS)
+parser.add_argument('--merge_tokens', type=int, default=DEFAULT_MERGE_TOKENS, help="Largest total of section plans merged in one call")
+parser.add_argument('--analysis_dir', type=str, default="",
+                    help="Output dir of an earlier 2_analyzing.py run; its component manifest sets the coding and testing calls")
+parser.add_argument('--include_testing', action='store_true', help="Include the optional testing stage")
+parser.add_argument('--test_gpt_version', type=str, default="gpt-4")
+parser.add_argument('--test_types', type=str, default="unit,integration")
+parser.add_argument('--test_framework', type=str, default="jest", choices=["jest", "vitest"])
+parser.add_argument('--coverage_threshold', type=int, default=80)
+parser.add_argument('--include_accessibility', type=bool, default=True)
+parser.add_argument('--concurrency', type=int, default=1, help="Model calls in flight at once within a stage")
+parser.add_argument('--history_dir', type=str, default="", help="Previous run outputs used to estimate response sizes")
+parser.add_argument('--output_tokens_per_second', type=float, default=50.0)
+parser.add_argument('--seconds_per_call', type=float, default=2.0, help="Fixed per-call latency (queueing, prefill)")
+parser.add_argument('--max_cost', type=float, default=0.0, help="Abort (exit 2) if predicted cost exceeds this many USD")
+parser.add_argument('--output_file', type=str, default="")
+
+# max_tokens each stage requests; responses are assumed to use this fraction when there is no history
+STAGE_MAX_TOKENS = {"planning": 4000, "analysis": 6000, "coding": 3000, "testing": 2000}
+DEFAULT_OUTPUT_FRACTION = 0.6
+
+# Response files each stage leaves behind, used as output-size history
+STAGE_RESPONSE_GLOBS = {
+    "planning": "planning_response.md",
+    "analysis": "analysis_response.md",
+    "coding": "coding_*_response.md",
+}
+
+
+def load_requirements(requirements_path, requirements_format):
+    """(raw text, digest) of the requirements; the stages send the digest."""
+    with open(requirements_path, encoding='utf-8') as f:
+        raw_text = f.read()
+    return raw_text, condense(raw_text, requirements_format)
+
+
+def estimate_output_tokens(history_dir, model_name):
+    """Mean response tokens per stage from previous runs, falling back to a share of max_tokens."""
+    estimates = {}
+    sources = {}
+    for stage, max_tokens in STAGE_MAX_TOKENS.items():
+        samples = []
+        pattern = STAGE_RESPONSE_GLOBS.get(stage)
+        if history_dir and pattern:
+            for path in glob.glob(os.path.join(history_dir, "**", pattern), recursive=True):
+                with open(path, encoding='utf-8', errors='replace') as f:
+                    samples.append(min(count_tokens(f.read(), model_name), max_tokens))
+        if samples:
+            estimates[stage] = int(sum(samples) / len(samples))
+            sources[stage] = f"history ({len(samples)} responses)"
+        else:
+            estimates[stage] = int(max_tokens * DEFAULT_OUTPUT_FRACTION)
+            sources[stage] = f"default ({DEFAULT_OUTPUT_FRACTION:.0%} of max_tokens)"
+    return estimates, sources
+
+
+def analysis_components(analysis_dir):
+    """Components from the manifest of an earlier analysis (its trajectory or analysis_response.md), or None."""
+    if not analysis_dir:
+        return None
+    texts = []
+    path = trajectory_path(analysis_dir, "analysis")
+    if os.path.exists(path):
+        texts.extend(reversed(extract_frontend_planning(path)))
+    response_path = os.path.join(analysis_dir, "analysis_response.md")
+    if os.path.exists(response_path):
+        with open(response_path, encoding='utf-8', errors='replace') as f:
+            texts.append(f.read())
+    for text in texts:
+        components = parse_component_manifest(text)
+        if components:
+            return components
+    return None
+
+
+def placeholder_plan(tokens, model_name):
+    """Stand-in section plan of about `tokens` tokens, for sizing merge calls before any plan exists."""
+    line = "- Component: placeholder section plan item\n"
+    per_line = max(count_tokens(line * 100, model_name) / 100, 1)
+    return line * max(int(tokens / per_line), 1)
+
+
+def stage_calls(args, requirements, output_tokens, components):
+    """Yield (stage, label, model, messages, upstream_tokens) for every call the pipeline would make.
+
+    Upstream responses don't exist yet, so prompts that embed them are built
+    without that context and `upstream_tokens` carries its predicted size.
+    Merge rounds are grouped by merge_groups over stand-in plans of the
+    predicted plan size, as 1_planning.py groups the real ones.
+    """
+    raw_text, digest = requirements
+    planning_format, planning_content = DIGEST_FORMAT, digest
+    if args.raw_requirements:
+        planning_format, planning_content = args.requirements_format, raw_text
+    if args.planning_mode == "sections" or args.planning_mode == "auto" and \
+            needs_sections(planning_content, args.section_tokens, args.gpt_version):
+        # One call per section, then a merge call over all the section plans
+        project_context, sections = split_requirements(planning_content, args.section_tokens, args.gpt_version)
+        for section in sections:
+            yield ("planning", f"section:{section.title}", args.gpt_version,
+                   build_section_planning_messages(args.project_name, planning_format, project_context,
+                                                   section.title, section.content), 0)
+        if len(sections) > 1:
+            plans = [(section.title, placeholder_plan(output_tokens["planning"], args.gpt_version))
+                     for section in sections]
+            while True:
+                groups = merge_groups(plans, args.merge_tokens, args.gpt_version)
+                if len(groups) == 1:
+                    break
+                merged = []
+                for group in groups:
+                    if len(group) > 1:
+                        yield ("planning", f"merge:{group_title(group)}", args.gpt_version,
+                               build_plan_merge_messages(args.project_name, project_context, group), 0)
+                        group = [(group_title(group), placeholder_plan(output_tokens["planning"], args.gpt_version))]
+                    merged.append(group[0])
+                plans = merged
+            yield ("planning", "merge", args.gpt_version,
+                   build_plan_merge_messages(args.project_name, project_context, groups[0]), 0)
+    else:
+        yield ("planning", "plan", args.gpt_version,
+               build_planning_messages(args.project_name, planning_format, planning_content), 0)
+
+    yield ("analysis", "analysis", args.gpt_version,
+           build_analysis_messages(args.project_name, DIGEST_FORMAT, digest, ""),
+           output_tokens["planning"])
+
+    for component in components:
+        yield ("coding", component['name'], args.gpt_version,
+               build_coding_messages(args.project_name, component, digest, ""),
+               output_tokens["analysis"])
+
+    if args.include_testing:
+        paths = {c['name']: c['path'] for c in components}
+        project_structure = {
+            "components": [c['path'] for c in components if c['path'].startswith("src/components/")],
+            "pages": [c['path'] for c in components if c['path'].startswith("src/pages/")],
+            "hooks": [],
+            "utils": [],
+            "src_structure": [c['path'] for c in components],
+            "dependencies": {c['path']: [paths[name] for name in c['depends_on'] if name in paths] for c in components},
+        }
+        # One call per (file, test type); the file's source is the coding output, not known yet
+        for test_type in test_types_to_generate(args.test_types, args.include_accessibility):
+            for target in test_targets(project_structure, test_type):
+                test_path = test_file_path(target, test_type)
+                yield ("testing", f"{test_type}:{target}", args.test_gpt_version,
+                       build_component_test_messages(args.project_name, test_type, target, "", "", test_path,
+                                                     import_path(test_path, target), args.test_framework,
+                                                     args.coverage_threshold, args.include_accessibility),
+                       output_tokens["coding"])
+
+
+def predict(args):
+    requirements = load_requirements(args.requirements_path, args.requirements_format)
+    output_tokens, sources = estimate_output_tokens(args.history_dir, args.gpt_version)
+    components = analysis_components(args.analysis_dir)
+    if components is None:
+        components = default_components()
+        component_source = "defaults, approximate"
+    else:
+        component_source = "analysis manifest"
+
+    stages = {}
+    for stage, label, model_name, messages, upstream_tokens in stage_calls(args, requirements, output_tokens, components):
+        prompt_tokens = sum(count_tokens(m['content'], model_name) for m in messages) + upstream_tokens
+        completion_tokens = output_tokens[stage]
+        call = {
+            "label": label,
+            "model": model_name,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cost": estimate_cost(model_name, prompt_tokens, completion_tokens),
+            "seconds": args.seconds_per_call + completion_tokens / args.output_tokens_per_second,
+        }
+        stages.setdefault(stage, []).append(call)
+
+    summary = {}
+    for stage, calls in stages.items():
+        # Calls within a stage run in waves of `concurrency`; stages run one after another
+        waves = math.ceil(len(calls) / max(args.concurrency, 1))
+        slowest = max(call["seconds"] for call in calls)
+        summary[stage] = {
+            "calls": len(calls),
+            "prompt_tokens": sum(call["prompt_tokens"] for call in calls),
+            "completion_tokens": sum(call["completion_tokens"] for call in calls),
+            "cost": sum(call["cost"] for call in calls),
+            "seconds": waves * slowest,
+            "output_estimate": sources[stage],
+        }
+    totals = {
+        key: sum(stage[key] for stage in summary.values())
+        for key in ("calls", "prompt_tokens", "completion_tokens", "cost", "seconds")
+    }
+    return {"stages": summary, "calls": stages, "total": totals,
+            "components": {"count": len(components), "source": component_source}}
+
+
+def print_prediction(prediction, args):
+    print(f"🧮 Dry run for: {args.project_name} ({args.gpt_version}, concurrency {args.concurrency})")
+    components = prediction["components"]
+    print(f"🧩 Coding and testing sized for {components['count']} components ({components['source']})")
+    print("=" * 60)
+    print(f"{'stage':<10} {'calls':>5} {'prompt tok':>11} {'output tok':>11} {'cost $':>9} {'time s':>8}")
+    for stage, info in prediction["stages"].items():
+        print(f"{stage:<10} {info['calls']:>5} {info['prompt_tokens']:>11} {info['completion_tokens']:>11} "
+              f"{info['cost']:>9.4f} {info['seconds']:>8.0f}   output: {info['output_estimate']}")
+    total = prediction["total"]
+    print("-" * 60)
+    print(f"{'total':<10} {total['calls']:>5} {total['prompt_tokens']:>11} {total['completion_tokens']:>11} "
+          f"{total['cost']:>9.4f} {total['seconds']:>8.0f}")
+    if components['source'] != "analysis manifest":
+        print(f"⚠️ Approximate: no analysis output under --analysis_dir, so coding and testing assume the "
+              f"{components['count']} default components; the real count comes from the analysis manifest")
+
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    if not os.path.exists(args.requirements_path):
+        print(f"❌ Error: Requirements file not found: {args.requirements_path}")
+        sys.exit(1)
+
+    prediction = predict(args)
+    print_prediction(prediction, args)
+
+    if args.output_file:
+        with open(args.output_file, 'w') as f:
+            json.dump(prediction, f, indent=2)
+        print(f"📁 Prediction saved to: {args.output_file}")
+
+    if args.max_cost and prediction["total"]["cost"] > args.max_cost:
+        print(f"\n❌ Predicted cost ${prediction['total']['cost']:.4f} exceeds --max_cost ${args.max_cost:.4f}; aborting before any model call")
+        sys.exit(2)
+
+    print(f"\n💰 Predicted cost: ${prediction['total']['cost']:.4f}")
@@ -0,0 +1,467 @@
+"""Import-graph index of a generated React project.
+
+`ProjectIndex` walks `src/` once, extracts the imports and exports of every
+TS/TSX/JS/JSX file with a small tokenizer (no Node toolchain needed) and
+builds the local dependency graph. Every file is also classified by role
+(component, page, hook, util, type, test, app or entry) from its path and
+name, so files outside the usual folders are still found. Results are cached
+in `<project>/.frontend-gen/index.json`; on the next scan a file is only
+re-read when its mtime or size changed, and only re-parsed when its content
+hash changed, so rescans cost one stat per file.
+
+    index = ProjectIndex(project_path).scan()
+    index.dependencies("src/App.tsx")      # local files App imports
+    index.importers("src/components/Header.tsx")
+    index.subgraphs()                      # independent groups of files
+    index.packages()                       # npm packages -> importing files
+    index.roles()["hook"]                  # files classified as hooks
+"""
+import hashlib
+import json
+import os
+import re
+
+from tracing import traced
+
+SOURCE_EXTENSIONS = ('.tsx', '.ts', '.jsx', '.js')
+INDEX_VERSION = 2
+DEFAULT_CACHE_DIR = ".frontend-gen"
+SKIP_DIRS = {"node_modules", "build", "dist", "coverage"}
+ROLES = ("app", "entry", "component", "page", "hook", "util", "type", "test")
+
+_PAGE_DIRS = {"pages", "views", "screens", "routes"}
+_HOOK_DIRS = {"hooks"}
+_TYPE_DIRS = {"types", "interfaces", "models"}
+_COMPONENT_DIRS = {"components", "layouts", "containers"}
+_HOOK_NAME = re.compile(r'use[A-Z]')
+
+_TOKEN = re.compile(r"""
+    (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<string>'(?:\\.|[^'\\\n])*'|"(?:\\.|[^"\\\n])*")
+  | (?P<template>`(?:\\.|[^`\\])*`)
+  | (?P<ident>[A-Za-z_$][\w$]*)
+  | (?P<punct>[{}()\[\];,*=.])
+""", re.VERBOSE | re.DOTALL)
+
+_DECLARATION_KEYWORDS = {"function", "class", "const", "let", "var", "interface", "type", "enum"}
+_DECLARATION_MODIFIERS = {"async", "abstract", "declare"}
+_STATEMENT_STARTS = {"import", "export"}
+
+
+def scan_module(text):
+    """Extract imports and exports from TS/JS source.
+
+    Returns {"imports": [{"source", "names", "default", "namespace",
+    "type_only", "dynamic"}], "exports": [names], "default_export": name,
+    "default" or None}. Re-exports (`export ... from`) appear in both lists.
+    """
+    tokens = [(m.lastgroup, m.group()) for m in _TOKEN.finditer(text) if m.lastgroup != 'comment']
+    imports = []
+    exports = []
+    default_export = None
+    n = len(tokens)
+    i = 0
+    while i < n:
+        kind, value = tokens[i]
+        if kind != 'ident':
+            i += 1
+            continue
+        if value in ("require", "import") and _at(tokens, i + 1) == ('punct', '(') and _kind(tokens, i + 2) == 'string':
+            imports.append(_import_record(tokens[i + 2][1], dynamic=True))
+            i += 3
+        elif value == "import":
+            i = _parse_import(tokens, i + 1, imports)
+        elif value == "export":
+            i, default_name = _parse_export(tokens, i + 1, imports, exports)
+            if default_name is not None:
+                default_export = default_name
+        else:
+            i += 1
+    return {"imports": imports, "exports": exports, "default_export": default_export}
+
+
+def _at(tokens, i):
+    return tokens[i] if i < len(tokens) else (None, None)
+
+
+def _kind(tokens, i):
+    return tokens[i][0] if i < len(tokens) else None
+
+
+def _unquote(token):
+    return token[1:-1]
+
+
+def _import_record(source, names=None, default=None, namespace=None, type_only=False, dynamic=False):
+    return {
+        "source": _unquote(source),
+        "names": names or [],
+        "default": default,
+        "namespace": namespace,
+        "type_only": type_only,
+        "dynamic": dynamic,
+    }
+
+
+def _parse_names(tokens, i):
+    """Parse `{ a, b as c, type d }` starting after '{'; returns ([(name, alias)], index after '}')."""
+    names = []
+    n = len(tokens)
+    while i < n and tokens[i] != ('punct', '}'):
+        kind, value = tokens[i]
+        if kind == 'ident' and value == "as" and names and _kind(tokens, i + 1) == 'ident':
+            names[-1] = (names[-1][0], tokens[i + 1][1])
+            i += 2
+            continue
+        # `type` marks a type-only specifier unless it is the binding itself
+        if kind == 'ident' and not (value == "type" and _kind(tokens, i + 1) == 'ident'):
+            names.append((value, value))
+        i += 1
+    return names, i + 1
+
+
+def _parse_import(tokens, i, imports):
+    if _kind(tokens, i) == 'string':
+        imports.append(_import_record(tokens[i][1]))
+        return i + 1
+    type_only = False
+    if tokens[i:i + 1] == [('ident', 'type')] and _at(tokens, i + 1) not in (('ident', 'from'), ('punct', ',')):
+        type_only = True
+        i += 1
+    default = namespace = None
+    names = []
+    n = len(tokens)
+    while i < n:
+        kind, value = tokens[i]
+        if kind == 'ident' and value == "from":
+            if _kind(tokens, i + 1) == 'string':
+                imports.append(_import_record(tokens[i + 1][1], names, default, namespace, type_only))
+                return i + 2
+            return i + 1
+        if value == ';' or (kind == 'ident' and value in _STATEMENT_STARTS):
+            return i
+        if value == '{':
+            specifiers, i = _parse_names(tokens, i + 1)
+            names = [name for name, _ in specifiers]
+            continue
+        if value == '*' and _at(tokens, i + 1) == ('ident', 'as') and _kind(tokens, i + 2) == 'ident':
+            namespace = tokens[i + 2][1]
+            i += 3
+            continue
+        if kind == 'ident':
+            default = value
+        i += 1
+    return i
+
+
+def _parse_export(tokens, i, imports, exports):
+    """Parse the statement after `export`; returns (next index, default export name or None)."""
+    kind, value = _at(tokens, i)
+    if value == "default":
+        j = i + 1
+        while _at(tokens, j)[1] in _DECLARATION_MODIFIERS:
+            j += 1
+        kind, value = _at(tokens, j)
+        if value in ("function", "class") and _kind(tokens, j + 1) == 'ident':
+            return j + 2, tokens[j + 1][1]
+        if kind != 'ident' or value in ("function", "class"):
+            return j, "default"
+        if _at(tokens, j + 1)[1] not in ('(', '.'):
+            return j + 1, value
+        # Wrapped component: React.memo(Header), connect(mapState)(Header), ...
+        for k in range(j + 1, min(j + 12, len(tokens) - 2)):
+            if tokens[k] == ('punct', '(') and _kind(tokens, k + 1) == 'ident' and tokens[k + 2] == ('punct', ')') \
+                    and tokens[k + 1][1][:1].isupper():
+                return k + 3, tokens[k + 1][1]
+        return j + 1, "default"
+
+    if value == "type" and _at(tokens, i + 1) == ('punct', '{'):
+        i += 1
+        value = '{'
+    if value == '{':
+        specifiers, j = _parse_names(tokens, i + 1)
+        if _at(tokens, j) == ('ident', 'from') and _kind(tokens, j + 1) == 'string':
+            imports.append(_import_record(tokens[j + 1][1], [name for name, _ in specifiers]))
+            j += 2
+        exports.extend(alias for _, alias in specifiers)
+        return j, None
+    if value == '*':
+        j = i + 1
+        if _at(tokens, j) == ('ident', 'as') and _kind(tokens, j + 1) == 'ident':
+            exports.append(tokens[j + 1][1])
+            j += 2
+        else:
+            exports.append('*')
+        if _at(tokens, j) == ('ident', 'from') and _kind(tokens, j + 1) == 'string':
+            imports.append(_import_record(tokens[j + 1][1]))
+            j += 2
+        return j, None
+
+    j = i
+    while _at(tokens, j)[1] in _DECLARATION_MODIFIERS:
+        j += 1
+    kind, value = _at(tokens, j)
+    if value in _DECLARATION_KEYWORDS and _kind(tokens, j + 1) == 'ident':
+        exports.append(tokens[j + 1][1])
+        return j + 2, None
+    return j, None
+
+
+def package_name(source):
+    """npm package an import specifier refers to ('@mui/material/Button' -> '@mui/material')."""
+    parts = source.split('/')
+    if source.startswith('@') and len(parts) > 1:
+        return '/'.join(parts[:2])
+    return parts[0]
+
+
+def is_local_import(source):
+    return source.startswith(('.', '/', 'src/', '@/', '~/'))
+
+
+def imported_packages(records):
+    """npm packages imported by {path: scan_module record} -> sorted list of importing files."""
+    packages = {}
+    for path, record in records.items():
+        for item in record["imports"]:
+            if not is_local_import(item["source"]):
+                packages.setdefault(package_name(item["source"]), set()).add(path)
+    return {name: sorted(paths) for name, paths in sorted(packages.items())}
+
+
+def file_role(path):
+    """Role of a source file under src/, from its folders and file name."""
+    directory, filename = os.path.split(path)
+    folders = set(directory.split('/')[1:])
+    stem, extension = os.path.splitext(filename)
+    if "__tests__" in folders or stem.endswith(('.test', '.spec')) or stem == "setupTests":
+        return "test"
+    if directory == "src" and stem in ("index", "main"):
+        return "entry"
+    if directory == "src" and stem == "App":
+        return "app"
+    if folders & _TYPE_DIRS or stem.endswith('.types') or stem == "types":
+        return "type"
+    if folders & _HOOK_DIRS or _HOOK_NAME.match(stem):
+        return "hook"
+    # Barrels, constants and helpers next to components are plain modules
+    if extension not in ('.tsx', '.jsx'):
+        return "util"
+    if folders & _PAGE_DIRS or stem.endswith("Page"):
+        return "page"
+    if folders & _COMPONENT_DIRS or stem[:1].isupper():
+        return "component"
+    return "util"
+
+
+def _file_digest(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+class ProjectIndex:
+    """Cached import/export index and dependency graph of `<project>/src`."""
+
+    def __init__(self, project_path, cache_path=None):
+        self.project_path = project_path
+        self.cache_path = cache_path or os.path.join(project_path, DEFAULT_CACHE_DIR, "index.json")
+        self.files = {}        # relative path -> {mtime_ns, size, sha1, role, imports, exports, default_export}
+        self.assets = set()    # other files under src/, for resolving style and asset imports
+        self.rescanned = []    # files parsed by the last scan()
+        self.removed = []      # files dropped by the last scan()
+        self._graph = {}
+        self._reverse = {}
+        self._sources = None   # {path: text} for an in-memory project
+
+    @classmethod
+    def from_sources(cls, sources):
+        """Index an in-memory project ({path: text}); nothing is read from or written to disk."""
+        index = cls("", cache_path="")
+        index._sources = dict(sources)
+        for path, text in index._sources.items():
+            if not path.startswith("src/"):
+                continue
+            if path.endswith(SOURCE_EXTENSIONS) and not path.endswith('.d.ts'):
+                record = scan_module(text)
+                record["sha1"] = _file_digest(text.encode('utf-8'))
+                record["role"] = file_role(path)
+                index.files[path] = record
+            else:
+                index.assets.add(path)
+        index._build_graph()
+        return index
+
+    @traced("project_index.scan", attrs=lambda result, self: {"files": len(self.files), "rescanned": len(self.rescanned)})
+    def scan(self):
+        """Refresh the index from disk; only new or modified files are parsed."""
+        cached = self._load_cache()
+        files = {}
+        self.assets = set()
+        self.rescanned = []
+        # Set when any record changes, including a touched file whose content did not
+        dirty = False
+        for relative_path, entry in self._walk():
+            stat = entry.stat()
+            previous = cached.get(relative_path)
+            if previous and previous["mtime_ns"] == stat.st_mtime_ns and previous["size"] == stat.st_size:
+                files[relative_path] = previous
+                continue
+            with open(entry.path, 'rb') as f:
+                data = f.read()
+            digest = _file_digest(data)
+            if previous and previous["sha1"] == digest:
+                record = dict(previous)
+            else:
+                record = scan_module(data.decode('utf-8', errors='replace'))
+                record["sha1"] = digest
+                record["role"] = file_role(relative_path)
+                self.rescanned.append(relative_path)
+            record["mtime_ns"] = stat.st_mtime_ns
+            record["size"] = stat.st_size
+            files[relative_path] = record
+            dirty = True
+        self.removed = sorted(set(cached) - set(files))
+        self.files = files
+        self._build_graph()
+        if dirty or self.removed:
+            self._save_cache()
+        return self
+
+    def _walk(self):
+        """Yield (relative path, DirEntry) for source files under src/, collecting other files as assets."""
+        src_dir = os.path.join(self.project_path, "src")
+        if not os.path.isdir(src_dir):
+            return
+        stack = [src_dir]
+        while stack:
+            directory = stack.pop()
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in SKIP_DIRS and not entry.name.startswith('.'):
+                            stack.append(entry.path)
+                        continue
+                    relative_path = os.path.relpath(entry.path, self.project_path).replace(os.sep, '/')
+                    if entry.name.endswith(SOURCE_EXTENSIONS) and not entry.name.endswith('.d.ts'):
+                        yield relative_path, entry
+                    else:
+                        self.assets.add(relative_path)
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_path) as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if cache.get("version") != INDEX_VERSION:
+            return {}
+        return cache.get("files", {})
+
+    def _save_cache(self):
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            with open(self.cache_path, 'w') as f:
+                json.dump({"version": INDEX_VERSION, "files": self.files}, f)
+        except OSError as e:
+            print(f"⚠️ Could not write project index cache: {str(e)}")
+
+    def resolve(self, source, importer):
+        """Project-relative path a local import refers to, or None (packages, unresolved files)."""
+        if source.startswith(('@/', '~/')):
+            base = "src/" + source[2:]
+        elif source.startswith('src/'):
+            base = source
+        elif source.startswith('.'):
+            base = os.path.normpath(os.path.join(os.path.dirname(importer), source)).replace(os.sep, '/')
+        else:
+            return None
+        candidates = [base] + [base + ext for ext in SOURCE_EXTENSIONS] + [f"{base}/index{ext}" for ext in SOURCE_EXTENSIONS]
+        for candidate in candidates:
+            if candidate in self.files or candidate in self.assets:
+                return candidate
+        return None
+
+    def _build_graph(self):
+        self._graph = {}
+        self._reverse = {path: set() for path in self.files}
+        for path, record in self.files.items():
+            dependencies = []
+            for item in record["imports"]:
+                target = self.resolve(item["source"], path)
+                if target in self.files and target != path and target not in dependencies:
+                    dependencies.append(target)
+                    self._reverse[target].add(path)
+            self._graph[path] = dependencies
+
+    def dependencies(self, path):
+        """Local source files `path` imports directly."""
+        return list(self._graph.get(path, []))
+
+    def importers(self, path):
+        """Local source files that import `path` directly."""
+        return sorted(self._reverse.get(path, ()))
+
+    def closure(self, paths, reverse=False):
+        """`paths` plus everything they (transitively) import, or that imports them when reverse=True."""
+        edges = self._reverse if reverse else self._graph
+        seen = set()
+        stack = list(paths)
+        while stack:
+            path = stack.pop()
+            if path in seen:
+                continue
+            seen.add(path)
+            stack.extend(edges.get(path, ()))
+        return seen
+
+    def subgraphs(self):
+        """Weakly connected groups of source files, largest first; each can be processed independently."""
+        groups = []
+        seen = set()
+        for path in sorted(self.files):
+            if path in seen:
+                continue
+            group = set()
+            stack = [path]
+            while stack:
+                current = stack.pop()
+                if current in group:
+                    continue
+                group.add(current)
+                stack.extend(self._graph.get(current, ()))
+                stack.extend(self._reverse.get(current, ()))
+            seen |= group
+            groups.append(sorted(group))
+        return sorted(groups, key=len, reverse=True)
+
+    def roles(self):
+        """Role -> sorted source files with that role (every role in ROLES is present)."""
+        roles = {role: [] for role in ROLES}
+        for path in sorted(self.files):
+            roles[self.files[path]["role"]].append(path)
+        return roles
+
+    def packages(self):
+        """npm packages imported anywhere in src/ -> sorted list of importing files."""
+        return imported_packages(self.files)
+
+    def structure(self):
+        """Source files by role and the local dependencies of every source file, as the testing prompts use them."""
+        roles = self.roles()
+        source_files = sorted(self.files)
+        return {
+            "components": roles["component"],
+            "pages": roles["page"],
+            "hooks": roles["hook"],
+            "utils": roles["util"],
+            "types": roles["type"],
+            "tests": roles["test"],
+            "src_structure": source_files,
+            # Local imports of every source file, for grouping tests by dependency subgraph
+            "dependencies": {path: self.dependencies(path) for path in source_files}
+        }
+
+    def read(self, path):
+        if self._sources is not None:
+            return self._sources[path]
+        with open(os.path.join(self.project_path, path), encoding='utf-8', errors='replace') as f:
+            return f.read()
@@ -0,0 +1,254 @@
+"""Write-if-changed, atomic writer for the generated project.
+
+Every file is first written to a staging directory inside the project's
+`.frontend-gen/` folder (same filesystem, so the final `os.replace` is an
+atomic rename) and only moved into place when its content differs from what
+is already on disk. Unchanged files keep their mtime, so dev servers, file
+watchers and the cached ProjectIndex see only real changes on a rerun, and a
+crash never leaves a half-written file behind.
+
+A manifest (`.frontend-gen/manifest.json`) records the sha1, size and mtime
+of every file written, so the next run can tell a file is unchanged from its
+stat alone instead of reading it back.
+
+`ArchiveWriter` has the same interface but streams every file straight into
+a tar.gz or zip (a path or a binary stream such as stdout) without creating
+the project directory; its manifest becomes the archive's last entry.
+
+Both writers apply the same policy to a path written more than once in a
+run (see `PathClaims`): the first version wins, and a different later one
+is reported as a conflict instead of replacing it.
+"""
+import hashlib
+import io
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+
+from project_index import DEFAULT_CACHE_DIR
+from tracing import span
+
+MANIFEST_VERSION = 1
+
+
+class PathClaims:
+    """Which writer (a component name, or None) produced each path in this run.
+
+    The first write of a path wins. Writing the same content again is a
+    no-op, and a later write with different content is not applied and is
+    recorded in `conflicts` and passed to `report`. Callers hold their own
+    lock around `claim()`.
+    """
+
+    def __init__(self, report=print):
+        self.owners = {}
+        self.conflicts = []
+        self.report = report
+
+    def claim(self, path, digest, owner=None):
+        """True if this is the first write of `path`, so it should go ahead."""
+        first = self.owners.get(path)
+        if first is None:
+            self.owners[path] = (owner, digest)
+            return True
+        if first[1] != digest:
+            self.conflicts.append({"path": path, "kept": first[0], "rejected": owner})
+            self.report(f"⚠️ {path}: {owner or 'a later write'} produced a different version, keeping the one from "
+                  f"{first[0] or 'the first write'}")
+        return False
+
+
+class ProjectWriter:
+    """Stage, compare and atomically publish files under `project_path`.
+
+    `write()` is safe to call from several threads; call `finish()` once at
+    the end to save the manifest and remove the staging directory.
+    """
+
+    def __init__(self, project_path, manifest_path=None):
+        self.project_path = project_path
+        self.state_dir = os.path.join(project_path, DEFAULT_CACHE_DIR)
+        self.manifest_path = manifest_path or os.path.join(self.state_dir, "manifest.json")
+        self.previous = self._load_manifest()
+        self.files = {}
+        self.written = []
+        self.unchanged = []
+        self.claims = PathClaims()
+        self._staging_dir = None
+        self._lock = threading.Lock()
+
+    def write(self, path, content, owner=None):
+        """Publish `content` at `path` (relative to the project) unless it is already there.
+
+        Returns True if the file was written, False if it was unchanged or
+        `path` was already written in this run (see PathClaims).
+        """
+        path = path.replace('\\', '/')
+        data = content.encode('utf-8')
+        digest = hashlib.sha1(data).hexdigest()
+        target = os.path.join(self.project_path, path)
+        with self._lock:
+            if not self.claims.claim(path, digest, owner):
+                return False
+
+        with span("project_write", path=path, bytes=len(data)) as write_span:
+            changed = self._current_digest(path, target) != digest
+            if changed:
+                staged = self._stage(data)
+                os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+                os.replace(staged, target)
+            write_span.set(changed=changed)
+
+        stat = os.stat(target)
+        with self._lock:
+            self.files[path] = {"sha1": digest, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            (self.written if changed else self.unchanged).append(path)
+        return changed
+
+    def stale(self):
+        """Files recorded by the previous run that this run did not write."""
+        return sorted(path for path in self.previous if path not in self.files)
+
+    def finish(self, metadata=None):
+        """Save the manifest, clean up staging and return a summary of the run."""
+        manifest = dict(self.files)
+        # Files from earlier runs that still exist keep their entry
+        for path in self.stale():
+            if os.path.exists(os.path.join(self.project_path, path)):
+                manifest[path] = self.previous[path]
+        os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+        temp_path = f"{self.manifest_path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump({"version": MANIFEST_VERSION, "metadata": metadata or {}, "files": dict(sorted(manifest.items()))}, f, indent=2)
+        os.replace(temp_path, self.manifest_path)
+        if self._staging_dir:
+            shutil.rmtree(self._staging_dir, ignore_errors=True)
+            self._staging_dir = None
+        return {
+            "written": sorted(self.written),
+            "unchanged": sorted(self.unchanged),
+            "stale": self.stale(),
+            "conflicts": self.claims.conflicts,
+        }
+
+    def _current_digest(self, path, target):
+        try:
+            stat = os.stat(target)
+        except FileNotFoundError:
+            return None
+        previous = self.previous.get(path)
+        if previous and previous["size"] == stat.st_size and previous["mtime_ns"] == stat.st_mtime_ns:
+            return previous["sha1"]
+        with open(target, 'rb') as f:
+            return hashlib.sha1(f.read()).hexdigest()
+
+    def _stage(self, data):
+        with self._lock:
+            if self._staging_dir is None:
+                os.makedirs(self.state_dir, exist_ok=True)
+                self._staging_dir = tempfile.mkdtemp(prefix="staging-", dir=self.state_dir)
+        fd, staged = tempfile.mkstemp(dir=self._staging_dir)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        return staged
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        if manifest.get("version") != MANIFEST_VERSION:
+            return {}
+        return manifest.get("files", {})
+
+
+class ArchiveWriter:
+    """Stream project files into a tar.gz or zip archive instead of a directory.
+
+    Entries are stored under `root/` (the project folder name). Written
+    sources are kept in `sources` so package.json can be derived from their
+    imports without a directory to scan.
+    """
+
+    def __init__(self, destination, root, archive_format=None):
+        self.root = root
+        self.archive_format = archive_format or ("zip" if str(destination).endswith(".zip") else "tar.gz")
+        if isinstance(destination, (str, os.PathLike)):
+            directory = os.path.dirname(os.fspath(destination))
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._stream = open(destination, 'wb')
+            self._owns_stream = True
+        else:
+            self._stream = destination
+            self._owns_stream = False
+        if self.archive_format == "zip":
+            self._archive = zipfile.ZipFile(self._stream, 'w', compression=zipfile.ZIP_DEFLATED)
+        else:
+            # "w|gz" writes sequentially, so a pipe or stdout works
+            self._archive = tarfile.open(fileobj=self._stream, mode='w|gz')
+        self.files = {}
+        self.sources = {}
+        self.written = []
+        self.claims = PathClaims()
+        self._lock = threading.Lock()
+
+    def write(self, path, content, owner=None):
+        """Add `path` to the archive; False if it was already written in this run (see PathClaims)."""
+        path = path.replace('\\', '/')
+        data = content.encode('utf-8')
+        digest = hashlib.sha1(data).hexdigest()
+        with self._lock:
+            if not self.claims.claim(path, digest, owner):
+                return False
+            with span("archive_write", path=path, bytes=len(data)):
+                self._add(f"{self.root}/{path}", data)
+            self.files[path] = {"sha1": digest, "size": len(data)}
+            self.sources[path] = content
+            self.written.append(path)
+        return True
+
+    def stale(self):
+        return []
+
+    def finish(self, metadata=None):
+        """Add the manifest entry, close the archive and return a summary of the run."""
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "metadata": metadata or {},
+            "files": dict(sorted(self.files.items())),
+        }
+        with self._lock:
+            self._add(f"{self.root}/{DEFAULT_CACHE_DIR}/manifest.json", json.dumps(manifest, indent=2).encode('utf-8'))
+            self._archive.close()
+            if self._owns_stream:
+                self._stream.close()
+            else:
+                self._stream.flush()
+        return {
+            "written": sorted(self.written),
+            "unchanged": [],
+            "stale": [],
+            "conflicts": self.claims.conflicts,
+        }
+
+    def _add(self, name, data):
+        if self.archive_format == "zip":
+            info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = 0o644 << 16
+            self._archive.writestr(info, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            info.mode = 0o644
+            self._archive.addfile(info, io.BytesIO(data))
@@ -0,0 +1,490 @@
+"""Prompt templates shared by the stage scripts.
+
+Each builder returns the chat messages a stage sends to the model, so the
+OpenAI scripts, the vLLM scripts (via to_chat_prompt) and preflight.py all
+use exactly the same text.
+"""
+from utils import PROJECT_FOLDERS
+
+
+def to_chat_prompt(messages):
+    """Render chat messages in the <|im_start|> format used by the vLLM scripts"""
+    prompt = ""
+    for message in messages:
+        prompt += f"<|im_start|>{message['role']}\n{message['content']}<|im_end|>\n"
+    return prompt + "<|im_start|>assistant\n"
+
+
+def _planning_system_prompt(requirements_format):
+    return f"""You are an expert frontend architect and React developer with deep understanding of modern web development practices and user experience design.
+
+You will receive project requirements in {requirements_format} format.
+Your task is to create a detailed and efficient plan to build a React frontend application that meets all the specified requirements.
+
+This plan should include:
+1. Component architecture and hierarchy
+2. State management strategy
+3. Routing structure
+4. UI/UX considerations
+5. Technology stack selection
+6. Development approach
+
+Instructions:
+
+1. Align with Requirements: Your plan must strictly follow the features, user stories, and technical specifications described in the requirements.
+2. React Best Practices: Use modern React patterns, hooks, and functional components.
+3. Component Design: Plan for reusable, maintainable, and testable components.
+4. State Management: Choose appropriate state management (useState, useContext, Redux, Zustand) based on complexity.
+5. Responsive Design: Ensure mobile-first responsive design approach.
+6. Accessibility: Consider WCAG guidelines and semantic HTML.
+7. Performance: Plan for code splitting, lazy loading, and optimization.
+8. Testing Strategy: Include unit tests and integration tests planning.
+
+Format your response as a detailed implementation plan with clear sections and actionable steps."""
+
+
+def build_planning_messages(project_name, requirements_format, requirements_content):
+    """Planning stage: system + user messages"""
+    return [
+        {'role': "system", "content": _planning_system_prompt(requirements_format)},
+        
+        {'role': "user", "content": f"""Project Name: {project_name}
+
+Requirements:
+{requirements_content}
+
+Please create a comprehensive frontend development plan for this React application."""}
+    ]
+
+
+def build_section_planning_messages(project_name, requirements_format, project_context, section_title, section_content):
+    """Planning stage (map): plan one section of a large specification
+
+    `project_context` (title and overview) is shared by every section prompt.
+    """
+    system_prompt = _planning_system_prompt(requirements_format) + """
+
+The specification is too large to plan at once, so each of its sections is planned separately and the section plans are merged afterwards. Plan only the section you are given, and name shared components (layout, navigation, common UI), routes and state stores by what they do so the merge can recognise them across sections."""
+
+    return [
+        {'role': "system", "content": system_prompt},
+        {'role': "user", "content": f"""Project Name: {project_name}
+
+Project context:
+{project_context}
+
+Section to plan: {section_title}
+{section_content}
+
+Please create the frontend development plan for this section."""}
+    ]
+
+
+def build_plan_merge_messages(project_name, project_context, section_plans):
+    """Planning stage (reduce): merge [(section title, plan)] into one plan"""
+    system_prompt = _planning_system_prompt("markdown") + """
+
+You receive plans written separately for sections of one specification. Merge them into a single plan for the whole application: define each shared component once in one component hierarchy, give every page one route with no conflicting paths, reconcile the state stores into one state management design, and pick one technology stack. Keep every feature the section plans cover."""
+
+    plans = "\n\n".join(f"### Plan for: {title}\n{plan.strip()}" for title, plan in section_plans)
+    return [
+        {'role': "system", "content": system_prompt},
+        {'role': "user", "content": f"""Project Name: {project_name}
+
+Project context:
+{project_context}
+
+Section plans:
+
+{plans}
+
+Please merge these into one comprehensive frontend development plan for this React application."""}
+    ]
+
+
+def build_analysis_messages(project_name, requirements_format, requirements_content, planning_context):
+    """Analysis stage: system + user messages built on the planning output"""
+    return [
+        {'role': "system", "content": f"""You are an expert frontend architect, UX/UI designer, and React developer with deep understanding of component design patterns, state management, and modern web development practices.
+
+You will receive project requirements in {requirements_format} format along with the planning output from the previous stage.
+Your task is to create detailed technical analysis and component specifications for the React frontend application.
+
+This analysis should include:
+
+1. **Component Breakdown**: Detailed specification of each React component with:
+   - Props interface (TypeScript)
+   - State requirements
+   - Event handlers
+   - Styling approach
+   - Accessibility considerations
+
+2. **State Management Design**: 
+   - Global state structure
+   - Local component state
+   - Data flow patterns
+   - API integration points
+
+3. **Routing Architecture**:
+   - Route definitions
+   - Protected routes
+   - Navigation structure
+   - URL parameters
+
+4. **UI/UX Specifications**:
+   - Layout system
+   - Responsive breakpoints
+   - Color scheme and theming
+   - Typography scale
+   - Animation and transitions
+
+5. **Data Models**:
+   - TypeScript interfaces
+   - API response types
+   - Form validation schemas
+
+6. **Integration Requirements**:
+   - External APIs
+   - Authentication flow
+   - Error handling
+   - Loading states
+
+Format your response as detailed technical specifications that can be directly implemented by developers.
+
+End your response with a machine-readable manifest of every component to implement, wrapped in [CONTENT] and [/CONTENT]:
+[CONTENT]
+{{
+  "components": [
+    {{"name": "Header", "type": "component", "path": "src/components/Header.tsx", "description": "Application header with navigation", "depends_on": ["UserMenu"]}}
+  ]
+}}
+[/CONTENT]
+"type" is one of main, layout, page, component, hook or util; "depends_on" lists the other manifest components this one renders or imports."""},
+        
+        {'role': "user", "content": f"""Project Name: {project_name}
+
+Original Requirements:
+{requirements_content}
+
+Planning Output:
+{planning_context or "No planning context available"}
+
+Please provide detailed technical analysis and component specifications for this React frontend application."""}
+    ]
+
+
+def build_coding_messages(project_name, component, requirements_content, analysis_context, dependency_context=None):
+    """Coding stage: system + user messages for a single component
+
+    `dependency_context` holds the exported signatures of already generated
+    components this one depends on.
+    """
+    dependency_section = f"""
+
+Already Generated Dependencies (import these, do not redefine them):
+{dependency_context}""" if dependency_context else ""
+    return [
+        {'role': "system", "content": f"""You are an expert React developer and TypeScript specialist with deep knowledge of modern frontend development practices, component architecture, and code quality.
+
+You will receive project requirements and technical analysis to generate high-quality React components.
+
+Your task is to generate production-ready React component code that:
+
+1. **Modern React Patterns**:
+   - Functional components with hooks
+   - TypeScript with proper type definitions
+   - Clean, readable, and maintainable code
+
+2. **Code Quality**:
+   - Proper error handling
+   - Loading states
+   - Accessibility (ARIA labels, semantic HTML)
+   - Performance optimizations (useMemo, useCallback when needed)
+
+3. **Styling**:
+   - Use CSS modules or styled-components
+   - Responsive design
+   - Modern CSS practices
+
+4. **Component Structure**:
+   - Clear props interface
+   - Proper component composition
+   - Reusable and testable
+
+5. **Best Practices**:
+   - ESLint and Prettier compliant
+   - Consistent naming conventions
+   - Clear comments for complex logic
+
+Generate ONLY the code for {component['name']} ({component['type']}), plus its own CSS module, types file or hook when it needs one.
+Include all necessary imports, types, and styling.
+Make sure the code is complete and ready to use.
+
+Format your response as one fenced code block per file, with the file's path after the language tag:
+```tsx {component['path']}
+// component code
+```
+```css Header.module.css
+/* styles next to the component */
+```
+```ts types/header.ts
+// shared types
+```
+Paths without a folder go next to the component; other paths must be inside {', '.join(PROJECT_FOLDERS)}."""},
+        
+        {'role': "user", "content": f"""Project Name: {project_name}
+
+Component to Generate: {component['name']} ({component['type']})
+Description: {component['description']}
+File Path: {component['path']}
+
+Original Requirements:
+{requirements_content}
+
+Technical Analysis:
+{analysis_context or "No analysis context available"}{dependency_section}
+
+Generate the complete React component code for {component['name']}."""}
+    ]
+
+
+def test_types_to_generate(test_types, include_accessibility):
+    """Test types the testing stage will request, in prompt order"""
+    test_type_list = [t.strip() for t in test_types.split(',')]
+    selected = [t for t in ('unit', 'integration', 'e2e') if t in test_type_list]
+    if 'accessibility' in test_type_list or include_accessibility:
+        selected.append('accessibility')
+    return selected
+
+
+def _test_system_prompt(test_type, test_framework, coverage_threshold, include_accessibility):
+    base_system_prompt = f"""You are an expert React testing engineer specializing in comprehensive test suite generation using {test_framework}, React Testing Library, and modern testing practices.
+
+You will generate high-quality, production-ready tests for one file of a React application based on:
+1. The source of the file under test
+2. The exported types of the local modules it imports
+3. Specific test type requirements
+
+Your tests should follow these principles:
+- Use modern testing patterns and best practices
+- Include proper setup and teardown
+- Test both happy paths and edge cases
+- Include accessibility testing where applicable
+- Provide clear, descriptive test names
+- Include proper mocking for external dependencies
+- Achieve high code coverage while maintaining meaningful tests
+
+Testing Framework: {test_framework}
+Coverage Threshold: {coverage_threshold}%
+Accessibility Testing: {'Enabled' if include_accessibility else 'Disabled'}
+"""
+
+    system_prompt = base_system_prompt
+    if test_type == 'e2e':
+        system_prompt += "\n\nSpecialize in end-to-end testing using Playwright or Cypress for complete user journey validation."
+    elif test_type == 'accessibility':
+        system_prompt += "\n\nSpecialize in accessibility testing using jest-axe and manual accessibility validation."
+    return system_prompt
+
+
+def build_component_test_messages(project_name, test_type, target, source, dependency_signatures, test_path,
+                                  import_path, test_framework, coverage_threshold, include_accessibility,
+                                  uncovered_exports=()):
+    """Testing stage: system + user messages for the tests of one source file
+
+    `uncovered_exports` narrows the tests to exports no existing test covers.
+    """
+    system_prompt = _test_system_prompt(test_type, test_framework, coverage_threshold, include_accessibility)
+    focus = ""
+    if uncovered_exports:
+        names = ", ".join("the default export" if name == "default" else name for name in uncovered_exports)
+        focus = f"\nExisting tests already cover the rest of this file; test only {names}."
+
+    user_content = f"""Project: {project_name}
+
+File under test: {target}
+```tsx
+{source}
+```
+
+Types and exports of the local modules it imports:
+{dependency_signatures or "None"}
+
+Write {test_type} tests for {target} only, as a single fenced code block labelled with its path: ```tsx {test_path}
+Import the module under test from '{import_path}'. Use {test_framework} and React Testing Library, and only props, exports and behaviour that appear in the source above.{focus}"""
+
+    return [
+        {'role': "system", 'content': system_prompt},
+        {'role': "user", 'content': user_content}
+    ]
+
+
+def build_test_repair_messages(test_messages, response, errors, test_path):
+    """Testing stage: follow-up turn asking to fix a generated test that failed validation"""
+    problems = "\n".join(f"- {error}" for error in errors)
+    return test_messages + [
+        {'role': "assistant", 'content': response},
+        {'role': "user", 'content': f"""The test file has these problems:
+{problems}
+
+Return the corrected test as a single fenced code block labelled with its path: ```tsx {test_path}
+Only import files and names that exist in the project."""}
+    ]
+
+
+def _review_system_prompt(review_focus):
+    focus_areas = [area.strip() for area in review_focus.split(',')]
+    
+    system_prompt = """You are an expert React code reviewer with deep knowledge of modern JavaScript/TypeScript, React best practices, performance optimization, accessibility standards, and security considerations.
+
+Provide a comprehensive code review focusing on the specified areas. For each issue found, provide:
+1. Severity level (Critical, High, Medium, Low)
+2. Clear description of the issue
+3. Specific line references where applicable
+4. Actionable recommendations for improvement
+5. Code examples showing the fix
+
+Focus areas for this review:
+"""
+    
+    for area in focus_areas:
+        if area == 'performance':
+            system_prompt += "\n- **Performance**: Bundle size, rendering efficiency, memory usage, lazy loading"
+        elif area == 'accessibility':
+            system_prompt += "\n- **Accessibility**: WCAG compliance, ARIA labels, keyboard navigation, screen readers"
+        elif area == 'security':
+            system_prompt += "\n- **Security**: XSS prevention, data validation, secure API calls, dependency vulnerabilities"
+        elif area == 'maintainability':
+            system_prompt += "\n- **Maintainability**: Code organization, naming conventions, documentation, reusability"
+        elif area == 'testing':
+            system_prompt += "\n- **Testing**: Test coverage, testability, mocking strategies, edge cases"
+    return system_prompt
+
+
+_REVIEW_REPORT_SECTIONS = """Provide detailed feedback organized by:
+1. Critical Issues (must fix)
+2. Performance Improvements
+3. Accessibility Enhancements
+4. Security Considerations
+5. Best Practices & Maintainability
+6. Overall Recommendations
+
+For each finding, include:
+- Severity level
+- File location
+- Issue description
+- Recommended solution
+- Code example (if applicable)
+"""
+
+
+def build_review_messages(code_files, review_focus):
+    """Review stage: system + user messages reviewing all files in one prompt (small projects)"""
+    system_prompt = _review_system_prompt(review_focus)
+    
+    # Create file content summary
+    files_summary = "\n\n## Code Files to Review:\n"
+    for file_path, content in code_files.items():
+        lines_count = len(content.split('\n'))
+        files_summary += f"\n### {file_path} ({lines_count} lines)\n```typescript\n{content}\n```\n"
+    
+    user_prompt = f"""Please conduct a comprehensive code review of this React application.
+
+{files_summary}
+
+{_REVIEW_REPORT_SECTIONS}"""
+    
+    return [
+        {'role': 'system', 'content': system_prompt},
+        {'role': 'user', 'content': user_prompt}
+    ]
+
+
+def build_file_review_messages(label, numbered_code, review_focus, static_findings=None):
+    """Review stage (map): system + user messages for one file or one chunk of a file
+
+    `numbered_code` carries the file's line numbers so findings can cite them;
+    `static_findings` is the perf_lint summary for the code, which the model
+    should not report again ("" when the lint found nothing, None when it did
+    not run).
+    """
+    system_prompt = _review_system_prompt(review_focus) + """
+
+You are reviewing one file (or one part of a large file) of the application; the other files are reviewed separately."""
+
+    static_section = ""
+    if static_findings:
+        static_section = f"""
+Already found by static analysis (do not repeat these):
+{static_findings}
+"""
+    elif static_findings is not None:
+        static_section = """
+Static analysis found no missing keys, inline props on memo components, whole-library imports, hooks without dependency arrays or unvirtualized lists in this code.
+"""
+
+    user_prompt = f"""File: {label}
+```typescript
+{numbered_code}
+```
+{static_section}
+List every issue in this code as a markdown bullet in the form:
+- **Severity** `path:line` - issue. Recommended fix (with a short code example when it helps).
+
+Order the bullets from most to least severe. If there are no issues, reply exactly: No issues found."""
+
+    return [
+        {'role': 'system', 'content': system_prompt},
+        {'role': 'user', 'content': user_prompt}
+    ]
+
+
+def build_file_summary_review_messages(label, interface, review_focus, static_findings):
+    """Review stage (map): a file the static lint fully covers, sent as its lint summary instead of its code
+
+    `interface` is the file's exported signatures; `static_findings` is the
+    perf_lint summary ("" when the lint found nothing).
+    """
+    system_prompt = _review_system_prompt(review_focus) + """
+
+You are reviewing one file (or one part of a large file) of the application; the other files are reviewed separately. Static analysis covers the requested focus areas for this file, so you get its findings and the file's exported interface instead of its source."""
+
+    user_prompt = f"""File: {label}
+Exported interface:
+```typescript
+{interface or "(no exports)"}
+```
+
+Static analysis findings:
+{static_findings or "None: no missing keys, inline props on memo components, whole-library imports, hooks without dependency arrays or unvirtualized lists."}
+
+For each finding, give its recommended fix (with a short code example when it helps) as a markdown bullet in the form:
+- **Severity** `path:line` - fix.
+
+Do not restate the findings themselves. If there are no findings, reply exactly: No issues found."""
+
+    return [
+        {'role': 'system', 'content': system_prompt},
+        {'role': 'user', 'content': user_prompt}
+    ]
+
+
+def build_review_reduce_messages(file_findings, review_focus):
+    """Review stage (reduce): merge per-file findings ({label: findings}) into one ranked report"""
+    system_prompt = _review_system_prompt(review_focus) + """
+
+You receive the findings of separate per-file reviews of one application. Merge them into a single report: drop duplicates, group issues that share a root cause across files, and rank everything by severity and impact."""
+
+    findings = "\n\n".join(f"### {label}\n{text.strip()}" for label, text in file_findings.items())
+    user_prompt = f"""Per-file review findings:
+
+{findings}
+
+Merge these into one code review report for the whole application.
+
+{_REVIEW_REPORT_SECTIONS}"""
+
+    return [
+        {'role': 'system', 'content': system_prompt},
+        {'role': 'user', 'content': user_prompt}
+    ]
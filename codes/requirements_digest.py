@@ -0,0 +1,290 @@
+"""Condensed requirements digest shared by every stage.
+
+Each stage used to interpolate the raw requirements file into its prompts (a
+Python dict repr for JSON requirements), which for the larger example specs
+is the biggest part of every call. The digest keeps the content and drops
+what the model does not need:
+
+- markdown is parsed into a section tree; emphasis markers, decorative emoji,
+  rules, comments, images and link targets are removed, lines repeated within
+  the same section are dropped (a bullet under another heading is kept: the
+  Signup page's "Email field" is not the Login page's), empty and
+  table-of-contents sections are pruned, box-drawing trees become indented lists, and the tree
+  is written back one line per item with no blank lines
+- JSON is written as an indented `key: value` outline instead of a dict repr
+- plain text gets the same line clean-up
+
+The digest is cached in `<output_dir>/.frontend-gen/requirements_digest.json`
+keyed on the hash of the source, so the stages of one run (and later runs on
+the same file) condense it once. Planning can still take the raw file with
+`--raw_requirements`.
+"""
+import hashlib
+import json
+import os
+import re
+
+from project_index import DEFAULT_CACHE_DIR
+
+DIGEST_VERSION = 2
+CACHE_FILE = "requirements_digest.json"
+# Entries kept in the cache file, most recent last
+MAX_CACHE_ENTRIES = 16
+# Format label the prompts see for a digest ("You will receive project requirements in ... format")
+DIGEST_FORMAT = "condensed markdown"
+
+_HEADING = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+_FENCE = re.compile(r'^\s*(```|~~~)')
+_RULE = re.compile(r'^\s*([-*_])(\s*\1){2,}\s*$')
+_HTML_COMMENT = re.compile(r'<!--.*?-->', re.DOTALL)
+_IMAGE = re.compile(r'!\[[^\]]*\]\([^)]*\)')
+_LINK = re.compile(r'\[([^\]]+)\]\([^)]*\)')
+_EMPHASIS = re.compile(r'(\*\*|__)(.+?)\1')
+_BULLET = re.compile(r'^(\s*)([-*+]|\d+[.)])\s+')
+# Decorative emoji leading a heading or list item (✅, ⏳, 🚀, ...)
+_EMOJI = re.compile('^(?:[⌚-⏿☀-➿⬀-⯿\U0001f000-\U0001faff]\ufe0f?\\s*)+')
+_TREE_LINE = re.compile(r'^((?:│\s{3}|\s{4})*)[├└]──\s?(.*)$')
+_COMPACT_LANGUAGES = {"ts", "typescript", "tsx", "js", "javascript", "jsx", "json"}
+_TOC_TITLES = {"table of contents", "contents", "toc"}
+
+
+def _normalized(line):
+    return re.sub(r'\W+', ' ', line.lower()).strip()
+
+
+def parse_sections(text):
+    """Markdown as a section tree: {"title", "level", "body": [lines], "children": [sections]}.
+
+    The root has level 0 and no title; fenced code stays in the body verbatim.
+    """
+    root = {"title": "", "level": 0, "body": [], "children": []}
+    stack = [root]
+    in_fence = False
+    for line in _HTML_COMMENT.sub('', text).split('\n'):
+        if _FENCE.match(line):
+            in_fence = not in_fence
+        elif not in_fence:
+            heading = _HEADING.match(line)
+            if heading:
+                level = len(heading.group(1))
+                while stack[-1]["level"] >= level:
+                    stack.pop()
+                section = {"title": heading.group(2), "level": level, "body": [], "children": []}
+                stack[-1]["children"].append(section)
+                stack.append(section)
+                continue
+        stack[-1]["body"].append(line)
+    return root
+
+
+def _clean_line(line):
+    """Markdown line without emphasis, emoji, images or link targets; '' for boilerplate."""
+    if _RULE.match(line):
+        return ''
+    line = _IMAGE.sub('', line)
+    line = _LINK.sub(r'\1', line)
+    line = _EMPHASIS.sub(r'\2', line)
+    bullet = _BULLET.match(line)
+    if bullet:
+        marker = '-' if bullet.group(2) in '-*+' else bullet.group(2)
+        prefix = f"{bullet.group(1).expandtabs(4)}{marker} "
+        line = prefix + _EMOJI.sub('', line[bullet.end():])
+    else:
+        line = _EMOJI.sub('', line)
+    return line.rstrip() if line.strip(' -') else ''
+
+
+def _compact_code(lines):
+    """Code lines with every bracketed block joined onto one line ('interface User { id: string; ... }')."""
+    result = []
+    depth = 0
+    for line in lines:
+        text = line.strip()
+        if not text:
+            continue
+        if depth > 0 and result:
+            result[-1] += ' ' + text
+        else:
+            result.append(text)
+        depth = max(depth + text.count('{') + text.count('[') - text.count('}') - text.count(']'), 0)
+    return result
+
+
+def _tree_lines(lines):
+    """Box-drawing trees ('├── Dashboard') as indented lists; other lines unchanged."""
+    result = []
+    for line in lines:
+        tree = _TREE_LINE.match(line)
+        if tree:
+            line = '  ' * (len(tree.group(1)) // 4) + '- ' + tree.group(2)
+        if line.strip():
+            result.append(line.rstrip())
+    return result
+
+
+def _condense_body(lines):
+    """Cleaned body lines; prose and bullets repeated within the body are dropped."""
+    result = []
+    seen = set()
+    code = None
+    for line in lines:
+        if _FENCE.match(line):
+            if code is None:
+                language = _FENCE.sub('', line).strip().lower()
+                code = []
+            else:
+                result.extend(_compact_code(code) if language in _COMPACT_LANGUAGES else _tree_lines(code))
+                code = None
+            result.append(line.strip())
+            continue
+        if code is not None:
+            code.append(line)
+            continue
+        line = _clean_line(line)
+        key = _normalized(line)
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        result.append(line)
+    if code is not None:
+        result.extend(_tree_lines(code))
+    return result
+
+
+def _condense_section(section):
+    """Serialized lines of a section and its children; [] when nothing is left."""
+    if _normalized(section["title"]) in _TOC_TITLES:
+        return []
+    body = _condense_body(section["body"])
+    children = [line for child in section["children"] for line in _condense_section(child)]
+    if not body and not children:
+        return []
+    heading = []
+    if section["level"]:
+        title = _EMOJI.sub('', _EMPHASIS.sub(r'\2', section["title"])).strip().rstrip(':')
+        heading = [f"{'#' * section['level']} {title}"]
+    return heading + body + children
+
+
+def condense_markdown(text):
+    """Digest of a markdown (or plain text) requirements document."""
+    return '\n'.join(_condense_section(parse_sections(text)))
+
+
+def _scalar(value):
+    if isinstance(value, str):
+        return ' '.join(value.split())
+    return json.dumps(value)
+
+
+def _outline(value, indent, lines):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if isinstance(item, dict) and item or \
+                    isinstance(item, list) and any(isinstance(v, (dict, list)) for v in item):
+                lines.append(f"{indent}{key}:")
+                _outline(item, indent + "  ", lines)
+            elif isinstance(item, list):
+                # A list of scalars fits on one line
+                items = list(dict.fromkeys(_scalar(v) for v in item))
+                lines.append(f"{indent}{key}: {'; '.join(items)}")
+            else:
+                lines.append(f"{indent}{key}: {_scalar(item)}")
+    elif isinstance(value, list):
+        seen = set()
+        for item in value:
+            if isinstance(item, (dict, list)):
+                nested = []
+                _outline(item, indent + "  ", nested)
+                if nested:
+                    nested[0] = f"{indent}- {nested[0].lstrip()}"
+                lines.extend(nested)
+            elif _scalar(item) not in seen:
+                seen.add(_scalar(item))
+                lines.append(f"{indent}- {_scalar(item)}")
+    else:
+        lines.append(f"{indent}{_scalar(value)}")
+
+
+def condense_json(data):
+    """Digest of JSON requirements: top-level keys become sections, the rest an indented outline."""
+    if not isinstance(data, dict):
+        lines = []
+        _outline(data, "", lines)
+        return '\n'.join(lines)
+    lines = []
+    for key, value in data.items():
+        if isinstance(value, (dict, list)):
+            lines.append(f"## {key}")
+            _outline(value, "", lines)
+        else:
+            lines.append(f"{key}: {_scalar(value)}")
+    return '\n'.join(lines)
+
+
+def condense(raw_text, requirements_format):
+    """Digest of the raw requirements text; JSON that does not parse is condensed as text."""
+    if requirements_format == "json":
+        try:
+            return condense_json(json.loads(raw_text))
+        except ValueError as e:
+            print(f"⚠️ Requirements are not valid JSON ({str(e)}), condensing them as text")
+    return condense_markdown(raw_text)
+
+
+def source_hash(raw_text, requirements_format):
+    return hashlib.sha256(f"{DIGEST_VERSION}\0{requirements_format}\0{raw_text}".encode('utf-8')).hexdigest()
+
+
+def requirements_digest(raw_text, requirements_format, cache_path=None):
+    """(digest, cached): the digest of `raw_text`, read from or added to the cache at `cache_path`."""
+    key = source_hash(raw_text, requirements_format)
+    entries = _load_cache(cache_path)
+    if key in entries:
+        return entries[key], True
+    digest = condense(raw_text, requirements_format)
+    if cache_path:
+        entries[key] = digest
+        _save_cache(cache_path, dict(list(entries.items())[-MAX_CACHE_ENTRIES:]))
+    return digest, False
+
+
+def load_stage_requirements(requirements_path, requirements_format, output_dir="", raw=False):
+    """(requirements text, format label) for a stage's prompts.
+
+    The digest by default; with raw=True the file as it is, in its own format.
+    """
+    with open(requirements_path, encoding='utf-8') as f:
+        raw_text = f.read()
+    if raw:
+        print(f"📋 Requirements: raw {requirements_format} ({len(raw_text):,} chars)")
+        return raw_text, requirements_format
+    cache_path = os.path.join(output_dir, DEFAULT_CACHE_DIR, CACHE_FILE)
+    digest, cached = requirements_digest(raw_text, requirements_format, cache_path)
+    print(f"📋 Requirements digest: {len(raw_text):,} → {len(digest):,} chars"
+          f"{' (cached)' if cached else ''}")
+    return digest, DIGEST_FORMAT
+
+
+def _load_cache(cache_path):
+    if not cache_path:
+        return {}
+    try:
+        with open(cache_path, encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if cache.get("version") != DIGEST_VERSION:
+        return {}
+    return cache.get("entries", {})
+
+
+def _save_cache(cache_path, entries):
+    try:
+        os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+        temp_path = f"{cache_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({"version": DIGEST_VERSION, "entries": entries}, f, ensure_ascii=False)
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        print(f"⚠️ Could not write requirements digest cache: {str(e)}")
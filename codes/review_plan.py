@@ -0,0 +1,282 @@
+"""Per-file review jobs and the map-reduce code review shared by code_review.py and FrontendGenerator.
+
+The review used to pack every file into one prompt, cut to its first 1000
+characters. Instead, each source file is reviewed on its own, whole, and a
+file larger than the token budget is split at line boundaries into chunks
+that are reviewed separately. The jobs are independent, so they run
+concurrently and the map phase takes as long as the slowest file; one reduce
+call then merges and ranks their findings.
+
+`ReviewCache` keeps each job's findings keyed on the model, the review focus
+and the hash of the reviewed code, together with the public interface of the
+files it imports. On a rerun only changed files, and files whose imports
+changed their interface, are reviewed again.
+
+`review_files` (map) and `merge_findings` (reduce) take the model call as a
+`complete(messages, max_tokens, **span_attrs)` function returning the text,
+so the script and the in-process API run the same review.
+"""
+import hashlib
+import json
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from component_plan import exported_signatures
+from perf_lint import format_findings, lint_covers
+from prompts import build_file_review_messages, build_file_summary_review_messages, build_review_reduce_messages
+from tracing import span, submit
+from utils import count_tokens
+
+# `part`/`parts` number the chunks of one file; lines are 1-based and inclusive
+ReviewJob = namedtuple("ReviewJob", ["path", "part", "parts", "start_line", "end_line", "total_lines", "content"])
+
+DEFAULT_CHUNK_TOKENS = 6000
+CACHE_VERSION = 1
+# A file with nothing to report answers with exactly this
+NO_ISSUES = "No issues found."
+
+
+def chunk_lines(content, chunk_tokens, model_name="gpt-4"):
+    """Split `content` into (start_line, end_line, text) chunks of at most `chunk_tokens` tokens.
+
+    A single line longer than the budget becomes a chunk of its own.
+    """
+    lines = content.split('\n')
+    if count_tokens(content, model_name) <= chunk_tokens:
+        return [(1, len(lines), content)]
+    chunks = []
+    start = 0
+    size = 0
+    for number, line in enumerate(lines):
+        line_tokens = count_tokens(line, model_name) + 1
+        if size and size + line_tokens > chunk_tokens:
+            chunks.append((start + 1, number, '\n'.join(lines[start:number])))
+            start = number
+            size = 0
+        size += line_tokens
+    chunks.append((start + 1, len(lines), '\n'.join(lines[start:])))
+    return chunks
+
+
+def plan_review_jobs(code_files, chunk_tokens=DEFAULT_CHUNK_TOKENS, model_name="gpt-4"):
+    """One ReviewJob per file, or per chunk of a file over `chunk_tokens`, largest first."""
+    jobs = []
+    for path, content in code_files.items():
+        chunks = chunk_lines(content, chunk_tokens, model_name)
+        total_lines = len(content.split('\n'))
+        for part, (start_line, end_line, text) in enumerate(chunks, 1):
+            jobs.append(ReviewJob(path, part, len(chunks), start_line, end_line, total_lines, text))
+    # Start the slowest calls first so they overlap with the rest
+    return sorted(jobs, key=lambda job: len(job.content), reverse=True)
+
+
+def job_label(job):
+    """'src/App.tsx' or 'src/App.tsx (lines 1-240, part 1/3)'."""
+    if job.parts == 1:
+        return job.path
+    return f"{job.path} (lines {job.start_line}-{job.end_line}, part {job.part}/{job.parts})"
+
+
+def numbered(job):
+    """The job's code with file line numbers, so findings can cite lines."""
+    width = len(str(job.end_line))
+    return '\n'.join(f"{number:>{width}} | {line}"
+                     for number, line in enumerate(job.content.split('\n'), job.start_line))
+
+
+def interface_hash(code):
+    """Hash of a module's exported signatures; unchanged when only its internals change."""
+    return hashlib.sha1(exported_signatures(code).encode('utf-8')).hexdigest()
+
+
+def dependency_interfaces(index, path, interfaces):
+    """{dependency: interface hash} for the local files `path` imports; `interfaces` memoizes hashes."""
+    result = {}
+    for dependency in index.dependencies(path):
+        if dependency not in interfaces:
+            interfaces[dependency] = interface_hash(index.read(dependency))
+        result[dependency] = interfaces[dependency]
+    return result
+
+
+def static_findings_for(job, lint):
+    """The lint findings that fall inside the job's lines, as a compact summary."""
+    return format_findings([finding for finding in lint.get(job.path, [])
+                            if job.start_line <= finding.line <= job.end_line])
+
+
+def with_static(model_findings, static_findings):
+    """A job's findings: the static lint summary followed by the model's own findings."""
+    if not static_findings:
+        return model_findings
+    if model_findings.strip() == NO_ISSUES:
+        return static_findings
+    return f"{static_findings}\n{model_findings.strip()}"
+
+
+def review_files(code_files, index, cache, lint, complete, review_focus, chunk_tokens=DEFAULT_CHUNK_TOKENS,
+                 model_name="gpt-4", max_workers=8, log=print):
+    """Map: review every file (or chunk) concurrently.
+
+    Returns ({label: findings} in file order, number of files with every
+    job reviewed).
+
+    Jobs whose code and imported interfaces are unchanged since a previous
+    run with the same model and focus are answered from `cache`. Every other
+    job goes to the model with its static lint summary: with its code, or
+    with only its exported interface when the lint covers every focus area
+    for it (see perf_lint.lint_covers). Jobs whose review failed are left out.
+    """
+    jobs = plan_review_jobs(code_files, chunk_tokens, model_name)
+    findings = {}
+    job_interfaces = {}
+    interfaces = {}
+    pending = []
+    for job in jobs:
+        job_interfaces[job] = dependency_interfaces(index, job.path, interfaces)
+        cached, status = cache.lookup(job, job_interfaces[job])
+        if cached is not None:
+            findings[job] = cached
+            continue
+        if status == "interface":
+            log(f"🔁 {job_label(job)}: a file it imports changed its interface")
+        pending.append(job)
+
+    skipped = len({job.path for job in jobs} - {job.path for job in pending})
+    log(f"♻️ {skipped} of {len(code_files)} files skipped (review cache hits)")
+    focus_areas = [area.strip() for area in review_focus.split(',') if area.strip()]
+    summary_only = {job for job in pending if lint_covers(job.content, focus_areas)}
+    log(f"🗂️ {len(pending)} review jobs, {len(summary_only)} sent as their lint summary (up to {max_workers} concurrent calls)")
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(pending) or 1)) as executor:
+        futures = {}
+        for job in pending:
+            with span("build_prompt", stage="review", file=job.path, part=job.part):
+                if job in summary_only:
+                    messages = build_file_summary_review_messages(job_label(job), exported_signatures(job.content),
+                                                                  review_focus, static_findings_for(job, lint))
+                else:
+                    messages = build_file_review_messages(job_label(job), numbered(job), review_focus,
+                                                          static_findings_for(job, lint))
+            futures[submit(executor, complete, messages, 1500, file=job.path, part=job.part)] = job
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                findings[job] = future.result()
+            except Exception as e:
+                log(f"❌ Review of {job_label(job)} failed: {str(e)}")
+                continue
+            cache.store(job, job_interfaces[job], findings[job])
+            log(f"✅ Reviewed {job_label(job)}")
+    ordered = sorted(findings, key=lambda job: (job.path, job.part))
+    reviewed_files = len({job.path for job in jobs} - {job.path for job in jobs if job not in findings})
+    return {job_label(job): with_static(findings[job], static_findings_for(job, lint)) for job in ordered}, reviewed_files
+
+
+def merge_findings(file_findings, cache, reviewed_files, complete, review_focus, log=print):
+    """Reduce: merge and rank the per-file findings in one call; returns the report.
+
+    Files with nothing to report are left out of the call, no call is made
+    when every file is clean, and the report is reused from `cache` when no
+    findings changed. A failed call raises.
+    """
+    with_issues = {label: text for label, text in file_findings.items() if text.strip() != NO_ISSUES}
+    if not with_issues:
+        return f"{NO_ISSUES} ({reviewed_files} files reviewed)"
+    report = cache.lookup_report(with_issues)
+    if report is not None:
+        log("♻️ Findings unchanged, merged report reused from the review cache")
+        return report
+    with span("build_prompt", stage="review", phase="reduce"):
+        reduce_msg = build_review_reduce_messages(with_issues, review_focus)
+    report = complete(reduce_msg, 6000, phase="reduce")
+    cache.store_report(with_issues, report)
+    return report
+
+
+class ReviewCache:
+    """Per-job review findings from earlier runs, stored as JSON at `path` (in memory if path is None).
+
+    An entry is reused only when the job's code, the model and the focus are
+    the same and every file the job imports still has the same interface.
+    """
+
+    def __init__(self, path, model_name, review_focus):
+        self.path = path
+        self.model_name = model_name
+        self.focus = ",".join(sorted(area.strip() for area in review_focus.split(',') if area.strip()))
+        self.entries = self._load()
+        self.used = set()
+        self.hits = 0
+
+    def _key(self, *parts):
+        return hashlib.sha256("\0".join([self.model_name, self.focus, *map(str, parts)]).encode('utf-8')).hexdigest()
+
+    def job_key(self, job):
+        content_hash = hashlib.sha1(job.content.encode('utf-8')).hexdigest()
+        return self._key(job.path, job.start_line, content_hash)
+
+    def lookup(self, job, interfaces):
+        """(findings, status): status is "hit", "changed" (new or edited code) or "interface"
+        (same code, but a file it imports changed its exports)."""
+        key = self.job_key(job)
+        entry = self.entries.get(key)
+        if entry is None:
+            return None, "changed"
+        if entry["interfaces"] != interfaces:
+            return None, "interface"
+        self.used.add(key)
+        self.hits += 1
+        return entry["findings"], "hit"
+
+    def store(self, job, interfaces, findings):
+        key = self.job_key(job)
+        self.entries[key] = {"path": job.path, "model": self.model_name, "focus": self.focus,
+                             "interfaces": interfaces, "findings": findings}
+        self.used.add(key)
+
+    def lookup_report(self, file_findings):
+        """The merged report from a run whose per-file findings were exactly these, or None."""
+        key = self._report_key(file_findings)
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        self.used.add(key)
+        return entry["findings"]
+
+    def store_report(self, file_findings, report):
+        key = self._report_key(file_findings)
+        self.entries[key] = {"path": None, "model": self.model_name, "focus": self.focus, "findings": report}
+        self.used.add(key)
+
+    def _report_key(self, file_findings):
+        return self._key("report", json.dumps(file_findings, sort_keys=True))
+
+    def save(self):
+        """Write the cache, dropping this model and focus's entries that the run did not use."""
+        self.entries = {
+            key: entry for key, entry in self.entries.items()
+            if key in self.used or (entry["model"], entry["focus"]) != (self.model_name, self.focus)
+        }
+        if self.path is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump({"version": CACHE_VERSION, "entries": self.entries}, f)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"⚠️ Could not write review cache: {str(e)}")
+
+    def _load(self):
+        if self.path is None:
+            return {}
+        try:
+            with open(self.path) as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if cache.get("version") != CACHE_VERSION:
+            return {}
+        return cache.get("entries", {})
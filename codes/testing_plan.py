@@ -0,0 +1,245 @@
+"""Focused test jobs for the testing stage.
+
+Instead of one prompt per test type that only lists file paths, the testing
+stage generates one test file per (source file, test type). Each prompt gets
+that file's source and the exported types of the local modules it imports, so
+prompts stay small, tests target real props, and the jobs are independent and
+can run concurrently (OpenAI) or in one batch (vLLM).
+
+Before a test is written, `validate_test` checks it against the project index
+(local imports resolve, imported names are exported, the file under test is
+imported), so broken suites are caught and regenerated without running npm.
+
+`select_coverage_gaps` maps the tests already in the project to the exports
+they import and keeps only the jobs needed to reach the coverage threshold,
+so a rerun on a mostly tested project makes a few calls instead of a suite.
+"""
+import os
+import re
+from collections import namedtuple
+
+from component_plan import exported_signatures
+from fence_parser import parse_code_blocks, block_matches_path, REACT_LANGUAGES
+from project_index import scan_module, is_local_import
+
+# `uncovered` lists the exports no existing test imports; empty means test everything
+TestJob = namedtuple("TestJob", ["test_type", "target", "test_path", "source", "dependency_signatures", "uncovered"],
+                     defaults=((),))
+
+TEST_ROOT = "src/__tests__"
+TEST_TYPES = ("unit", "integration", "e2e", "accessibility")
+
+# Why `test_targets` can come back empty for a test type
+_NO_TARGETS = {
+    "unit": "no components, pages, hooks or utils",
+    "integration": "no component, page or App imports a local module",
+    "e2e": "no App or pages",
+    "accessibility": "no components or pages",
+}
+
+_TYPE_EXPORT = re.compile(r'export\s+(?:declare\s+)?(?:interface|type)\s+(\w+)')
+
+
+def test_targets(project_structure, test_type):
+    """Source files that get their own test file for `test_type`."""
+    components = project_structure['components']
+    pages = project_structure['pages']
+    app = [path for path in project_structure['src_structure'] if path in ("src/App.tsx", "src/App.jsx")]
+    if test_type == 'unit':
+        return components + pages + project_structure['hooks'] + project_structure['utils']
+    if test_type == 'integration':
+        # Only composites have interactions to integrate
+        dependencies = project_structure['dependencies']
+        return [path for path in components + pages + app if dependencies.get(path)]
+    if test_type == 'e2e':
+        return app or pages
+    if test_type == 'accessibility':
+        return components + pages
+    return []
+
+
+def test_file_path(target, test_type):
+    """src/__tests__/<type>/<Name>.test.tsx (or .test.ts for plain TypeScript modules)."""
+    name, extension = os.path.splitext(os.path.basename(target))
+    suffix = ".test.ts" if extension in (".ts", ".js") else ".test.tsx"
+    return f"{TEST_ROOT}/{test_type}/{name}{suffix}"
+
+
+def import_path(test_path, target):
+    """Relative import specifier for `target` from the test file."""
+    relative = os.path.relpath(os.path.splitext(target)[0], os.path.dirname(test_path)).replace(os.sep, '/')
+    return relative if relative.startswith('.') else f"./{relative}"
+
+
+def plan_test_jobs(index, project_structure, test_types):
+    """One TestJob per (target, test type); `index` is a scanned ProjectIndex."""
+    jobs = []
+    for test_type in test_types:
+        for target in test_targets(project_structure, test_type):
+            sections = []
+            for dependency in index.dependencies(target):
+                signatures = exported_signatures(index.read(dependency))
+                if signatures:
+                    sections.append(f"### {dependency}\n```tsx\n{signatures}\n```")
+            jobs.append(TestJob(test_type, target, test_file_path(target, test_type),
+                                index.read(target), "\n\n".join(sections)))
+    return jobs
+
+
+def describe_untargeted(jobs, test_types):
+    """One line per requested test type `plan_test_jobs` found nothing to test for."""
+    planned = {job.test_type for job in jobs}
+    return [f"⚠️ No {test_type} tests: {_NO_TARGETS.get(test_type, 'unknown test type')}"
+            for test_type in test_types if test_type not in planned]
+
+
+def test_type_of(test_path):
+    """Test type of an existing test file: its src/__tests__/<type>/ folder, else unit."""
+    parts = test_path.split('/')
+    if "__tests__" in parts:
+        position = parts.index("__tests__")
+        if position + 2 < len(parts) and parts[position + 1] in TEST_TYPES:
+            return parts[position + 1]
+    return "unit"
+
+
+def covered_exports(index):
+    """{test type: {source file: exports imported by existing tests}} ("default" for the default export)."""
+    coverage = {}
+    for path, record in index.files.items():
+        if record.get("role") != "test":
+            continue
+        by_target = coverage.setdefault(test_type_of(path), {})
+        for item in record["imports"]:
+            if not is_local_import(item["source"]):
+                continue
+            resolved = index.resolve(item["source"], path)
+            if resolved not in index.files:
+                continue
+            names = by_target.setdefault(resolved, set())
+            if item["namespace"]:
+                names.update(testable_exports(index, resolved))
+            if item["default"]:
+                names.add("default")
+            names.update(item["names"])
+    return coverage
+
+
+def testable_exports(index, path):
+    """Runtime exports of a source file (types and interfaces left out), "default" included."""
+    record = index.files[path]
+    type_names = set(_TYPE_EXPORT.findall(index.read(path)))
+    exports = {name for name in record["exports"] if name != '*' and name not in type_names}
+    if record["default_export"] is not None:
+        exports.add("default")
+    return exports
+
+
+def select_coverage_gaps(index, jobs, coverage_threshold):
+    """Jobs needed to bring each test type to `coverage_threshold` percent of exports covered.
+
+    Files are taken largest gap first, so the threshold is met in as few calls
+    as possible; a file with a test that misses some exports gets a job for
+    the missing ones only, written next to any existing test. Returns
+    (jobs, report) where report is {test type: {"covered", "total", "projected", "jobs"}}.
+    """
+    coverage = covered_exports(index)
+    report = {}
+    selected = []
+    for test_type in dict.fromkeys(job.test_type for job in jobs):
+        covered_by_target = coverage.get(test_type, {})
+        candidates = []
+        total = covered = 0
+        for job in (job for job in jobs if job.test_type == test_type):
+            # A module with no runtime exports still counts once, as itself
+            exports = testable_exports(index, job.target) or {"default"}
+            uncovered = sorted(exports - covered_by_target.get(job.target, set()))
+            total += len(exports)
+            covered += len(exports) - len(uncovered)
+            if uncovered:
+                candidates.append((job, uncovered, len(uncovered) == len(exports)))
+
+        projected = covered
+        chosen = 0
+        for job, uncovered, untested in sorted(candidates, key=lambda candidate: -len(candidate[1])):
+            if total and projected * 100 >= coverage_threshold * total:
+                break
+            selected.append(job._replace(uncovered=() if untested else tuple(uncovered),
+                                         test_path=_free_test_path(index, job.test_path)))
+            projected += len(uncovered)
+            chosen += 1
+        report[test_type] = {"covered": covered, "total": total, "projected": projected, "jobs": chosen}
+    return selected, report
+
+
+def describe_coverage(report, coverage_threshold):
+    """One progress line per test type from a `select_coverage_gaps` report."""
+    lines = []
+    for test_type, entry in report.items():
+        current = entry["covered"] * 100 // max(entry["total"], 1)
+        projected = entry["projected"] * 100 // max(entry["total"], 1)
+        if entry["jobs"]:
+            lines.append(f"📈 {test_type}: {entry['covered']}/{entry['total']} exports covered ({current}%), "
+                         f"{entry['jobs']} test files to reach {projected}% (target {coverage_threshold}%)")
+        else:
+            lines.append(f"✅ {test_type}: {entry['covered']}/{entry['total']} exports covered ({current}%), "
+                         f"target {coverage_threshold}% already met")
+    return lines
+
+
+def _free_test_path(index, test_path):
+    """`test_path`, or a free path next to it when a test is already there."""
+    if test_path not in index.files:
+        return test_path
+    base, suffix = test_path.rsplit('.test.', 1)
+    number = 1
+    while True:
+        candidate = f"{base}.gaps{number if number > 1 else ''}.test.{suffix}"
+        if candidate not in index.files:
+            return candidate
+        number += 1
+
+
+def extract_focused_test(content, test_path):
+    """Test code for `test_path` from a response: the block labelled with it, else the largest code block."""
+    blocks = [block for block in parse_code_blocks(content) if block.language in REACT_LANGUAGES and block.code]
+    if not blocks:
+        return None
+    for block in blocks:
+        if block_matches_path(block, test_path):
+            return block.code
+    return max(blocks, key=lambda block: len(block.code)).code
+
+
+def validate_test(test_code, job, index):
+    """Problems that would make the test fail before it runs; an empty list means it looks valid.
+
+    `test_code` is what `extract_focused_test` returned (None when the response
+    had no usable code block).
+    """
+    if test_code is None:
+        return [f"The response had no fenced TypeScript code block; write the test as ```tsx {job.test_path}"]
+    errors = []
+    imports_target = False
+    for item in scan_module(test_code)["imports"]:
+        source = item["source"]
+        if not is_local_import(source):
+            continue
+        resolved = index.resolve(source, job.test_path)
+        if resolved is None:
+            errors.append(f"'{source}' does not resolve to a file in the project (from {job.test_path}).")
+            continue
+        if resolved == job.target:
+            imports_target = True
+        record = index.files.get(resolved)
+        if record is None:
+            continue
+        if item["default"] and record["default_export"] is None:
+            errors.append(f"{resolved} has no default export, but the test imports {item['default']} as default from '{source}'.")
+        if '*' not in record["exports"]:
+            missing = [name for name in item["names"] if name not in record["exports"]]
+            if missing:
+                errors.append(f"{resolved} does not export {', '.join(missing)} (it exports {', '.join(record['exports']) or 'nothing'}).")
+    if not imports_target:
+        errors.append(f"The test never imports the file under test, {job.target}.")
+    return errors
@@ -0,0 +1,239 @@
+"""Lightweight hierarchical timing spans for the generation pipeline.
+
+Tracing is off by default. Set FRONTEND_GEN_TRACE to a directory and each
+stage script writes `<script>.trace.json` (Chrome trace-event format, open it
+in chrome://tracing or Perfetto) and `<script>.flame.txt` (text flame summary)
+there when it exits.
+
+When tracing is disabled `span()` returns a shared no-op object and `traced`
+wrappers fall straight through to the wrapped function, so instrumented code
+pays one global lookup per call.
+
+The open span is tracked in a context variable. Worker threads do not inherit
+it, so thread-pool jobs are submitted with `submit(executor, fn, ...)`, which
+runs them in a copy of the caller's context: spans they open nest under the
+caller's `wave` or `stage` span instead of becoming roots.
+"""
+import atexit
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+_enabled = False
+_trace_dir = None
+_events = []
+_lock = threading.Lock()
+_current = contextvars.ContextVar("frontend_gen_span", default=None)
+_stage_span = None
+_pid = os.getpid()
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """A timed region; nests under whichever span is open in the current context."""
+
+    __slots__ = ("name", "attrs", "start_ns", "path", "_token")
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+        self.start_ns = 0
+        self.path = ()
+        self._token = None
+
+    def set(self, **attrs):
+        """Attach attributes (tokens, bytes, component, ...) to the span."""
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        parent = _current.get()
+        self.path = (parent.path if parent else ()) + (self.name,)
+        self._token = _current.set(self)
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end_ns = time.perf_counter_ns()
+        if _current.get() is self:
+            try:
+                _current.reset(self._token)
+            except ValueError:
+                # Closed from another context (end_stage at exit); nothing to restore there
+                _current.set(None)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        event = {
+            "name": self.name,
+            "path": self.path,
+            "start_ns": self.start_ns,
+            "dur_ns": end_ns - self.start_ns,
+            "tid": threading.get_ident(),
+            "args": self.attrs,
+        }
+        with _lock:
+            _events.append(event)
+        return False
+
+
+def is_enabled():
+    return _enabled
+
+
+def enable(trace_dir=None):
+    """Turn tracing on; if trace_dir is given, export there at interpreter exit."""
+    global _enabled, _trace_dir
+    _enabled = True
+    if trace_dir and _trace_dir is None:
+        _trace_dir = trace_dir
+        atexit.register(_export_at_exit)
+
+
+def span(name, **attrs):
+    """Return a context manager timing `name`, or a no-op when tracing is off."""
+    if not _enabled:
+        return _NOOP_SPAN
+    return Span(name, attrs)
+
+
+def submit(executor, fn, *args, **kwargs):
+    """executor.submit(fn, ...) with fn running under the caller's open span."""
+    if not _enabled:
+        return executor.submit(fn, *args, **kwargs)
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def traced(name=None, attrs=None):
+    """Decorator wrapping every call in a span.
+
+    `attrs`, if given, is called as attrs(result, *args, **kwargs) and returns
+    a dict of span attributes; it only runs while tracing is enabled.
+    """
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with Span(span_name, {}) as s:
+                result = func(*args, **kwargs)
+                if attrs is not None:
+                    s.attrs.update(attrs(result, *args, **kwargs))
+                return result
+
+        return wrapper
+
+    return decorator
+
+
+def begin_stage(name, **attrs):
+    """Open a root span for a stage script; it is closed when the trace is exported."""
+    global _stage_span
+    if not _enabled or _stage_span is not None:
+        return
+    _stage_span = Span(f"stage:{name}", attrs)
+    _stage_span.__enter__()
+
+
+def end_stage():
+    global _stage_span
+    if _stage_span is not None:
+        _stage_span.__exit__(None, None, None)
+        _stage_span = None
+
+
+def chrome_trace():
+    """Return recorded spans as a Chrome trace-event JSON object."""
+    with _lock:
+        events = list(_events)
+    trace_events = []
+    for event in sorted(events, key=lambda e: e["start_ns"]):
+        trace_events.append({
+            "name": event["name"],
+            "cat": event["path"][0],
+            "ph": "X",
+            "ts": event["start_ns"] / 1000,
+            "dur": event["dur_ns"] / 1000,
+            "pid": _pid,
+            "tid": event["tid"],
+            "args": {k: _jsonable(v) for k, v in event["args"].items()},
+        })
+    return {"traceEvents": trace_events, "displayTimeUnit": "ms"}
+
+
+def flame_summary():
+    """Aggregate spans by call path into an indented text summary."""
+    with _lock:
+        events = list(_events)
+    totals = {}
+    for event in events:
+        entry = totals.setdefault(event["path"], [0, 0])
+        entry[0] += event["dur_ns"]
+        entry[1] += 1
+    child_time = {}
+    for path, (total_ns, _) in totals.items():
+        if len(path) > 1:
+            child_time[path[:-1]] = child_time.get(path[:-1], 0) + total_ns
+
+    lines = [f"{'span':<60} {'total ms':>10} {'self ms':>10} {'calls':>6}"]
+    for path in sorted(totals):
+        total_ns, calls = totals[path]
+        self_ns = max(total_ns - child_time.get(path, 0), 0)
+        label = "  " * (len(path) - 1) + path[-1]
+        lines.append(f"{label:<60} {total_ns / 1e6:>10.1f} {self_ns / 1e6:>10.1f} {calls:>6}")
+    return "\n".join(lines)
+
+
+def export(trace_dir, basename):
+    """Write <basename>.trace.json and <basename>.flame.txt into trace_dir."""
+    end_stage()
+    os.makedirs(trace_dir, exist_ok=True)
+    trace_path = os.path.join(trace_dir, f"{basename}.trace.json")
+    with open(trace_path, 'w') as f:
+        json.dump(chrome_trace(), f)
+    with open(os.path.join(trace_dir, f"{basename}.flame.txt"), 'w') as f:
+        f.write(flame_summary() + "\n")
+    return trace_path
+
+
+def reset():
+    with _lock:
+        _events.clear()
+
+
+def _jsonable(value):
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+
+def _export_at_exit():
+    basename = os.path.splitext(os.path.basename(sys.argv[0] or ""))[0].lstrip("-") or "python"
+    try:
+        trace_path = export(_trace_dir, basename)
+        print(f"⏱️ Trace written to: {trace_path}", file=sys.stderr)
+    except OSError as e:
+        print(f"⚠️ Could not write trace: {str(e)}", file=sys.stderr)
+
+
+if os.environ.get("FRONTEND_GEN_TRACE"):
+    enable(os.environ["FRONTEND_GEN_TRACE"])
@@ -0,0 +1,219 @@
+"""Append-only JSONL trajectories with shared-content references.
+
+Trajectories are the chat turns ({"role", "content"}) each stage hands to the
+next. Every turn is one compact JSON line, so appending a turn writes only
+that line and never touches the history before it. Large texts that recur
+across turns and stages (the requirements document, upstream responses
+embedded in later prompts) are stored once in a content-addressed blob store
+next to the trajectory (`trajectory_blobs/`, see artifact_store.py) and the
+turn holds a reference instead:
+
+    {"role": "user", "content": ["Requirements:\\n", {"$include": "<sha256>"}, "\\n..."]}
+    {"role": "assistant", "content": {"$include": "<sha256>"}}
+
+Readers resolve references lazily: a turn's blobs are only loaded when that
+turn is yielded with resolve=True, so skipping user turns costs nothing.
+Legacy `*.json` trajectories (a JSON array of plain turns) are still read.
+"""
+import json
+import os
+import shutil
+
+from artifact_store import ArtifactStore
+
+READ_CHUNK_SIZE = 1 << 16
+BLOB_DIR = "trajectory_blobs"
+# Texts shorter than this are kept inline; a reference would not save anything
+MIN_SHARED_CHARS = 256
+_WHITESPACE = " \t\r\n"
+
+
+def trajectory_path(output_dir, stage):
+    """Path of a stage's trajectory, falling back to a legacy .json file from older runs."""
+    path = os.path.join(output_dir, f"{stage}_trajectories.jsonl")
+    legacy_path = os.path.join(output_dir, f"{stage}_trajectories.json")
+    if not os.path.exists(path) and os.path.exists(legacy_path):
+        return legacy_path
+    return path
+
+
+def _blob_store(path):
+    return ArtifactStore(os.path.join(os.path.dirname(os.path.abspath(path)), BLOB_DIR))
+
+
+def iter_turns(path, resolve=True, chunk_size=READ_CHUNK_SIZE):
+    """Yield turns one at a time.
+
+    With resolve=False, content may still hold {"$include"} references;
+    pass it to `resolve_content` to load it.
+    """
+    with open(path, encoding='utf-8') as f:
+        start = f.read(1)
+        while start and start in _WHITESPACE:
+            start = f.read(1)
+        if not start:
+            return
+        f.seek(0)
+        records = _iter_array(f, path, chunk_size) if start == "[" else _iter_lines(f)
+        store = _blob_store(path) if resolve else None
+        for record in records:
+            if resolve:
+                record = {**record, 'content': resolve_content(record['content'], store)}
+            yield record
+
+
+def resolve_content(content, store):
+    """Expand {"$include": hash} references in a turn's content."""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, dict):
+        return store.get(content["$include"]).decode('utf-8')
+    return "".join(resolve_content(part, store) for part in content)
+
+
+def read_assistant_turns(path, limit=None):
+    """First `limit` assistant messages (reasoning before </think> removed), reading no further."""
+    contents = []
+    if limit is not None and limit <= 0:
+        return contents
+    store = _blob_store(path)
+    for turn in iter_turns(path, resolve=False):
+        if turn['role'] != 'assistant':
+            continue
+        content = resolve_content(turn['content'], store)
+        if "</think>" in content:
+            content = content.split("</think>")[-1].strip()
+        contents.append(content)
+        if limit is not None and len(contents) >= limit:
+            break
+    return contents
+
+
+def write_turns(path, turns, shared=()):
+    """Start a new trajectory file containing `turns` (see `append_turns` for `shared`)."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(_encode_turns(path, turns, shared))
+
+
+def append_turns(path, turns, shared=()):
+    """Append turns to a trajectory file without reading or rewriting earlier turns.
+
+    Every occurrence of a `shared` text inside a turn, and every long
+    assistant response, is stored once as a blob and referenced.
+    """
+    if not turns:
+        return
+    if os.path.exists(path) and os.path.getsize(path) and path.endswith(".json"):
+        raise ValueError(f"{path} is a legacy JSON-array trajectory; use copy_trajectory to convert it")
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(_encode_turns(path, turns, shared))
+
+
+def copy_trajectory(source_path, destination_path):
+    """Seed a stage's trajectory with its predecessor's turns.
+
+    Within one directory this copies the reference lines only; the blobs
+    are shared. Legacy .json sources and copies across directories are
+    re-encoded so the destination's blob store has everything it needs.
+    """
+    directory = os.path.dirname(destination_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    if os.path.abspath(source_path) == os.path.abspath(destination_path):
+        return
+    same_store = _blob_store(source_path).root == _blob_store(destination_path).root
+    if same_store and not source_path.endswith(".json"):
+        shutil.copyfile(source_path, destination_path)
+        return
+    with open(destination_path, 'w', encoding='utf-8') as f:
+        for turn in iter_turns(source_path):
+            f.write(_encode_turns(destination_path, [turn], ()))
+
+
+def _encode_turns(path, turns, shared):
+    store = _blob_store(path)
+    shared = sorted({text for text in shared if isinstance(text, str) and len(text) >= MIN_SHARED_CHARS},
+                    key=len, reverse=True)
+    lines = []
+    for turn in turns:
+        content = turn['content']
+        if turn['role'] == 'assistant' and len(content) >= MIN_SHARED_CHARS:
+            encoded = {"$include": store.put(content)}
+        else:
+            encoded = _split_shared(content, shared, store)
+        lines.append(json.dumps({**turn, 'content': encoded}, ensure_ascii=False, separators=(',', ':')) + "\n")
+    return "".join(lines)
+
+
+def _split_shared(content, shared, store):
+    """Content as a string, or a list of strings and references where shared texts occur."""
+    parts = [content]
+    for text in shared:
+        reference = None
+        split_parts = []
+        for part in parts:
+            if not isinstance(part, str) or text not in part:
+                split_parts.append(part)
+                continue
+            if reference is None:
+                reference = {"$include": store.put(text)}
+            pieces = part.split(text)
+            for i, piece in enumerate(pieces):
+                if i:
+                    split_parts.append(reference)
+                if piece:
+                    split_parts.append(piece)
+        parts = split_parts
+    if len(parts) == 1:
+        return parts[0]
+    return parts
+
+
+def _iter_lines(f):
+    for line in f:
+        if line.strip():
+            yield json.loads(line)
+
+
+def _iter_array(f, path, chunk_size):
+    """Turns of a legacy JSON-array trajectory; memory is bounded by the largest turn plus one chunk."""
+    decoder = json.JSONDecoder()
+    buffer = f.read(chunk_size)
+    pos = _skip(buffer, 0, _WHITESPACE)
+    if pos >= len(buffer):
+        return
+    if buffer[pos] != "[":
+        raise ValueError(f"{path} is not a JSON array of turns")
+    pos += 1
+    eof = False
+    while True:
+        pos = _skip(buffer, pos, _WHITESPACE + ",")
+        if pos < len(buffer) and buffer[pos] == "]":
+            return
+        try:
+            turn, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            # Incomplete turn: drop what is consumed and read at least as much
+            # again as is buffered, so a large turn is re-scanned O(log n) times
+            buffer = buffer[pos:]
+            pos = 0
+            more = f.read(max(chunk_size, len(buffer)))
+            eof = not more
+            buffer += more
+            continue
+        yield turn
+        pos = end
+
+
+def _skip(text, pos, chars):
+    while pos < len(text) and text[pos] in chars:
+        pos += 1
+    return pos
@@ -2,54 +2,99 @@ import json
 import re
 import os
 from datetime import datetime
+from tracing import traced
+from fence_parser import parse_code_blocks, select_component_block, REACT_LANGUAGES
+from json_repair import repair_json
+from trajectory import read_assistant_turns
+from project_index import ProjectIndex, imported_packages
+
+# USD per 1K tokens (prompt, completion), matched by substring of the model name
+MODEL_PRICING = {
+    'gpt-4': (0.03, 0.06),
+    'gpt-3.5': (0.001, 0.002),
+}
+DEFAULT_PRICE_PER_1K = 0.001
+
+# Project layout created by create_folder_structure; generated files must land in it
+PROJECT_FOLDERS = [
+    "src/components",
+    "src/pages",
+    "src/hooks",
+    "src/utils",
+    "src/types",
+    "src/styles",
+    "src/assets",
+    "public"
+]
+
+# File types a coding response may add next to its component
+COMPONENT_FILE_EXTENSIONS = ('.tsx', '.ts', '.jsx', '.js', '.css', '.scss')
+
+# Components generated by the coding stage
+DEFAULT_COMPONENTS = [
+    {
+        "name": "App",
+        "type": "main",
+        "path": "src/App.tsx",
+        "description": "Main application component with routing"
+    },
+    {
+        "name": "Layout",
+        "type": "layout",
+        "path": "src/components/Layout.tsx",
+        "description": "Main layout component with header, sidebar, footer"
+    },
+    {
+        "name": "Header",
+        "type": "component",
+        "path": "src/components/Header.tsx",
+        "description": "Application header with navigation"
+    },
+    {
+        "name": "Sidebar",
+        "type": "component", 
+        "path": "src/components/Sidebar.tsx",
+        "description": "Navigation sidebar component"
+    },
+    {
+        "name": "Dashboard",
+        "type": "page",
+        "path": "src/pages/Dashboard.tsx",
+        "description": "Main dashboard page"
+    }
+]
 
 def extract_frontend_planning(trajectories_json_file_path):
     """Extract planning context for frontend generation"""
-    with open(trajectories_json_file_path) as f:
-        traj = json.load(f)
-
-    context_lst = []
-    for turn in traj:
-        if turn['role'] == 'assistant':
-            content = turn['content']
-            if "</think>" in content:
-                content = content.split("</think>")[-1].strip()
-            context_lst.append(content)
-
-    context_lst = context_lst[:3] 
-    return context_lst
-
-def content_to_json(data):
-    """Convert content string to JSON format"""
+    # Streams the file and stops after the third assistant turn
+    return read_assistant_turns(trajectories_json_file_path, limit=3)
+
+@traced("content_to_json", attrs=lambda result, data, repairs=None: {"bytes": len(data)})
+def content_to_json(data, repairs=None):
+    """Convert content string to JSON format, repairing common LLM damage
+    
+    Names of the repairs applied are printed and, if `repairs` is a list,
+    appended to it.
+    """
     clean_data = re.sub(r'\[CONTENT\]|\[/CONTENT\]', '', data).strip()
-    clean_data = re.sub(r'(".*?"),\s*#.*', r'\1,', clean_data)
     
     try:
-        return json.loads(clean_data)
-    except json.JSONDecodeError:
+        parsed, applied = repair_json(clean_data)
+    except ValueError:
         # Fallback parsing for malformed JSON
         return {"error": "Failed to parse JSON", "raw_content": clean_data}
+    
+    if applied:
+        print(f"🔧 Repaired JSON: {', '.join(applied)}")
+        if repairs is not None:
+            repairs.extend(applied)
+    return parsed
 
+@traced("extract_react_code_from_content",
+        attrs=lambda result, content: {"bytes": len(content), "blocks": len(result)})
 def extract_react_code_from_content(content):
     """Extract React component code from LLM response"""
-    code_blocks = []
-    
-    # Pattern for code blocks with language specification
-    pattern = r'```(?:jsx?|typescript?|tsx?)\n(.*?)\n```'
-    matches = re.findall(pattern, content, re.DOTALL)
-    
-    for match in matches:
-        code_blocks.append(match.strip())
-    
-    # Also extract plain code blocks
-    pattern = r'```\n(.*?)\n```'
-    plain_matches = re.findall(pattern, content, re.DOTALL)
-    
-    for match in plain_matches:
-        if match.strip() not in code_blocks:
-            code_blocks.append(match.strip())
-    
-    return code_blocks
+    return [block.code for block in parse_code_blocks(content) if block.language in REACT_LANGUAGES]
 
 def parse_component_structure(content):
     """Parse component structure from planning output"""
@@ -71,48 +116,169 @@ def parse_component_structure(content):
         print(f"Error parsing component structure: {e}")
         return []
 
-def generate_package_json(project_name, requirements):
-    """Generate package.json based on requirements"""
-    base_dependencies = {
-        "react": "^18.2.0",
-        "react-dom": "^18.2.0",
-        "react-scripts": "5.0.1",
-        "typescript": "^4.9.5",
-        "@types/react": "^18.2.0",
-        "@types/react-dom": "^18.2.0"
-    }
-    
-    dev_dependencies = {
-        "@testing-library/jest-dom": "^5.16.4",
-        "@testing-library/react": "^13.4.0",
-        "@testing-library/user-event": "^13.5.0",
-        "@types/jest": "^27.5.2",
-        "@types/node": "^16.18.0"
+# Pinned versions for packages generated code may import; anything imported
+# that is not listed here is reported as missing and added as "latest"
+PACKAGE_VERSIONS = {
+    "react": "^18.2.0",
+    "react-dom": "^18.2.0",
+    "react-router-dom": "^6.13.0",
+    "@reduxjs/toolkit": "^1.9.5",
+    "react-redux": "^8.1.0",
+    "@mui/material": "^5.13.0",
+    "@mui/icons-material": "^5.11.16",
+    "@emotion/react": "^11.11.0",
+    "@emotion/styled": "^11.11.0",
+    "styled-components": "^6.0.0",
+    "@tanstack/react-query": "^4.29.0",
+    "axios": "^1.4.0",
+    "zustand": "^4.3.8",
+    "react-hook-form": "^7.44.0",
+    "zod": "^3.21.4",
+    "yup": "^1.2.0",
+    "formik": "^2.4.0",
+    "classnames": "^2.3.2",
+    "clsx": "^1.2.1",
+    "date-fns": "^2.30.0",
+    "dayjs": "^1.11.8",
+    "moment": "^2.29.4",
+    "lodash": "^4.17.21",
+    "lodash-es": "^4.17.21",
+    "uuid": "^9.0.0",
+    "recharts": "^2.7.0",
+    "chart.js": "^4.3.0",
+    "react-chartjs-2": "^5.2.0",
+    "react-icons": "^4.10.0",
+    "lucide-react": "^0.244.0",
+    "framer-motion": "^10.12.0",
+    "react-window": "^1.8.9",
+    "react-virtualized": "^9.22.5",
+    "tailwindcss": "^3.3.0",
+    "web-vitals": "^2.1.4",
+}
+
+# Packages that only work with their peers installed
+PEER_PACKAGES = {
+    "@mui/material": ["@emotion/react", "@emotion/styled"],
+    "@mui/icons-material": ["@mui/material"],
+    "react-redux": ["@reduxjs/toolkit"],
+    "react-chartjs-2": ["chart.js"],
+    "tailwindcss": ["autoprefixer", "postcss"],
+}
+
+# Type definitions for packages that do not bundle their own
+TYPE_PACKAGES = {
+    "lodash": "@types/lodash",
+    "react-window": "@types/react-window",
+    "react-virtualized": "@types/react-virtualized",
+    "uuid": "@types/uuid",
+}
+
+# Toolchain the generated project always needs, whatever the sources import
+BASE_DEPENDENCIES = {
+    "react": "^18.2.0",
+    "react-dom": "^18.2.0",
+    "react-scripts": "5.0.1",
+    "typescript": "^4.9.5",
+    "@types/react": "^18.2.0",
+    "@types/react-dom": "^18.2.0",
+}
+
+DEV_DEPENDENCIES = {
+    "@testing-library/jest-dom": "^5.16.4",
+    "@testing-library/react": "^13.4.0",
+    "@testing-library/user-event": "^13.5.0",
+    "@types/jest": "^27.5.2",
+    "@types/node": "^16.18.0",
+    "jest-axe": "^8.0.0",
+    "@types/jest-axe": "^3.5.9",
+}
+
+_EXTRA_VERSIONS = {
+    "autoprefixer": "^10.4.14",
+    "postcss": "^8.4.24",
+    "@types/lodash": "^4.14.195",
+    "@types/react-window": "^1.8.5",
+    "@types/react-virtualized": "^9.21.22",
+    "@types/uuid": "^9.0.2",
+}
+
+# Node built-ins never belong in a browser bundle's package.json
+_NODE_BUILTINS = {"fs", "path", "os", "crypto", "util", "events", "stream", "url", "buffer", "child_process"}
+
+
+def resolve_dependencies(project_path, existing_dependencies=None, sources=None):
+    """Dependencies actually imported by the sources under `project_path`/src.
+
+    Import specifiers come from ProjectIndex (one tokenizer pass per file,
+    cached between runs), or from `sources` ({path: text}) when the project
+    is not on disk. Test files (index role "test") do not add runtime
+    dependencies. Returns (dependencies, report) where report lists the
+    imported packages with no known version ("missing"), the packages of
+    `existing_dependencies` no source imports any more ("unused") and the
+    packages only tests import, with their versions ("dev").
+    """
+    existing_dependencies = existing_dependencies or {}
+    if sources is not None:
+        index = ProjectIndex.from_sources(sources)
+    else:
+        index = ProjectIndex(project_path).scan()
+    imported = imported_packages({path: record for path, record in index.files.items() if record["role"] != "test"})
+    test_imported = imported_packages({path: record for path, record in index.files.items() if record["role"] == "test"})
+
+    dependencies = dict(BASE_DEPENDENCIES)
+    missing = []
+    for package in imported:
+        if package in _NODE_BUILTINS or package.startswith("node:") or package in DEV_DEPENDENCIES:
+            continue
+        if package in PACKAGE_VERSIONS:
+            dependencies[package] = PACKAGE_VERSIONS[package]
+        elif package not in dependencies:
+            # Keep a version someone already pinned rather than guessing
+            dependencies[package] = existing_dependencies.get(package, "latest")
+            missing.append(package)
+        for extra in PEER_PACKAGES.get(package, []) + ([TYPE_PACKAGES[package]] if package in TYPE_PACKAGES else []):
+            dependencies.setdefault(extra, PACKAGE_VERSIONS.get(extra) or _EXTRA_VERSIONS[extra])
+
+    dev = {}
+    for package in test_imported:
+        if package in imported or package in DEV_DEPENDENCIES or package in _NODE_BUILTINS or package.startswith("node:"):
+            continue
+        dev[package] = PACKAGE_VERSIONS.get(package) or _EXTRA_VERSIONS.get(package, "latest")
+
+    unused = sorted(package for package in existing_dependencies if package not in dependencies)
+    report = {
+        "imported": imported,
+        "missing": missing,
+        "unused": unused,
+        "dev": dev,
     }
-    
-    # Add dependencies based on requirements
-    if 'tailwind' in requirements.lower():
-        base_dependencies.update({
-            "tailwindcss": "^3.3.0",
-            "autoprefixer": "^10.4.14",
-            "postcss": "^8.4.24"
-        })
-    
-    if 'material-ui' in requirements.lower() or 'mui' in requirements.lower():
-        base_dependencies.update({
-            "@mui/material": "^5.13.0",
-            "@emotion/react": "^11.11.0",
-            "@emotion/styled": "^11.11.0"
-        })
-    
-    if 'redux' in requirements.lower():
-        base_dependencies.update({
-            "@reduxjs/toolkit": "^1.9.5",
-            "react-redux": "^8.1.0"
-        })
-    
-    if 'router' in requirements.lower():
-        base_dependencies["react-router-dom"] = "^6.13.0"
+    return dict(sorted(dependencies.items())), report
+
+
+def generate_package_json(project_name, project_path, sources=None):
+    """Generate package.json listing exactly the packages the generated sources import.
+
+    Pass `sources` ({path: text}) when the project is not written to disk.
+    Returns (package_json, report); see `resolve_dependencies` for the report.
+    """
+    package_json_path = os.path.join(project_path, "package.json")
+    existing_dependencies = {}
+    if sources is None and os.path.exists(package_json_path):
+        try:
+            with open(package_json_path) as f:
+                existing_dependencies = json.load(f).get("dependencies", {})
+        except (json.JSONDecodeError, AttributeError):
+            print(f"⚠️ Could not read existing {package_json_path}, ignoring it")
+
+    base_dependencies, report = resolve_dependencies(project_path, existing_dependencies, sources)
+    dev_dependencies = {**DEV_DEPENDENCIES, **report["dev"]}
+
+    for package in report["missing"]:
+        print(f"⚠️ {package} is imported but has no pinned version, using \"{base_dependencies[package]}\"")
+    for package in report["unused"]:
+        print(f"⚠️ {package} is no longer imported, dropped from package.json")
+    for package, version in report["dev"].items():
+        print(f"🧪 {package} is only imported by tests, added to devDependencies as \"{version}\"")
     
     package_json = {
         "name": project_name.lower().replace(' ', '-'),
@@ -146,7 +312,177 @@ def generate_package_json(project_name, requirements):
         }
     }
     
-    return package_json
+    return package_json, report
+
+def basic_project_files(project_name, generated_files, generated_with="", model_name=""):
+    """Boilerplate files of the generated React project: index.html, entry point, global CSS and README
+
+    `generated_with` ("vLLM") and `model_name` are credited in the README when given.
+    """
+    credit = f"\nGenerated with Frontend Generator using {model_name}\n" if model_name else ""
+    return {
+        "public/index.html": '''<!DOCTYPE html>
+<html lang="en">
+  <head>
+    <meta charset="utf-8" />
+    <link rel="icon" href="%PUBLIC_URL%/favicon.ico" />
+    <meta name="viewport" content="width=device-width, initial-scale=1" />
+    <meta name="theme-color" content="#000000" />
+    <meta name="description" content="Generated React application" />
+    <title>''' + project_name + '''</title>
+  </head>
+  <body>
+    <noscript>You need to enable JavaScript to run this app.</noscript>
+    <div id="root"></div>
+  </body>
+</html>''',
+        
+        "src/index.tsx": '''import React from 'react';
+import ReactDOM from 'react-dom/client';
+import './index.css';
+import App from './App';
+
+const root = ReactDOM.createRoot(
+  document.getElementById('root') as HTMLElement
+);
+root.render(
+  <React.StrictMode>
+    <App />
+  </React.StrictMode>
+);''',
+        
+        "src/index.css": '''body {
+  margin: 0;
+  font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', 'Roboto', 'Oxygen',
+    'Ubuntu', 'Cantarell', 'Fira Sans', 'Droid Sans', 'Helvetica Neue',
+    sans-serif;
+  -webkit-font-smoothing: antialiased;
+  -moz-osx-font-smoothing: grayscale;
+}
+
+code {
+  font-family: source-code-pro, Menlo, Monaco, Consolas, 'Courier New',
+    monospace;
+}
+
+* {
+  box-sizing: border-box;
+}''',
+
+        "README.md": f'''# {project_name}
+
+This React application was generated automatically from project requirements{f" using {generated_with}" if generated_with else ""}.
+
+## Getting Started
+
+### Prerequisites
+- Node.js (version 14 or higher)
+- npm or yarn
+
+### Installation
+
+1. Install dependencies:
+```bash
+npm install
+```
+
+2. Start the development server:
+```bash
+npm start
+```
+
+3. Open [http://localhost:3000](http://localhost:3000) to view it in the browser.
+
+## Available Scripts
+
+- `npm start` - Runs the app in development mode
+- `npm test` - Launches the test runner
+- `npm run build` - Builds the app for production
+- `npm run eject` - Ejects from Create React App (one-way operation)
+
+## Project Structure
+
+```
+src/
+├── components/     # Reusable UI components
+├── pages/         # Page components
+├── hooks/         # Custom React hooks
+├── utils/         # Utility functions
+├── types/         # TypeScript type definitions
+└── styles/        # CSS and styling files
+```
+
+## Technologies Used
+
+- React 18+
+- TypeScript
+- CSS Modules / Styled Components
+- React Router (if routing is implemented)
+
+## Generated Components
+
+{chr(10).join([f"- {name}: {info['path']}" for name, info in generated_files.items()])}
+{credit}'''
+    }
+
+def test_config_files(coverage_threshold):
+    """Jest configuration and test setup files for the generated project"""
+    # Jest configuration
+    jest_config = {
+        "preset": "ts-jest",
+        "testEnvironment": "jsdom",
+        "setupFilesAfterEnv": ["<rootDir>/src/setupTests.ts"],
+        "moduleNameMapping": {
+            "^@/(.*)$": "<rootDir>/src/$1"
+        },
+        "collectCoverageFrom": [
+            "src/**/*.{ts,tsx}",
+            "!src/**/*.d.ts",
+            "!src/index.tsx",
+            "!src/reportWebVitals.ts"
+        ],
+        "coverageThreshold": {
+            "global": {
+                "branches": coverage_threshold,
+                "functions": coverage_threshold,
+                "lines": coverage_threshold,
+                "statements": coverage_threshold
+            }
+        }
+    }
+    
+    # Setup file for tests
+    setup_content = '''import '@testing-library/jest-dom';
+import 'jest-axe/extend-expect';
+
+// Mock matchMedia
+Object.defineProperty(window, 'matchMedia', {
+  writable: true,
+  value: jest.fn().mockImplementation(query => ({
+    matches: false,
+    media: query,
+    onchange: null,
+    addListener: jest.fn(),
+    removeListener: jest.fn(),
+    addEventListener: jest.fn(),
+    removeEventListener: jest.fn(),
+    dispatchEvent: jest.fn(),
+  })),
+});
+
+// Mock IntersectionObserver
+global.IntersectionObserver = class IntersectionObserver {
+  constructor() {}
+  observe() { return null; }
+  disconnect() { return null; }
+  unobserve() { return null; }
+};
+'''
+    
+    return {
+        "jest.config.js": f"module.exports = {json.dumps(jest_config, indent=2)};",
+        "src/setupTests.ts": setup_content
+    }
 
 def print_response(response, output_path=None):
     """Print and optionally save LLM response"""
@@ -157,8 +493,16 @@ def print_response(response, output_path=None):
     print("=" * 50)
     
     if output_path:
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(response)
+        write_file(output_path, response)
+
+@traced("write_file", attrs=lambda result, path, content: {"path": path, "bytes": len(content)})
+def write_file(path, content):
+    """Write a text file, creating parent directories as needed"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
 
 def print_log_cost(usage, model_name="unknown"):
     """Print token usage and estimated cost"""
@@ -172,16 +516,43 @@ def print_log_cost(usage, model_name="unknown"):
         print(f"Completion tokens: {completion_tokens}")
         print(f"Total tokens: {total_tokens}")
         
-        # Rough cost estimation (varies by model)
-        if 'gpt-4' in model_name.lower():
-            cost = (prompt_tokens * 0.03 + completion_tokens * 0.06) / 1000
-        elif 'gpt-3.5' in model_name.lower():
-            cost = (prompt_tokens * 0.001 + completion_tokens * 0.002) / 1000
-        else:
-            cost = total_tokens * 0.001 / 1000  # Default estimation
-            
+        cost = estimate_cost(model_name, prompt_tokens, completion_tokens)
         print(f"Estimated cost: ${cost:.4f}")
 
+def estimate_cost(model_name, prompt_tokens, completion_tokens):
+    """Rough cost estimation in USD (varies by model)"""
+    for prefix, (prompt_price, completion_price) in MODEL_PRICING.items():
+        if prefix in model_name.lower():
+            return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+    return (prompt_tokens + completion_tokens) * DEFAULT_PRICE_PER_1K / 1000
+
+def count_tokens(text, model_name="gpt-4"):
+    """Count tokens with the model's tiktoken encoding, or ~4 chars/token without tiktoken"""
+    encoding = _token_encoding(model_name)
+    if encoding is None:
+        return len(text) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+_encodings = {}
+
+def _token_encoding(model_name):
+    if model_name not in _encodings:
+        try:
+            import tiktoken
+        except ImportError:
+            _encodings[model_name] = None
+            return None
+        try:
+            try:
+                _encodings[model_name] = tiktoken.encoding_for_model(model_name)
+            except KeyError:
+                _encodings[model_name] = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            # Encodings are downloaded on first use; stay usable offline
+            print(f"⚠️ Could not load tokenizer for {model_name}, estimating ~4 chars/token: {str(e)[:80]}")
+            _encodings[model_name] = None
+    return _encodings[model_name]
+
 def load_accumulated_cost(cost_file="accumulated_cost.json"):
     """Load accumulated cost from file"""
     if os.path.exists(cost_file):
@@ -198,18 +569,60 @@ def create_folder_structure(base_path, project_name):
     """Create React project folder structure"""
     project_path = os.path.join(base_path, f"{project_name}_frontend")
     
-    folders = [
-        "src/components",
-        "src/pages",
-        "src/hooks",
-        "src/utils",
-        "src/types",
-        "src/styles",
-        "src/assets",
-        "public"
-    ]
-    
-    for folder in folders:
+    for folder in PROJECT_FOLDERS:
         os.makedirs(os.path.join(project_path, folder), exist_ok=True)
     
     return project_path
+
+def resolve_component_file(filename, component_path):
+    """Map a code block's filename to a project path inside the layout from create_folder_structure.
+    
+    Bare file names (Header.module.css) go next to the component, paths such
+    as types/header.ts are taken relative to src/. Raises ValueError for paths
+    outside the layout or with an unsupported extension.
+    """
+    path = filename.replace('\\', '/').strip()
+    while path.startswith('./'):
+        path = path[2:]
+    if path.startswith('/') or '..' in path.split('/'):
+        raise ValueError("path escapes the project")
+    if not path.endswith(COMPONENT_FILE_EXTENSIONS):
+        raise ValueError("unsupported file type")
+    
+    if '/' not in path:
+        path = f"{os.path.dirname(component_path)}/{path}"
+    elif not path.startswith(('src/', 'public/')):
+        path = f"src/{path}"
+    
+    directory = os.path.dirname(path)
+    if directory != "src" and not any(directory == folder or directory.startswith(folder + '/') for folder in PROJECT_FOLDERS):
+        raise ValueError(f"'{directory}' is not part of the project layout")
+    return path
+
+def collect_component_files(blocks, component, reserved_paths=()):
+    """Files produced by one coding response: ({path: code}, [(filename, reason), ...] rejected).
+    
+    The block chosen by select_component_block is saved at the component's
+    path; every other block labelled with a valid filename is saved alongside
+    it, unless the path is in `reserved_paths` (files owned by other components).
+    """
+    files = {}
+    rejected = []
+    main_block = select_component_block(blocks, component)
+    if main_block:
+        files[component['path']] = main_block.code
+    
+    for block in blocks:
+        if block is main_block or not block.filename or not block.code:
+            continue
+        try:
+            path = resolve_component_file(block.filename, component['path'])
+        except ValueError as e:
+            rejected.append((block.filename, str(e)))
+            continue
+        if path in reserved_paths and path != component['path']:
+            rejected.append((block.filename, "belongs to another component"))
+            continue
+        files.setdefault(path, block.code)
+    
+    return files, rejected
@@ -1,7 +1,7 @@
 #!/bin/bash
 
 # Frontend Generator - React Application Generation Script
-# Usage: bash run_frontend.sh
+# Usage: bash run_frontend.sh [--dry-run] [--max-cost USD] [--artifact-store DIR]
 
 # Default values
 PROJECT_NAME="sample-dashboard"
@@ -13,8 +13,20 @@ PROJECT_NAME=${PROJECT_NAME:-"sample-dashboard"}
 REQUIREMENTS_PATH=${REQUIREMENTS_PATH:-"../examples/dashboard_requirements.md"}
 OUTPUT_BASE_DIR=${OUTPUT_BASE_DIR:-"../outputs"}
 
-# Check if OpenAI API key is set
-if [ -z "$OPENAI_API_KEY" ]; then
+DRY_RUN=false
+MAX_COST=""
+ARTIFACT_STORE=${ARTIFACT_STORE:-""}
+while [[ $# -gt 0 ]]; do
+    case "$1" in
+        --dry-run) DRY_RUN=true; shift ;;
+        --max-cost) MAX_COST="$2"; shift 2 ;;
+        --artifact-store) ARTIFACT_STORE="$2"; shift 2 ;;
+        *) echo "❌ Error: Unknown option $1"; exit 1 ;;
+    esac
+done
+
+# Check if OpenAI API key is set (not needed for a dry run)
+if [ "$DRY_RUN" = false ] && [ -z "$OPENAI_API_KEY" ]; then
     echo "❌ Error: OPENAI_API_KEY environment variable is not set"
     echo "Please set your OpenAI API key:"
     echo "export OPENAI_API_KEY='your-api-key-here'"
@@ -45,6 +57,28 @@ echo "📂 Output Directory: $OUTPUT_DIR"
 echo "=================================================="
 echo ""
 
+# Preflight: predict tokens, cost and time before any model call
+if [ "$DRY_RUN" = true ] || [ -n "$MAX_COST" ]; then
+    python ../codes/preflight.py \
+        --project_name "$PROJECT_NAME" \
+        --gpt_version "o3-mini" \
+        --requirements_format "markdown" \
+        --requirements_path "$REQUIREMENTS_PATH" \
+        --include_testing \
+        --history_dir "$OUTPUT_BASE_DIR" \
+        --analysis_dir "$OUTPUT_DIR/analyzing_artifacts" \
+        ${MAX_COST:+--max_cost "$MAX_COST"}
+
+    if [ $? -ne 0 ]; then
+        echo "❌ Preflight check failed"
+        exit 1
+    fi
+    echo ""
+    if [ "$DRY_RUN" = true ]; then
+        exit 0
+    fi
+fi
+
 # Stage 1: Planning
 echo "🎯 Stage 1: Frontend Architecture Planning"
 echo "----------------------------------------"
@@ -130,6 +164,21 @@ if [[ $REPLY =~ ^[Yy]$ ]]; then
     echo ""
 fi
 
+# Archive the run into the content-addressed artifact store
+if [ -n "$ARTIFACT_STORE" ]; then
+    python ../codes/artifact_store.py archive \
+        --store "$ARTIFACT_STORE" \
+        --project_name "$PROJECT_NAME" \
+        --output_dir "$OUTPUT_DIR" \
+        --project_path "$REPO_OUTPUT_DIR/${PROJECT_NAME}_frontend" \
+        --requirements_path "$REQUIREMENTS_PATH"
+
+    if [ $? -ne 0 ]; then
+        echo "⚠️ Archiving failed, outputs are still in $OUTPUT_DIR"
+    fi
+    echo ""
+fi
+
 echo "🚀 To run your generated React application:"
 echo "   cd $REPO_OUTPUT_DIR/${PROJECT_NAME}_frontend"
 echo "   npm install"